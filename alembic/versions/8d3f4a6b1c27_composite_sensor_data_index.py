@@ -0,0 +1,48 @@
+"""composite_sensor_data_index
+
+Revision ID: 8d3f4a6b1c27
+Revises: 5b1d7c9e2f40
+Create Date: 2024-01-27 11:05:42.718305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d3f4a6b1c27"
+down_revision: Union[str, None] = "5b1d7c9e2f40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every query across sites filters on series and a time range, and only reads the site and
+# value, so this index lets them be answered with an index-only scan of each chunk. Queries
+# for a single site use the primary key, (site_id, series, time), which leaves the
+# single-column indexes unused.
+#
+# Timescale doesn't support CREATE INDEX CONCURRENTLY on hypertables, so the indexes are
+# built one chunk at a time instead, with each chunk only locked while its own index builds.
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_sensor_data_series_time "
+            "ON sensor_data (series, time DESC) INCLUDE (site_id, value) "
+            "WITH (timescaledb.transaction_per_chunk)"
+        )
+
+    op.drop_index("ix_sensor_data_series", table_name="sensor_data")
+    op.drop_index("ix_sensor_data_site_id", table_name="sensor_data")
+    op.drop_index("ix_sensor_data_time", table_name="sensor_data")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in ["series", "site_id", "time"]:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_sensor_data_{column} "
+                f"ON sensor_data ({column}) WITH (timescaledb.transaction_per_chunk)"
+            )
+
+    op.drop_index("ix_sensor_data_series_time", table_name="sensor_data")
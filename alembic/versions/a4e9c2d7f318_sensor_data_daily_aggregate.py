@@ -0,0 +1,59 @@
+"""sensor_data_daily_aggregate
+
+Revision ID: a4e9c2d7f318
+Revises: 8d3f4a6b1c27
+Create Date: 2024-02-03 09:48:15.204661
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a4e9c2d7f318"
+down_revision: Union[str, None] = "8d3f4a6b1c27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Continuous aggregates can't be created or refreshed inside a transaction
+    with op.get_context().autocommit_block():
+        # Real time aggregation (materialized_only = false) adds the raw data after the last
+        # refresh to the results, so they match sensor_data even before a refresh
+        op.execute(
+            """
+            CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_data_daily
+            WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+            SELECT
+                time_bucket(INTERVAL '1 day', time) AS day,
+                site_id,
+                series,
+                sum(value) AS value_sum,
+                count(value) AS value_count,
+                min(value) AS value_min,
+                max(value) AS value_max
+            FROM sensor_data
+            GROUP BY day, site_id, series
+            WITH NO DATA
+            """
+        )
+
+        # Syncs refresh the days they write to, and this picks up anything they miss
+        op.execute(
+            """
+            SELECT add_continuous_aggregate_policy(
+                'sensor_data_daily',
+                start_offset => INTERVAL '7 days',
+                end_offset => INTERVAL '1 hour',
+                schedule_interval => INTERVAL '1 hour',
+                if_not_exists => true
+            )
+            """
+        )
+
+        op.execute("CALL refresh_continuous_aggregate('sensor_data_daily', NULL, NULL)")
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS sensor_data_daily")
@@ -0,0 +1,46 @@
+"""compress_sensor_data
+
+Revision ID: c7b5e1f09a42
+Revises: a4e9c2d7f318
+Create Date: 2024-02-10 15:21:37.590814
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7b5e1f09a42"
+down_revision: Union[str, None] = "a4e9c2d7f318"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Queries read one series (and often one site) over a time range, so segmenting by site and
+    # series means they only decompress the segments they need, each already in time order
+    op.execute(
+        """
+        ALTER TABLE sensor_data SET (
+            timescaledb.compress,
+            timescaledb.compress_segmentby = 'site_id, series',
+            timescaledb.compress_orderby = 'time DESC'
+        )
+        """
+    )
+
+    # Syncs only write the last few days, so chunks are compressed once they are well past that.
+    # Late or resynced data in a compressed chunk decompresses it first (see
+    # SensorRepository.decompress_data), and the policy compresses it again afterwards
+    op.execute(
+        "SELECT add_compression_policy('sensor_data', INTERVAL '30 days', if_not_exists => true)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("SELECT remove_compression_policy('sensor_data', if_exists => true)")
+    op.execute(
+        "SELECT decompress_chunk(chunk, if_compressed => true) "
+        "FROM show_chunks('sensor_data') AS chunk"
+    )
+    op.execute("ALTER TABLE sensor_data SET (timescaledb.compress = false)")
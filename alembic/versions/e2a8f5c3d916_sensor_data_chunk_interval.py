@@ -0,0 +1,29 @@
+"""sensor_data_chunk_interval
+
+Revision ID: e2a8f5c3d916
+Revises: c7b5e1f09a42
+Create Date: 2024-02-17 10:36:04.182953
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a8f5c3d916"
+down_revision: Union[str, None] = "c7b5e1f09a42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The default of 7 days gives chunks of only ~100k rows at our rate (a few hundred sites,
+    # two series, hourly), so long-range queries plan and scan hundreds of tiny chunks. 30 days
+    # matches the compression policy, so a chunk is compressed as soon as it is complete.
+    # This only applies to new chunks: use `cli.py rechunk` to rebuild existing ones, and
+    # `cli.py chunk-info` to see the interval recommended for the current row rate
+    op.execute("SELECT set_chunk_time_interval('sensor_data', INTERVAL '30 days')")
+
+
+def downgrade() -> None:
+    op.execute("SELECT set_chunk_time_interval('sensor_data', INTERVAL '7 days')")
@@ -0,0 +1,70 @@
+"""add_site_day_stats
+
+Revision ID: f3b6d8a1c054
+Revises: e2a8f5c3d916
+Create Date: 2024-02-24 11:05:42.617390
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b6d8a1c054"
+down_revision: Union[str, None] = "e2a8f5c3d916"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "site_day_stats",
+        sa.Column("site_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "series",
+            postgresql.ENUM("pm25", "no2", name="series", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("day", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+        sa.Column("value_count", sa.Integer(), nullable=False),
+        sa.Column("value_min", sa.Float(), nullable=True),
+        sa.Column("value_max", sa.Float(), nullable=True),
+        sa.Column("hour_sums", postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column("hour_counts", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["site_id"],
+            ["site.site_id"],
+        ),
+        sa.PrimaryKeyConstraint("site_id", "series", "day"),
+    )
+
+    # Backfill from the existing data. From now on, the repository maintains the rows for
+    # the days each sync writes to or deletes from. Days and hours are in UTC whatever the
+    # session's TimeZone, as in sensor_data_daily
+    hour = "date_part('hour', time AT TIME ZONE 'UTC')"
+    hour_sums = ", ".join(f"coalesce(sum(value) FILTER (WHERE {hour} = {h}), 0)" for h in range(24))
+    hour_counts = ", ".join(f"count(value) FILTER (WHERE {hour} = {h})" for h in range(24))
+    op.execute(
+        f"""
+        INSERT INTO site_day_stats
+        SELECT
+            site_id,
+            series,
+            time_bucket(INTERVAL '1 day', time) AS day,
+            coalesce(sum(value), 0),
+            count(value),
+            min(value),
+            max(value),
+            ARRAY[{hour_sums}],
+            ARRAY[{hour_counts}]
+        FROM sensor_data
+        GROUP BY site_id, series, day
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("site_day_stats")
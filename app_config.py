@@ -15,6 +15,8 @@ database_password = os.environ["DATABASE_PASSWORD"]
 database_name = os.environ["DATABASE_NAME"]
 database_host = os.environ["DATABASE_HOST"]
 redis_url = f"redis://{os.environ['REDIS_HOST']}:6379"
+# Size of the in-process cache in front of Redis, per worker
+local_cache_bytes = int(os.environ.get("LOCAL_CACHE_MB", "64")) * 1024 * 1024
 
 daily_limits = {"pm25": {"who": 15}, "no2": {"who": 25}}
 outlier_threshold = {"pm25": 200, "no2": 200}
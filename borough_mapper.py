@@ -1,35 +1,87 @@
+import functools
 import json
 
-from shapely.geometry import Point, shape
+import numpy as np
+import shapely
+from shapely.geometry import shape
 
 
 class NotFoundError(Exception):
     pass
 
 
+class GeometryIndex:
+    """A spatial index over the features of a geojson layer (eg, from the geometry folder),
+    used to find which feature each lat/long position falls within.
+
+    Features are held in an STRtree, so each lookup only tests the few polygons whose
+    bounding boxes contain the point, and the polygons are prepared so those tests are
+    cheap. Where features overlap, the first one in the file wins."""
+
+    def __init__(self, geometries: list, names: list):
+        self.geometries = np.array(geometries, dtype=object)
+        self.names = names
+
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    @classmethod
+    @functools.lru_cache
+    def from_file(cls, path: str, name_property: str) -> "GeometryIndex":
+        """Loads a geojson feature collection, naming each feature using the given property.
+        The files are large, so each one is only parsed once per process."""
+        with open(path) as f:
+            collection = json.load(f)
+
+        geometries = []
+        names = []
+        for feature in collection["features"]:
+            geometries.append(shape(feature["geometry"]))
+            names.append(feature["properties"][name_property])
+
+        return cls(geometries, names)
+
+    def lookup(self, latitudes, longitudes) -> list:
+        """Returns the name of the feature containing each position (or None)"""
+        points = shapely.points(
+            np.asarray(longitudes, dtype=np.float64), np.asarray(latitudes, dtype=np.float64)
+        )
+        point_index, feature_index = self.tree.query(points, predicate="within")
+
+        # Results aren't ordered, so sort them to keep the first feature for each point
+        order = np.lexsort((feature_index, point_index))
+        point_index, feature_index = point_index[order], feature_index[order]
+        first = np.unique(point_index, return_index=True)[1]
+
+        names = [None] * len(points)
+        for point, feature in zip(point_index[first], feature_index[first]):
+            names[point] = self.names[feature]
+
+        return names
+
+
 class BoroughMapper:
-    """Maps lat/long positions into London boroughsm based on a
+    """Maps lat/long positions into London boroughs, based on a
     borough geojson file"""
 
     def __init__(self, raise_if_not_found=False):
-        with open("geometry/boroughs.json") as f:
-            boundaries = json.load(f)
-
-        self.polygons = {}
+        self.index = GeometryIndex.from_file("geometry/boroughs.json", "name")
         self.raise_if_not_found = raise_if_not_found
 
-        for feature in boundaries["features"]:
-            polygon = shape(feature["geometry"])
-            self.polygons[feature["properties"]["name"]] = polygon
-
     def get_borough(self, latitude, longitude):
-        point = Point(longitude, latitude)
+        return self.get_boroughs([latitude], [longitude])[0]
+
+    def get_boroughs(self, latitudes, longitudes):
+        """Maps a list of positions in one call"""
+        boroughs = self.index.lookup(latitudes, longitudes)
+
+        for i, borough in enumerate(boroughs):
+            if borough is None:
+                if self.raise_if_not_found:
+                    raise NotFoundError(
+                        f"Unable to find borough for point ({latitudes[i]}, {longitudes[i]})"
+                    )
 
-        for name, polygon in self.polygons.items():
-            if polygon.contains(point):
-                return name
+                boroughs[i] = "Outside London"
 
-        if self.raise_if_not_found:
-            raise NotFoundError(f"Unable to find borough for point {point}")
-        
-        return "Outside London"
+        return boroughs
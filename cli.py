@@ -1,11 +1,16 @@
+import asyncio
+import datetime
 import json
 
 import click
 
 from reproj_geojson import ReprojGeojson
+from server import hypertable
+from server.database import engine
 from server.logging import configure_logging
-from server.service import ProcessingResult, SensorService
-from server.types import Series, Source
+from server.service import CacheService, ProcessingResult, SensorService
+from server.source.remote_sources import get_remote_sources
+from server.types import Series, Source, WriteMode
 from server.unit_of_work.unit_of_work import UnitOfWork
 
 # Configure logging
@@ -13,8 +18,10 @@ configure_logging()
 
 
 @click.group()
-def cli():
-    pass
+@click.pass_context
+def cli(ctx):
+    # Remote sources are shared by the whole command, so close their connections at the end
+    ctx.call_on_close(get_remote_sources().close)
 
 
 @cli.command()
@@ -29,19 +36,186 @@ def sync_sites():
 @click.argument("series", required=True, type=click.Choice(Series))
 @click.argument("source", required=True, type=click.Choice(Source))
 @click.option("--resync", required=False, default=False, is_flag=True)
-def sync(site_code: str, series: Series, source: Source, resync: bool):
+@click.option("--write-mode", required=False, default=WriteMode.upsert, type=click.Choice(WriteMode))
+@click.option(
+    "--start",
+    required=False,
+    type=click.DateTime(),
+    help="With --resync, only resync data from this date",
+)
+@click.option(
+    "--end",
+    required=False,
+    type=click.DateTime(),
+    help="With --resync, only resync data before this date",
+)
+def sync(
+    site_code: str,
+    series: Series,
+    source: Source,
+    resync: bool,
+    write_mode: WriteMode,
+    start: datetime.datetime | None,
+    end: datetime.datetime | None,
+):
     """Synchronises a single site between remote sources and our datastore"""
+    if (start is not None or end is not None) and not resync:
+        raise click.UsageError("--start and --end can only be used with --resync")
+
+    if start is not None and end is not None and start >= end:
+        raise click.UsageError("--start must be before --end")
+
     uow = UnitOfWork()
-    SensorService.sync_single_site_data(uow, site_code, None, source, series, resync)
+    SensorService.sync_single_site_data(
+        uow, site_code, None, source, series, resync, write_mode, start=start, end=end
+    )
 
 
 @cli.command()
 @click.option("--resync", required=False, default=False, is_flag=True)
 @click.option("--start", required=False)
-def sync_all(resync, start):
+@click.option(
+    "--concurrency",
+    required=False,
+    type=click.IntRange(min=1),
+    help="Number of concurrent requests to remote sources. If not set, sites are synced serially",
+)
+@click.option(
+    "--write-concurrency",
+    required=False,
+    default=SensorService.write_concurrency,
+    type=click.IntRange(min=1),
+    help="Number of site/series pairs written to the datastore at once, with --concurrency",
+)
+@click.option("--write-mode", required=False, default=WriteMode.upsert, type=click.Choice(WriteMode))
+@click.option(
+    "--resume-window",
+    required=False,
+    default=SensorService.resume_window.total_seconds() / 3600,
+    type=click.FloatRange(min=0),
+    help="Resume the last run if it stopped part way within this many hours. 0 starts a new run",
+)
+@click.option(
+    "--warm-cache/--no-warm-cache",
+    default=True,
+    help="Pre-compute common API queries into the cache once the sync is complete",
+)
+def sync_all(resync, start, concurrency, write_concurrency, write_mode, resume_window, warm_cache):
     """Synchronises all data between remote sources and our datastore"""
     uow = UnitOfWork()
-    SensorService.sync_all(uow, resync, start)
+    resume_window = datetime.timedelta(hours=resume_window) if resume_window else None
+    after_sync = (lambda: CacheService.warm_cache(uow)) if warm_cache else None
+    if concurrency is None:
+        SensorService.sync_all(uow, resync, start, write_mode, resume_window, after_sync)
+    else:
+        asyncio.run(
+            SensorService.sync_all_async(
+                uow,
+                resync,
+                start,
+                concurrency,
+                write_mode,
+                resume_window,
+                after_sync,
+                write_concurrency,
+            )
+        )
+
+
+@cli.command()
+@click.option(
+    "--popular",
+    required=False,
+    default=CacheService.popular_limit,
+    type=click.IntRange(min=0),
+    help="Number of the most requested URLs to warm, as well as the standard set",
+)
+def warm_cache(popular):
+    """Pre-computes common API queries and writes them to the cache"""
+    uow = UnitOfWork()
+    asyncio.run(CacheService.warm_cache(uow, popular_limit=popular))
+
+
+@cli.command()
+@click.option("--errors", required=False, default=False, is_flag=True, help="Only show failures")
+def sync_state(errors):
+    """Shows the outcome of the most recent sync of each site and series"""
+    uow = UnitOfWork()
+
+    match SensorService.get_sync_states(uow):
+        case ProcessingResult.SUCCESS_RETRIEVED, states:
+            for state in states:
+                if errors and state.error is None:
+                    continue
+
+                print(
+                    f"{state.site_code:<12} {state.series.name:<5} "
+                    f"attempt={state.last_attempt:%Y-%m-%d %H:%M} "
+                    f"success={state.last_success or '-'} rows={state.rows} "
+                    f"duration={state.duration or 0:.1f}s run={state.run_id or '-'} "
+                    f"error={state.error or '-'}"
+                )
+
+
+@cli.command()
+def chunk_info():
+    """Shows the chunk layout of the sensor_data hypertable, and the chunk interval recommended
+    for its current row rate"""
+    with engine.connect() as connection:
+        info = hypertable.get_chunk_info(connection)
+
+    print(f"Chunk interval:       {info['chunk_interval']}")
+    print(f"Site partitions:      {info['site_partitions'] or '-'}")
+    print(f"Chunks:               {info['chunks']} ({info['compressed_chunks']} compressed)")
+    print(f"Rows per day:         {info['row_rate']:.0f}")
+    print(f"Recommended interval: {info['recommended_interval']}")
+
+
+@cli.command()
+@click.option(
+    "--interval-days",
+    required=False,
+    type=click.IntRange(min=1),
+    help="Chunk interval. Defaults to the interval recommended for the current row rate",
+)
+@click.option(
+    "--partitions",
+    required=False,
+    type=click.IntRange(min=2),
+    help="Also partition chunks by a hash of site_id into this many partitions",
+)
+@click.option(
+    "--keep-old",
+    required=False,
+    default=False,
+    is_flag=True,
+    help="Keep the original table as sensor_data_old",
+)
+@click.option(
+    "--new-chunks-only",
+    required=False,
+    default=False,
+    is_flag=True,
+    help="Only change the interval of chunks created from now on, without copying any data",
+)
+def rechunk(interval_days, partitions, keep_old, new_chunks_only):
+    """Rebuilds the sensor_data hypertable with a new chunk interval and/or site partitions.
+    Pause syncs while this runs"""
+    if interval_days is None:
+        with engine.connect() as connection:
+            interval = hypertable.get_chunk_info(connection)["recommended_interval"]
+    else:
+        interval = datetime.timedelta(days=interval_days)
+
+    if new_chunks_only:
+        if partitions is not None:
+            raise click.UsageError("--partitions can only be added by rebuilding the table")
+
+        with engine.begin() as connection:
+            hypertable.set_chunk_interval(connection, interval)
+        return
+
+    hypertable.rechunk(engine, interval, partitions, keep_old)
 
 
 @cli.command()
@@ -3,7 +3,7 @@ import datetime
 import logging
 import os
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Iterator
 
 import redis.asyncio as redis
 from fastapi import (
@@ -13,16 +13,14 @@ from fastapi import (
     HTTPException,
     Query,
     Request,
-    Response,
     Security,
     status,
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
 from redis.asyncio.connection import ConnectionPool
 
 import app_config
@@ -32,18 +30,31 @@ from exception_handlers import (
     unhandled_exception_handler,
 )
 from middleware import log_request_middleware
+from server.cache import (
+    CompressedBackend,
+    ResponseCoder,
+    TaggedRedisBackend,
+    TwoTierBackend,
+    cached,
+    get_invalidation_tags,
+    open_cache_backend,
+)
 from server.logging import configure_logging
+from server.repository.chunk_cache import get_chunk_cache
 from server.schemas import (
     SensorDataSchema,
     SiteAverageSchema,
     SyncSiteSchema,
+    SyncStateSchema,
 )
 from server.service import (
+    CacheService,
     GeometryService,
     ProcessingResult,
-    RequestService,
+    RequestLogger,
     SensorService,
 )
+from server.source.remote_sources import get_remote_sources
 from server.types import Classification, Frequency, Series
 from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
 from server.unit_of_work.unit_of_work import UnitOfWork
@@ -58,6 +69,9 @@ api_router = APIRouter()
 
 api_key_header = APIKeyHeader(name="X-API-Key")
 
+# Requests are logged to the database in batches by a background task
+request_logger = RequestLogger(UnitOfWork)
+
 origins = [
     "https://airaware.static.observableusercontent.com",
     "https://observablehq.com",
@@ -94,47 +108,61 @@ def get_api_key(api_key_header: str = Security(api_key_header)) -> str:
     )
 
 
-def request_key_builder(
-    func,
-    namespace: str = "",
-    request: Request = None,
-    response: Response = None,
-    *args,
-    **kwargs,
-):
-    return ":".join(
-        [
-            namespace,
-            request.method.lower(),
-            request.url.path,
-            repr(sorted(request.query_params.items())),
-        ]
-    )
-
-
 # Initialise redis
 @app.on_event("startup")
 async def startup():
     pool = ConnectionPool.from_url(url=app_config.redis_url)
     r = redis.Redis(connection_pool=pool)
     enable_cache = bool(int(os.environ.get("ENABLE_CACHE", "1")))
-    FastAPICache.init(RedisBackend(r), prefix="fastapi-cache", enable=enable_cache)
+    # Large entries are compressed before they reach either tier, so both hold more
+    backend = CompressedBackend(
+        TwoTierBackend(TaggedRedisBackend(r), app_config.local_cache_bytes)
+    )
+    FastAPICache.init(
+        backend, prefix="fastapi-cache", coder=ResponseCoder, enable=enable_cache
+    )
+
+    if enable_cache:
+        await backend.start()
+
+    await request_logger.start()
 
 
-# Dependency
-def get_unit_of_work() -> AbstractUnitOfWork:
-    return UnitOfWork()
+@app.on_event("shutdown")
+async def shutdown():
+    await request_logger.stop()
 
+    if FastAPICache.get_enable():
+        await FastAPICache.get_backend().stop()
 
-def log_request_info(
-    request: Request, uow: AbstractUnitOfWork = Depends(get_unit_of_work)
-):
-    """Logs each request to the database"""
-    RequestService.log_request(uow, str(request.url), request.client.host)
+    # Remote sources are created lazily by the first resync and reused after that
+    remote_sources = get_remote_sources()
+    remote_sources.close()
+    await remote_sources.aclose()
+
+
+# Dependency. FastAPI caches it for the request, so every dependency of a request shares
+# one unit of work (and session), which is closed once the response has been sent. Cached
+# routes, whose computation can outlive the request, are run with a copy instead (see cached)
+def get_unit_of_work() -> Iterator[AbstractUnitOfWork]:
+    uow = UnitOfWork()
+    try:
+        yield uow
+    finally:
+        uow.close()
+
+
+async def log_request_info(request: Request):
+    """Queues each request to be logged to the database. This is async so that it runs on
+    the event loop, which the queue belongs to"""
+    request_logger.log(str(request.url), request.client.host)
 
 
 @api_router.get("/sensor/{series}/{start}/{end}/{frequency}")
-@cache(namespace="api", expire=60 * 60 * 24, key_builder=request_key_builder)  # 1 day
+# Cache for 1 day, and serve for up to an hour longer while refreshing
+@cached(
+    namespace="api", expire=CacheService.expire, stale=CacheService.stale, conditional=True
+)
 def get_sensor_data_route(
     series: Series,
     start: datetime.datetime,
@@ -153,7 +181,10 @@ def get_sensor_data_route(
 
 
 @api_router.get("/site_average/{series}/{start}/{end}")
-@cache(namespace="api", expire=60 * 60 * 24, key_builder=request_key_builder)  # 1 day
+# Cache for 1 day, and serve for up to an hour longer while refreshing
+@cached(
+    namespace="api", expire=CacheService.expire, stale=CacheService.stale, conditional=True
+)
 def get_site_average_route(
     series: Series,
     start: datetime.datetime,
@@ -170,7 +201,9 @@ def get_site_average_route(
 @api_router.get("/sites")
 # Cache for 6h. A bit shorter than 1 day as this URL doesn't have a date in it and handy to make
 # sure it is refreshed a bit more often
-@cache(namespace="api", expire=60 * 60 * 6, key_builder=request_key_builder)
+@cached(
+    namespace="api", expire=CacheService.sites_expire, stale=CacheService.stale, conditional=True
+)
 def get_sites_route(uow: AbstractUnitOfWork = Depends(get_unit_of_work)):
     """Returns the list of all sites from known data sources"""
     match SensorService.get_sites(uow, None):
@@ -179,8 +212,9 @@ def get_sites_route(uow: AbstractUnitOfWork = Depends(get_unit_of_work)):
 
 
 @api_router.get("/geometry/{name}")
-# Don't try and cache geometry - borough is quite large and is bigger than the
-# max size for upstash redis
+# Borough geometry is bigger than the max value size for upstash redis, but is well within it
+# once compressed. It doesn't change when data is synced, so has no validators
+@cached(namespace="api", expire=CacheService.expire, stale=CacheService.stale)
 def get_geometry_route(
     name: str, uow: AbstractUnitOfWork = Depends(get_unit_of_work)
 ) -> dict:
@@ -197,7 +231,10 @@ def get_geometry_route(
 
 
 @api_router.get("/outlier/{series}", status_code=status.HTTP_200_OK)
-@cache(namespace="api", expire=60 * 60 * 24, key_builder=request_key_builder)  # 1 day
+# Cache for 1 day, and serve for up to an hour longer while refreshing
+@cached(
+    namespace="api", expire=CacheService.expire, stale=CacheService.stale, conditional=True
+)
 def get_outliers(
     series: Series,
     uow: AbstractUnitOfWork = Depends(get_unit_of_work),
@@ -214,10 +251,11 @@ def resync_data(
     api_key: str = Security(get_api_key),
     uow: AbstractUnitOfWork = Depends(get_unit_of_work),
 ) -> dict | None:
-    """Resyncs the specified sites and clears the site average cache"""
+    """Resyncs the specified sites and invalidates the cached responses that include them"""
     match SensorService.resync_data(uow, data):
         case ProcessingResult.SUCCESS_UPDATED, _:
-            sync_clear_cache()
+            tags = get_invalidation_tags(data.series, data.site_code, data.start, data.end)
+            sync_invalidate_cache(tags)
             return None
 
         case ProcessingResult.ERROR_NOT_FOUND, detail:
@@ -236,6 +274,23 @@ def resync_data(
             logging.info("help")
 
 
+@api_router.get("/sync_state")
+def get_sync_state_route(
+    api_key: str = Security(get_api_key),
+    uow: AbstractUnitOfWork = Depends(get_unit_of_work),
+) -> list[SyncStateSchema]:
+    """Returns the outcome of the most recent sync of each site and series, for diagnostics"""
+    match SensorService.get_sync_states(uow):
+        case ProcessingResult.SUCCESS_RETRIEVED, states:
+            return states
+
+
+@api_router.get("/cache_stats")
+def get_cache_stats_route(api_key: str = Security(get_api_key)) -> dict:
+    """Returns the hit and miss counts for each cache tier in this worker, for sizing"""
+    return FastAPICache.get_backend().get_stats()
+
+
 @api_router.get("/healthcheck")
 def healthcheck():
     """Healthcheck endpoint when running under fly.dev"""
@@ -252,17 +307,35 @@ async def post_clear_cache(
 
 async def async_clear_cache():
     logging.info("Clearing cache")
-    pool = ConnectionPool.from_url(url=app_config.redis_url)
-    r = redis.Redis(connection_pool=pool)
-    await r.flushdb()
-    logging.info("Cache cleared")
+    async with open_cache_backend() as backend:
+        deleted = await backend.clear("api")
 
+    # Sensor queries are also cached by day, below the response cache
+    chunk_cache = get_chunk_cache()
+    if chunk_cache is not None:
+        deleted += await run_in_threadpool(chunk_cache.clear)
 
-def sync_clear_cache():
+    logging.info(f"Cache cleared ({deleted} keys)")
+
+
+async def async_invalidate_cache(tags: list[str]):
+    async with open_cache_backend() as backend:
+        await backend.invalidate(tags)
+
+
+def run_sync(coroutine):
     try:
-        asyncio.get_running_loop().run_until_complete(async_clear_cache())
+        return asyncio.get_running_loop().run_until_complete(coroutine)
     except RuntimeError:
-        asyncio.run(async_clear_cache())
+        return asyncio.run(coroutine)
+
+
+def sync_clear_cache():
+    run_sync(async_clear_cache())
+
+
+def sync_invalidate_cache(tags: list[str]):
+    run_sync(async_invalidate_cache(tags))
 
 
 app.include_router(api_router, dependencies=[Depends(log_request_info)])
@@ -0,0 +1,33 @@
+from server.cache.cache_tags import (
+    get_invalidation_tags,
+    get_request_key,
+    get_request_tags,
+    request_key_builder,
+)
+from server.cache.compressed_backend import CompressedBackend, is_compressed, open_cache_backend
+from server.cache.data_version import DataVersion, get_data_version
+from server.cache.decorator import cached
+from server.cache.local_cache import LocalCache
+from server.cache.response_coder import ResponseCoder
+from server.cache.single_flight import SingleFlight
+from server.cache.tagged_redis_backend import CacheEntry, TaggedRedisBackend
+from server.cache.two_tier_backend import TwoTierBackend
+
+__all__ = [
+    "CacheEntry",
+    "cached",
+    "CompressedBackend",
+    "DataVersion",
+    "get_data_version",
+    "get_invalidation_tags",
+    "get_request_key",
+    "get_request_tags",
+    "LocalCache",
+    "is_compressed",
+    "open_cache_backend",
+    "request_key_builder",
+    "ResponseCoder",
+    "SingleFlight",
+    "TaggedRedisBackend",
+    "TwoTierBackend",
+]
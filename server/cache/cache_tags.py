@@ -0,0 +1,126 @@
+import datetime
+from contextvars import ContextVar
+
+from fastapi import Request, Response
+
+from server.types import Series
+
+# Tags for the entry currently being cached. The key builder sets this and the backend reads
+# it when the entry is stored, which happens within the same request context
+request_cache_tags: ContextVar[list[str]] = ContextVar("request_cache_tags", default=[])
+
+# Site part of the tag for entries that cover every site (eg, no `codes` filter)
+ALL_SITES = "*"
+
+# Entries covering more than this many months get a single "long" tag, rather than one tag per
+# month, to keep the index small. Any time-bounded invalidation also clears these
+max_tagged_months = 24
+LONG_RANGE = "long"
+
+
+def get_request_key(
+    namespace: str, method: str, path: str, query_params: list[tuple[str, str]]
+) -> str:
+    """Returns the cache key for a request"""
+    return ":".join([namespace, method.lower(), path, repr(sorted(query_params))])
+
+
+def request_key_builder(
+    func,
+    namespace: str = "",
+    request: Request = None,
+    response: Response = None,
+    *args,
+    **kwargs,
+):
+    """Key builder for fastapi_cache, which also tags the entry with the data it covers"""
+    query_params = list(request.query_params.multi_items())
+    request_cache_tags.set(get_request_tags(request.url.path, request.path_params, query_params))
+
+    return get_request_key(namespace, request.method, request.url.path, query_params)
+
+
+def _parse_datetime(value: str | datetime.datetime | None) -> datetime.datetime | None:
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _get_months(start: datetime.datetime, end: datetime.datetime) -> list[str] | None:
+    """Returns the months overlapping [start, end), or None if there are too many to tag"""
+    months = []
+    year, month = start.year, start.month
+
+    while datetime.datetime(year, month, 1, tzinfo=end.tzinfo) < end:
+        months.append(f"{year:04}-{month:02}")
+        if len(months) > max_tagged_months:
+            return None
+
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return months
+
+
+def _get_series_tags(
+    series: str, site_codes: list[str], months: list[str] | None
+) -> list[str]:
+    tags = []
+    for site_code in site_codes:
+        tags.append(f"{series}:{site_code}")
+        for month in months or [LONG_RANGE]:
+            tags.append(f"{series}:{site_code}:{month}")
+
+    return tags
+
+
+def get_request_tags(
+    path: str, path_params: dict, query_params: list[tuple[str, str]]
+) -> list[str]:
+    """Returns the tags for a cached response, describing the data it was built from.
+
+    Responses for a series are tagged by site (or ALL_SITES if not filtered by site code) and
+    by each month in their time range. Anything else is tagged by the first part of its path,
+    eg, "sites"."""
+    series = path_params.get("series")
+    if series is None:
+        return [path.strip("/").split("/")[0]]
+
+    site_codes = [value for name, value in query_params if name == "codes"] or [ALL_SITES]
+
+    start = _parse_datetime(path_params.get("start"))
+    end = _parse_datetime(path_params.get("end"))
+    months = None
+    if start is not None and end is not None and start.tzinfo == end.tzinfo:
+        months = _get_months(start, end)
+
+    return _get_series_tags(series, site_codes, months)
+
+
+def get_invalidation_tags(
+    series: Series,
+    site_code: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> list[str]:
+    """Returns the tags of every entry that may include data for the site and series in the
+    window [start, end). Entries covering all sites are included, as they include this one."""
+    series = series.value
+    end = end or datetime.datetime.utcnow()
+    if start is None:
+        return [f"{series}:{site_code}", f"{series}:{ALL_SITES}"]
+
+    # Entries with a long range aren't tagged by month, so are always included
+    months = _get_months(start, end)
+    tags = []
+    for code in [site_code, ALL_SITES]:
+        if months is None:
+            tags.append(f"{series}:{code}")
+        else:
+            tags.append(f"{series}:{code}:{LONG_RANGE}")
+            tags.extend(f"{series}:{code}:{month}" for month in months)
+
+    return tags
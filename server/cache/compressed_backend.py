@@ -0,0 +1,74 @@
+import gzip
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import redis.asyncio as redis
+from fastapi_cache.backends import Backend
+
+import app_config
+from server.cache.tagged_redis_backend import CacheEntry, TaggedRedisBackend
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def is_compressed(value: bytes) -> bool:
+    """Whether a cached value was compressed. JSON can never start with these bytes"""
+    return value[:2] == GZIP_MAGIC
+
+
+class CompressedBackend(Backend):
+    """Wraps a cache backend so that values of at least `threshold` bytes are stored gzipped.
+    This keeps large responses (eg, geometry and long hourly ranges) within Redis' value size
+    limit, and lets them be sent to clients that accept gzip without recompressing them.
+
+    gzip is used rather than zstd as every client can decode it, so compressed entries can
+    always be served as they are. Anything else is passed through to the wrapped backend."""
+
+    def __init__(self, backend: Backend, threshold: int = 1024, level: int = 6):
+        self.backend = backend
+        self.threshold = threshold
+        self.level = level
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def compress(self, value: bytes | str) -> bytes:
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+
+        if len(value) < self.threshold:
+            return value
+
+        return gzip.compress(value, compresslevel=self.level)
+
+    async def get_with_ttl(self, key: str) -> tuple[int, Optional[bytes]]:
+        return await self.backend.get_with_ttl(key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.backend.get(key)
+
+    async def set(self, key: str, value: bytes | str, expire: Optional[int] = None) -> None:
+        await self.backend.set(key, self.compress(value), expire)
+
+    async def set_many(self, entries: list[CacheEntry]) -> None:
+        await self.backend.set_many(
+            [
+                CacheEntry(entry.key, self.compress(entry.value), entry.expire, entry.tags)
+                for entry in entries
+            ]
+        )
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        return await self.backend.clear(namespace, key)
+
+
+@asynccontextmanager
+async def open_cache_backend() -> AsyncIterator[CompressedBackend]:
+    """Yields a (compressed, tagged) cache backend on a new connection pool, which is closed on
+    exit. Connections belong to the event loop that first uses them, so this is for use
+    outside the app's loop (eg, the CLI). The app uses FastAPICache.get_backend()"""
+    client = redis.Redis.from_url(app_config.redis_url)
+    try:
+        yield CompressedBackend(TaggedRedisBackend(client))
+    finally:
+        await client.close(close_connection_pool=True)
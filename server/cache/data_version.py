@@ -0,0 +1,138 @@
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+import redis
+
+import app_config
+
+# The scope bumped when site details change. Data is versioned per series
+SITES = "sites"
+
+
+class DataVersion:
+    """Tracks when each series' data (and the site list) last changed, as a watermark that
+    HTTP validators (ETag and Last-Modified) can be derived from.
+
+    Versions are held in a Redis hash, so a bump by the sync job is seen by every API worker.
+    Each worker keeps a copy for `local_expire` seconds, so most conditional requests can be
+    answered without a round trip."""
+
+    key = "data-version"
+    local_expire = 5
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self.versions: dict[str, float] = {}
+        self.fetched = 0.0
+        self.lock = threading.Lock()
+
+    def bump(self, *scopes: str) -> None:
+        """Records that the data in each scope has changed"""
+        now = time.time()
+        try:
+            self.client.hset(self.key, mapping={scope: repr(now) for scope in scopes})
+        except redis.RedisError:
+            logging.warning(f"Unable to bump data version for {scopes}", exc_info=True)
+
+        with self.lock:
+            self.versions.update({scope: now for scope in scopes})
+
+    def get_local(self) -> dict[str, float] | None:
+        """Returns this worker's copy of the versions, or None if it needs refreshing"""
+        with self.lock:
+            if time.monotonic() - self.fetched < self.local_expire:
+                return self.versions
+
+        return None
+
+    def get(self) -> dict[str, float]:
+        """Returns the version of each scope, refreshing this worker's copy if it is old"""
+        versions = self.get_local()
+        if versions is not None:
+            return versions
+
+        try:
+            versions = {
+                scope.decode(): float(value)
+                for scope, value in self.client.hgetall(self.key).items()
+            }
+        except redis.RedisError:
+            logging.warning("Unable to read data version", exc_info=True)
+            versions = {}
+
+        with self.lock:
+            self.versions = versions
+            self.fetched = time.monotonic()
+
+        return versions
+
+
+def get_request_scopes(path_params: dict) -> list[str]:
+    """Returns the scopes a route's response depends on. Every data route filters or enriches
+    by site, and those with a series in their path depend on its data too"""
+    if "series" in path_params:
+        return [SITES, str(path_params["series"])]
+
+    return [SITES]
+
+
+def get_validators(versions: dict[str, float], scopes: list[str]) -> dict[str, str] | None:
+    """Returns the ETag and Last-Modified headers for a response built from the given scopes,
+    or None if any of them has no version yet (eg, Redis was flushed since the last sync)"""
+    if any(scope not in versions for scope in scopes):
+        return None
+
+    parts = ",".join(f"{scope}={versions[scope]!r}" for scope in sorted(scopes))
+    digest = hashlib.blake2b(parts.encode(), digest_size=8).hexdigest()
+    modified = max(versions[scope] for scope in scopes)
+
+    return {
+        "ETag": f'W/"{digest}"',
+        "Last-Modified": formatdate(modified, usegmt=True),
+    }
+
+
+def is_not_modified(request_headers, validators: dict[str, str]) -> bool:
+    """Returns whether the client's copy is current, according to If-None-Match or (if that
+    isn't sent) If-Modified-Since"""
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, so W/"x" and "x" match
+        etag = validators["ETag"].removeprefix("W/")
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+
+        return parsedate_to_datetime(validators["Last-Modified"]) <= since
+
+    return False
+
+
+_data_version = None
+
+
+def get_data_version() -> DataVersion | None:
+    """Returns the process-wide data version, or None if caching is disabled"""
+    global _data_version
+
+    if not bool(int(os.environ.get("ENABLE_CACHE", "1"))):
+        return None
+
+    if _data_version is None:
+        _data_version = DataVersion(redis.Redis.from_url(app_config.redis_url))
+
+    return _data_version
@@ -0,0 +1,212 @@
+import asyncio
+import gzip
+import inspect
+import logging
+import time
+from functools import wraps
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi_cache import FastAPICache
+from starlette.requests import Request
+from starlette.responses import Response
+
+from server.cache.cache_tags import request_key_builder
+from server.cache.compressed_backend import is_compressed
+from server.cache.data_version import (
+    get_data_version,
+    get_request_scopes,
+    get_validators,
+    is_not_modified,
+)
+from server.cache.single_flight import SingleFlight
+from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
+
+# Shared by every cached route, so identical requests in this process are coalesced
+single_flight = SingleFlight()
+
+# Background refreshes, referenced here so they aren't garbage collected while running
+refresh_tasks = set()
+
+# How long a worker may hold the lock on computing an entry, and how often other workers
+# check whether it has finished
+lock_timeout = 30
+lock_poll_interval = 0.1
+
+
+def get_response(
+    request: Request, body: bytes | str, max_age: int, validators: dict[str, str] | None = None
+) -> Response:
+    """Returns a response for a cached body, leaving it compressed if the client accepts gzip"""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+
+    headers = {"Cache-Control": f"max-age={max_age}", **(validators or {})}
+    if is_compressed(body):
+        headers["Vary"] = "Accept-Encoding"
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            body = gzip.decompress(body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def get_versions() -> dict[str, float] | None:
+    """Returns the data versions, or None if they aren't tracked"""
+    data_version = get_data_version()
+    if data_version is None:
+        return None
+
+    versions = data_version.get_local()
+    if versions is None:
+        versions = await run_in_threadpool(data_version.get)
+
+    return versions
+
+
+def cached(namespace: str, expire: int, stale: int = 0, conditional: bool = False):
+    """Caches a route's response, like fastapi_cache's @cache, but with single-flight misses
+    and stale-while-revalidate.
+
+    Concurrent misses for the same key wait for one computation: within a process they share
+    a future, and across workers the first to take a short Redis lock computes the entry
+    while the others poll for it.
+
+    Entries are kept for `stale` seconds after they expire. A request for an expired entry
+    gets the stale response straight away, while it is refreshed in the background.
+
+    Cached entries are the encoded response body (see ResponseCoder), so are returned as they
+    are. Compressed entries are sent gzipped to clients that accept it.
+
+    If `conditional` is set, responses carry an ETag and Last-Modified derived from the
+    version of the data they depend on (see DataVersion), and a conditional request for data
+    that hasn't changed is answered with 304 Not Modified before looking in the cache. Cached
+    entries only carry validators if they were computed after the data last changed, so a
+    client can't be given a validator for a response that is already out of date."""
+
+    def wrapper(func):
+        signature = inspect.signature(func)
+
+        # Ask FastAPI for the request and response, on top of the route's own parameters
+        parameters = list(signature.parameters.values())
+        parameters.append(
+            inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        )
+        parameters.append(
+            inspect.Parameter("response", inspect.Parameter.KEYWORD_ONLY, annotation=Response)
+        )
+
+        async def call(kwargs):
+            if inspect.iscoroutinefunction(func):
+                return await func(**kwargs)
+
+            return await run_in_threadpool(func, **kwargs)
+
+        @wraps(func)
+        async def inner(*, request: Request, response: Response, **kwargs):
+            validators = None
+            versions = await get_versions() if conditional else None
+            if versions is not None:
+                scopes = get_request_scopes(request.path_params)
+                validators = get_validators(versions, scopes)
+
+            if validators is not None and is_not_modified(request.headers, validators):
+                return Response(
+                    status_code=304,
+                    headers={"Cache-Control": f"max-age={expire}", **validators},
+                )
+
+            if not FastAPICache.get_enable() or request.headers.get("Cache-Control") in (
+                "no-store",
+                "no-cache",
+            ):
+                response.headers.update(validators or {})
+                return await call(kwargs)
+
+            backend = FastAPICache.get_backend()
+            coder = FastAPICache.get_coder()
+            key = request_key_builder(func, namespace, request=request, response=response)
+
+            async def compute():
+                """Runs the route and caches the (encoded) result.
+
+                The computation may outlive this request (it can be a background refresh, and
+                is shared with other requests, so carries on if this one is cancelled), whereas
+                the request's unit of work is closed once its response is sent. So the route
+                is given its own unit of work, which is closed when it is done."""
+                own_kwargs = {
+                    name: value.copy() if isinstance(value, AbstractUnitOfWork) else value
+                    for name, value in kwargs.items()
+                }
+                try:
+                    value = coder.encode(await call(own_kwargs))
+                finally:
+                    for own_value in own_kwargs.values():
+                        if isinstance(own_value, AbstractUnitOfWork):
+                            own_value.close()
+
+                try:
+                    await backend.set(key, value, expire + stale)
+                except Exception:
+                    logging.warning(f"Error setting cache key '{key}'", exc_info=True)
+
+                return value
+
+            async def compute_once():
+                """Computes the entry, unless another worker already is, in which case waits
+                for it to appear in the cache"""
+                try:
+                    token = await backend.acquire_lock(key, lock_timeout)
+                except Exception:
+                    logging.warning(f"Error locking cache key '{key}'", exc_info=True)
+                    return await compute()
+
+                if token is not None:
+                    try:
+                        return await compute()
+                    finally:
+                        await backend.release_lock(key, token)
+
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(lock_poll_interval)
+                    ttl, value = await backend.get_with_ttl(key)
+                    if value is not None and ttl > stale:
+                        return value
+
+                # The other worker didn't finish in time, so give up waiting
+                return await compute()
+
+            try:
+                ttl, value = await backend.get_with_ttl(key)
+            except Exception:
+                logging.warning(f"Error retrieving cache key '{key}'", exc_info=True)
+                ttl, value = 0, None
+
+            async def refresh():
+                try:
+                    await single_flight.run(key, compute_once)
+                except Exception:
+                    logging.exception(f"Error refreshing cache key '{key}'")
+
+            if value is not None and validators is not None:
+                # The TTL has whole second precision, so this is the earliest it could be
+                created = time.time() - (expire + stale) + ttl
+                if created < max(versions[scope] for scope in scopes):
+                    validators = None
+
+            if value is not None and ttl <= stale and not single_flight.is_running(key):
+                # Serve the stale entry and refresh it in the background
+                task = asyncio.ensure_future(refresh())
+                refresh_tasks.add(task)
+                task.add_done_callback(refresh_tasks.discard)
+            elif value is None:
+                value = await single_flight.run(key, compute_once)
+                ttl = expire + stale
+
+            return get_response(request, value, max(ttl - stale, 0), validators)
+
+        inner.__signature__ = signature.replace(parameters=parameters)
+        return inner
+
+    return wrapper
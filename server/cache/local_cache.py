@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """An in-process LRU cache bounded by the total size (in bytes) of its keys and values,
+    rather than by the number of entries. Each entry has an expiry time, which is returned
+    with it, and is evicted at `evict_at` (which may be earlier)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: OrderedDict[str, tuple[bytes, float, float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _get_size(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> tuple[bytes, float] | None:
+        """Returns the value and its expiry time, or None if the key isn't cached"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires, evict_at = entry
+            if evict_at <= time.time():
+                self._remove(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return value, expires
+
+    def set(self, key: str, value: bytes, expires: float, evict_at: float | None = None) -> None:
+        """Adds an entry, evicting the least recently used ones to make space"""
+        size = self._get_size(key, value)
+
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+
+            while self.size + size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+            self.entries[key] = (value, expires, expires if evict_at is None else evict_at)
+            self.size += size
+
+    def delete(self, keys: list[str]) -> None:
+        with self.lock:
+            for key in keys:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= self._get_size(key, entry[0])
@@ -0,0 +1,21 @@
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache.coder import Coder
+
+
+class ResponseCoder(Coder):
+    """Encodes a route's result as the JSON body FastAPI would send for it, so that a cached
+    entry can be returned as the response without decoding and re-encoding it"""
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        # The same options as FastAPI's JSONResponse
+        return json.dumps(
+            jsonable_encoder(value), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    @classmethod
+    def decode(cls, value: bytes | str) -> Any:
+        return json.loads(value)
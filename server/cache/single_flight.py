@@ -0,0 +1,28 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key within a process: the first caller runs
+    the function and every other caller for that key awaits the same result, rather than
+    repeating the work."""
+
+    def __init__(self):
+        self.inflight: dict[str, asyncio.Future] = {}
+
+    def is_running(self, key: str) -> bool:
+        return key in self.inflight
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs `func`, unless it is already running for `key`, and returns its result"""
+        future = self.inflight.get(key)
+        if future is not None:
+            # Shield so that one waiter being cancelled (eg, a client disconnecting) doesn't
+            # cancel the work for everybody else
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(func())
+        self.inflight[key] = future
+        future.add_done_callback(lambda _: self.inflight.pop(key, None))
+
+        return await asyncio.shield(future)
@@ -0,0 +1,126 @@
+import json
+import logging
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+import redis.asyncio as redis
+from fastapi_cache.backends.redis import RedisBackend
+
+from server.cache.cache_tags import request_cache_tags
+
+
+@dataclass
+class CacheEntry:
+    """An entry to write to the cache, along with its tags"""
+
+    key: str
+    value: str
+    expire: Optional[int] = None
+    tags: list[str] = field(default_factory=list)
+
+
+class TaggedRedisBackend(RedisBackend):
+    """A Redis cache backend that indexes each entry by its tags (see cache_tags), so that
+    only the entries covering some data can be invalidated when it changes.
+
+    Each tag is a Redis set of the keys tagged with it. Sets may refer to keys that have since
+    expired, which is harmless as deleting a missing key does nothing.
+
+    Whenever entries are changed or deleted, the keys are published on `invalidation_channel`
+    so that any in-process copies (see TwoTierBackend) can be dropped."""
+
+    tag_prefix = "cache-tag"
+    lock_prefix = "cache-lock"
+    invalidation_channel = "cache-invalidate"
+
+    # Tag sets outlive the entries in them. This must be at least the longest cache expiry
+    tag_expire = 60 * 60 * 24 * 7
+
+    def __init__(self, client: redis.Redis):
+        super().__init__(client)
+        # Identifies this backend's own invalidation messages
+        self.origin = uuid.uuid4().hex
+
+    def _get_tag_key(self, tag: str) -> str:
+        return f"{self.tag_prefix}:{tag}"
+
+    def _get_invalidation_message(self, keys: list[str] | None = None) -> str:
+        """Returns a message listing the keys that have changed, or None for all of them"""
+        return json.dumps({"origin": self.origin, "keys": keys})
+
+    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+        await self.set_with_tags(key, value, expire, request_cache_tags.get())
+
+    async def set_with_tags(
+        self, key: str, value: str, expire: Optional[int], tags: list[str]
+    ) -> None:
+        """Stores an entry and adds it to each tag's set, in a single round trip"""
+        await self.set_many([CacheEntry(key, value, expire, tags)])
+
+    async def set_many(self, entries: list[CacheEntry]) -> None:
+        """Stores many entries (and their tags) in a single round trip"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for entry in entries:
+                pipe.set(entry.key, entry.value, ex=entry.expire)
+                for tag in entry.tags:
+                    pipe.sadd(self._get_tag_key(tag), entry.key)
+                    pipe.expire(self._get_tag_key(tag), self.tag_expire)
+
+            keys = [entry.key for entry in entries]
+            pipe.publish(self.invalidation_channel, self._get_invalidation_message(keys))
+            await pipe.execute()
+
+    async def acquire_lock(self, key: str, timeout: float) -> str | None:
+        """Takes a short lock on computing the entry for `key`, shared by every worker. Returns
+        a token to release it with, or None if somebody else holds it. The lock expires after
+        `timeout` seconds in case its holder dies."""
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(
+            f"{self.lock_prefix}:{key}", token, nx=True, px=int(timeout * 1000)
+        )
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """Releases a lock, as long as it is still held with the given token"""
+        await self.redis.eval(
+            "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end",
+            1,
+            f"{self.lock_prefix}:{key}",
+            token,
+        )
+
+    async def invalidate(self, tags: list[str]) -> int:
+        """Deletes every entry with any of the tags, and returns the number of keys deleted"""
+        if not tags:
+            return 0
+
+        tag_keys = [self._get_tag_key(tag) for tag in tags]
+        keys = await self.redis.sunion(tag_keys)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if keys:
+                pipe.delete(*keys)
+                message = self._get_invalidation_message([key.decode() for key in keys])
+                pipe.publish(self.invalidation_channel, message)
+            pipe.delete(*tag_keys)
+            results = await pipe.execute()
+
+        deleted = results[0] if keys else 0
+        logging.info(f"Invalidated {deleted} cache entries for {len(tags)} tags")
+        return deleted
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        """Deletes all entries in the namespace, along with the tag index. Unlike FLUSHDB this
+        leaves anything else in the database alone."""
+        if not namespace:
+            return await super().clear(namespace, key)
+
+        deleted = 0
+        for pattern in [f"{namespace}:*", f"{self.tag_prefix}:*"]:
+            keys = [key async for key in self.redis.scan_iter(match=pattern, count=1000)]
+            if keys:
+                deleted += await self.redis.delete(*keys)
+
+        await self.redis.publish(self.invalidation_channel, self._get_invalidation_message())
+        return deleted
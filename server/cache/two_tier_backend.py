@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from typing import Optional
+
+from fastapi_cache.backends import Backend
+
+from server.cache.local_cache import LocalCache
+from server.cache.tagged_redis_backend import CacheEntry, TaggedRedisBackend
+
+
+class TwoTierBackend(Backend):
+    """A cache backend with an in-process LRU tier in front of a TaggedRedisBackend. Hot keys
+    are served from memory without a round trip to Redis.
+
+    Entries are copied into the local tier for at most `local_expire` seconds (or until they
+    expire in Redis, if sooner). Invalidation messages published by any TaggedRedisBackend
+    (in this process or another) remove them earlier, while start() is listening for them."""
+
+    def __init__(self, redis_backend: TaggedRedisBackend, max_bytes: int, local_expire: int = 300):
+        self.redis_backend = redis_backend
+        self.local = LocalCache(max_bytes)
+        self.local_expire = local_expire
+        self.stats = Counter()
+        self.listener = None
+
+    def _set_local(self, key: str, value: bytes | str, ttl: int | None) -> None:
+        if isinstance(value, str):
+            value = value.encode()
+
+        # A TTL of -1 means the key never expires in Redis
+        ttl = self.local_expire if ttl is None or ttl < 0 else ttl
+        now = time.time()
+        self.local.set(key, value, now + ttl, now + min(ttl, self.local_expire))
+
+    async def get_with_ttl(self, key: str) -> tuple[int, Optional[bytes]]:
+        entry = self.local.get(key)
+        if entry is not None:
+            self.stats["local_hits"] += 1
+            value, expires = entry
+            return int(expires - time.time()), value
+
+        self.stats["local_misses"] += 1
+
+        ttl, value = await self.redis_backend.get_with_ttl(key)
+        if value is None:
+            self.stats["redis_misses"] += 1
+            return ttl, value
+
+        self.stats["redis_hits"] += 1
+        self._set_local(key, value, ttl)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+        await self.redis_backend.set(key, value, expire)
+        self._set_local(key, value, expire)
+
+    async def set_many(self, entries: list[CacheEntry]) -> None:
+        await self.redis_backend.set_many(entries)
+        for entry in entries:
+            self._set_local(entry.key, entry.value, entry.expire)
+
+    async def acquire_lock(self, key: str, timeout: float) -> str | None:
+        return await self.redis_backend.acquire_lock(key, timeout)
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self.redis_backend.release_lock(key, token)
+
+    async def invalidate(self, tags: list[str]) -> int:
+        # The local copies are removed when the invalidation message comes back
+        return await self.redis_backend.invalidate(tags)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if key:
+            self.local.delete([key])
+        else:
+            self.local.clear()
+
+        return await self.redis_backend.clear(namespace, key)
+
+    def get_stats(self) -> dict:
+        """Returns the hit and miss counts for each tier, and the size of the local tier"""
+        return {
+            "local_hits": self.stats["local_hits"],
+            "local_misses": self.stats["local_misses"],
+            "redis_hits": self.stats["redis_hits"],
+            "redis_misses": self.stats["redis_misses"],
+            "local_entries": len(self.local),
+            "local_bytes": self.local.size,
+            "local_max_bytes": self.local.max_bytes,
+        }
+
+    def handle_message(self, data: bytes | str) -> None:
+        """Removes the local copies of the keys in an invalidation message"""
+        message = json.loads(data)
+
+        # Entries set by this process are already up to date locally
+        if message["origin"] == self.redis_backend.origin:
+            return
+
+        if message["keys"] is None:
+            self.local.clear()
+        else:
+            self.local.delete(message["keys"])
+
+    async def listen(self) -> None:
+        """Listens for invalidation messages until cancelled. If the connection is lost, the
+        local tier is cleared (as messages may have been missed) before reconnecting."""
+        while True:
+            try:
+                async with self.redis_backend.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.redis_backend.invalidation_channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.handle_message(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.warning("Lost cache invalidation subscription, retrying", exc_info=True)
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    async def start(self) -> None:
+        self.listener = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
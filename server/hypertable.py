@@ -0,0 +1,248 @@
+import datetime
+import logging
+
+from sqlalchemy import Connection, Engine, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Chunks are sized to hold about this many rows. At roughly 150 bytes per row (including the
+# primary key and series/time index), this keeps a chunk and its indexes to a few hundred MB,
+# well within memory, while keeping the number of chunks a long-range query plans over small
+chunk_target_rows = 2_000_000
+
+# The row rate is measured over this many recent days
+row_rate_days = 30
+
+# Rows are copied to the re-chunked table in windows of this length, each in its own transaction
+rechunk_window = datetime.timedelta(days=30)
+
+# The continuous aggregate and policies on sensor_data, which have to be recreated when the
+# table is replaced (see a4e9c2d7f318 and c7b5e1f09a42)
+create_daily_aggregate = """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_data_daily
+    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+    SELECT
+        time_bucket(INTERVAL '1 day', time) AS day,
+        site_id,
+        series,
+        sum(value) AS value_sum,
+        count(value) AS value_count,
+        min(value) AS value_min,
+        max(value) AS value_max
+    FROM sensor_data
+    GROUP BY day, site_id, series
+    WITH NO DATA
+"""
+
+add_daily_aggregate_policy = """
+    SELECT add_continuous_aggregate_policy(
+        'sensor_data_daily',
+        start_offset => INTERVAL '7 days',
+        end_offset => INTERVAL '1 hour',
+        schedule_interval => INTERVAL '1 hour',
+        if_not_exists => true
+    )
+"""
+
+enable_compression = """
+    ALTER TABLE sensor_data SET (
+        timescaledb.compress,
+        timescaledb.compress_segmentby = 'site_id, series',
+        timescaledb.compress_orderby = 'time DESC'
+    )
+"""
+
+# Chunks are compressed by the policy once all of their data is older than this
+compress_after = datetime.timedelta(days=30)
+
+add_compression_policy = (
+    "SELECT add_compression_policy('sensor_data', "
+    f"INTERVAL '{compress_after.days} days', if_not_exists => true)"
+)
+
+
+def create_hypertable(
+    connection: Connection, table: str, interval: datetime.timedelta, partitions: int | None
+) -> None:
+    """Turns an empty table into a hypertable chunked by time, and optionally by a hash of
+    site_id into `partitions` partitions"""
+    connection.execute(
+        text(
+            "SELECT create_hypertable(:table, 'time', chunk_time_interval => :interval, "
+            "create_default_indexes => false)"
+        ),
+        {"table": table, "interval": interval},
+    )
+
+    if partitions:
+        connection.execute(
+            text("SELECT add_dimension(:table, by_hash('site_id', :partitions))"),
+            {"table": table, "partitions": partitions},
+        )
+
+
+def get_chunk_info(connection: Connection) -> dict:
+    """Returns the current chunk layout of sensor_data, its recent row rate (rows per day) and
+    the chunk interval recommended for that rate"""
+    dimensions = connection.execute(
+        text(
+            "SELECT column_name, time_interval, num_partitions "
+            "FROM timescaledb_information.dimensions WHERE hypertable_name = 'sensor_data' "
+            "ORDER BY dimension_number"
+        )
+    ).all()
+    chunks = connection.execute(
+        text(
+            "SELECT count(*), count(*) FILTER (WHERE is_compressed) "
+            "FROM timescaledb_information.chunks WHERE hypertable_name = 'sensor_data'"
+        )
+    ).one()
+    rows = connection.execute(
+        text("SELECT count(*) FROM sensor_data WHERE time >= now() - :days * INTERVAL '1 day'"),
+        {"days": row_rate_days},
+    ).scalar_one()
+
+    row_rate = rows / row_rate_days
+    return {
+        "chunk_interval": dimensions[0].time_interval,
+        "site_partitions": next(
+            (row.num_partitions for row in dimensions if row.column_name == "site_id"), None
+        ),
+        "chunks": chunks[0],
+        "compressed_chunks": chunks[1],
+        "row_rate": row_rate,
+        "recommended_interval": get_recommended_interval(row_rate),
+    }
+
+
+def get_recommended_interval(row_rate: float) -> datetime.timedelta:
+    """Returns the chunk interval (in whole days, up to a year) that holds about
+    chunk_target_rows rows at the given rate"""
+    if row_rate <= 0:
+        return datetime.timedelta(days=365)
+
+    return datetime.timedelta(days=min(max(round(chunk_target_rows / row_rate), 1), 365))
+
+
+def set_chunk_interval(connection: Connection, interval: datetime.timedelta) -> None:
+    """Sets the interval of chunks created from now on. Existing chunks keep their size, so
+    use rechunk() to change them"""
+    connection.execute(
+        text("SELECT set_chunk_time_interval('sensor_data', :interval)"), {"interval": interval}
+    )
+
+
+def rechunk(
+    engine: Engine,
+    interval: datetime.timedelta,
+    partitions: int | None = None,
+    keep_old: bool = False,
+) -> None:
+    """Rebuilds sensor_data with a new chunk interval, and optionally a site_id space
+    partition, which Timescale can only add to an empty hypertable.
+
+    The data is copied to a new hypertable a window at a time, and then the tables are swapped
+    in a single transaction, which refuses to swap if the row counts no longer match. Syncs
+    should be paused while this runs, as changes made during the copy may be missed.
+
+    The continuous aggregate (which can't outlive the table it is built on) and the policies
+    are recreated in the swap transaction, so sensor_data_daily is never missing. It answers
+    queries from the raw data until it has been refreshed, which happens once the swap has
+    committed. If that refresh fails, the view still gives correct (if slower) results, and
+    the refresh can be run again by hand."""
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS sensor_data_rechunk"))
+        connection.execute(
+            text("CREATE TABLE sensor_data_rechunk (LIKE sensor_data INCLUDING DEFAULTS)")
+        )
+        create_hypertable(connection, "sensor_data_rechunk", interval, partitions)
+
+        first, last = connection.execute(text("SELECT min(time), max(time) FROM sensor_data")).one()
+
+    # Copy the data in time order, so each chunk is filled once
+    if first is not None:
+        window_start = first
+        while window_start <= last:
+            window_end = window_start + rechunk_window
+            with engine.begin() as connection:
+                copied = connection.execute(
+                    text(
+                        "INSERT INTO sensor_data_rechunk (site_id, series, time, value) "
+                        "SELECT site_id, series, time, value FROM sensor_data "
+                        "WHERE time >= :start AND time < :end ORDER BY time"
+                    ),
+                    {"start": window_start, "end": window_end},
+                ).rowcount
+
+            logging.info(f"Copied {copied} rows from {window_start} to {window_end}")
+            window_start = window_end
+
+    # Indexes are built once the data is in place, which is quicker than maintaining them.
+    # These match the migrations, including the time index that create_hypertable would have
+    # created by default
+    with engine.begin() as connection:
+        for statement in [
+            "ALTER TABLE sensor_data_rechunk "
+            "ADD CONSTRAINT sensor_data_rechunk_pkey PRIMARY KEY (site_id, series, time)",
+            "CREATE INDEX ix_sensor_data_rechunk_series_time "
+            "ON sensor_data_rechunk (series, time DESC) INCLUDE (site_id, value)",
+            "CREATE INDEX sensor_data_rechunk_time_idx ON sensor_data_rechunk (time DESC)",
+        ]:
+            connection.execute(text(statement))
+
+    with engine.begin() as connection:
+        # Reads can carry on until the rename, but writes wait for the swap to finish
+        connection.execute(text("LOCK TABLE sensor_data IN EXCLUSIVE MODE"))
+
+        old_rows = connection.execute(text("SELECT count(*) FROM sensor_data")).scalar_one()
+        new_rows = connection.execute(text("SELECT count(*) FROM sensor_data_rechunk")).scalar_one()
+        if old_rows != new_rows:
+            raise RuntimeError(
+                f"sensor_data has {old_rows} rows but the copy has {new_rows}. Was data "
+                "written during the copy?"
+            )
+
+        for statement in [
+            "DROP MATERIALIZED VIEW IF EXISTS sensor_data_daily",
+            "SELECT remove_compression_policy('sensor_data', if_exists => true)",
+            "ALTER TABLE sensor_data RENAME TO sensor_data_old",
+            "ALTER TABLE sensor_data_old RENAME CONSTRAINT sensor_data_pkey "
+            "TO sensor_data_old_pkey",
+            "ALTER TABLE sensor_data_old RENAME CONSTRAINT sensor_data_site_id_fkey "
+            "TO sensor_data_old_site_id_fkey",
+            "ALTER INDEX ix_sensor_data_series_time RENAME TO ix_sensor_data_old_series_time",
+            "ALTER INDEX IF EXISTS sensor_data_time_idx RENAME TO sensor_data_old_time_idx",
+            "ALTER TABLE sensor_data_rechunk RENAME TO sensor_data",
+            "ALTER TABLE sensor_data RENAME CONSTRAINT sensor_data_rechunk_pkey "
+            "TO sensor_data_pkey",
+            "ALTER INDEX ix_sensor_data_rechunk_series_time RENAME TO ix_sensor_data_series_time",
+            "ALTER INDEX sensor_data_rechunk_time_idx RENAME TO sensor_data_time_idx",
+            "ALTER TABLE sensor_data ADD CONSTRAINT sensor_data_site_id_fkey "
+            "FOREIGN KEY (site_id) REFERENCES site (site_id)",
+            enable_compression,
+            add_compression_policy,
+            # Created empty, which (unlike refreshing it) can be done in a transaction
+            create_daily_aggregate,
+            add_daily_aggregate_policy,
+        ]:
+            connection.execute(text(statement))
+
+        if not keep_old:
+            connection.execute(text("DROP TABLE sensor_data_old"))
+
+    logging.info(f"Swapped in re-chunked sensor_data ({new_rows} rows)")
+
+    # Continuous aggregates can't be refreshed inside a transaction
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(
+                text("CALL refresh_continuous_aggregate('sensor_data_daily', NULL, NULL)")
+            )
+    except SQLAlchemyError:
+        logging.exception(
+            "Unable to refresh sensor_data_daily. It will answer queries from sensor_data "
+            "until \"CALL refresh_continuous_aggregate('sensor_data_daily', NULL, NULL)\" "
+            "is run"
+        )
+        raise
+
+    logging.info("Refreshed sensor_data_daily")
@@ -1,12 +1,20 @@
 from server.models.broken_site_model import BrokenSiteModel
 from server.models.request_log_model import RequestLogModel
+from server.models.site_day_stats_model import SiteDayStatsModel
 from server.models.site_model import SiteModel
+from server.models.sensor_data_daily_view import sensor_data_daily
 from server.models.sensor_data_model import SensorDataModel
+from server.models.sync_run_model import SyncRunModel
+from server.models.sync_state_model import SyncStateModel
 
 
 __all__ = [
     "BrokenSiteModel",
     "RequestLogModel",
+    "SiteDayStatsModel",
     "SiteModel",
     "SensorDataModel",
+    "sensor_data_daily",
+    "SyncRunModel",
+    "SyncStateModel",
 ]
@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, DateTime, Enum, Float, Integer, column, table
+
+from server.types import Series
+
+# The sensor_data_daily continuous aggregate, which holds the sum, count, min and max of each
+# site's readings for each series and (UTC) day. It is a view maintained by Timescale rather
+# than a table, so isn't part of the ORM metadata.
+sensor_data_daily = table(
+    "sensor_data_daily",
+    column("day", DateTime(timezone=True)),
+    column("site_id", Integer),
+    column("series", Enum(Series, name="series")),
+    column("value_sum", Float),
+    column("value_count", BigInteger),
+    column("value_min", Float),
+    column("value_max", Float),
+)
@@ -1,6 +1,6 @@
 import datetime
 
-from sqlalchemy import DateTime, ForeignKey
+from sqlalchemy import DateTime, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from server.models.base import Base
@@ -10,9 +10,17 @@ from server.types import Series
 class SensorDataModel(Base):
     __tablename__ = "sensor_data"
 
-    site_id: Mapped[int] = mapped_column(ForeignKey("site.site_id"), primary_key=True, index=True)
-    series: Mapped[Series] = mapped_column(primary_key=True, index=True)
-    time: Mapped[datetime.datetime] = mapped_column(
-        DateTime(timezone=True), primary_key=True, index=True
-    )
+    # Queries for a single site use the primary key
+    site_id: Mapped[int] = mapped_column(ForeignKey("site.site_id"), primary_key=True)
+    series: Mapped[Series] = mapped_column(primary_key=True)
+    time: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
     value: Mapped[float]
+
+
+# Queries across all sites filter on series and time, and only read site_id and value
+Index(
+    "ix_sensor_data_series_time",
+    SensorDataModel.series,
+    SensorDataModel.time.desc(),
+    postgresql_include=["site_id", "value"],
+)
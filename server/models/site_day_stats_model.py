@@ -0,0 +1,30 @@
+import datetime
+
+from sqlalchemy import DateTime, Float, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+
+from server.models.base import Base
+from server.types import Series
+
+
+class SiteDayStatsModel(Base):
+    """The sum, count, min and max of each site's readings for each series and (UTC) day, plus
+    the sum and count for each hour of the day. As the day of the week is fixed for a row,
+    grouping the hourly buckets by day of the week gives hour-of-week totals.
+
+    Unlike the sensor_data_daily aggregate, this is a plain table, kept up to date by the
+    repository in the same transaction as the data it summarises."""
+
+    __tablename__ = "site_day_stats"
+
+    site_id: Mapped[int] = mapped_column(ForeignKey("site.site_id"), primary_key=True)
+    series: Mapped[Series] = mapped_column(primary_key=True)
+    day: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    value_sum: Mapped[float]
+    value_count: Mapped[int]
+    value_min: Mapped[float | None]
+    value_max: Mapped[float | None]
+    # 24 buckets, indexed by (UTC) hour of the day
+    hour_sums: Mapped[list[float]] = mapped_column(ARRAY(Float))
+    hour_counts: Mapped[list[int]] = mapped_column(ARRAY(Integer))
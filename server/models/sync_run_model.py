@@ -0,0 +1,18 @@
+import datetime
+
+from sqlalchemy import DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+
+from server.models.base import Base
+
+
+class SyncRunModel(Base):
+    """Records each run of sync_all, so that a run which stopped part way can be resumed"""
+
+    __tablename__ = "sync_run"
+
+    run_id: Mapped[int] = mapped_column(primary_key=True)
+    started: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+    # Set once every pair in the run has been synced successfully
+    finished: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True))
+    resync: Mapped[bool]
@@ -0,0 +1,23 @@
+import datetime
+
+from sqlalchemy import DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from server.models.base import Base
+from server.types import Series
+
+
+class SyncStateModel(Base):
+    """Records the outcome of the most recent sync of each site and series"""
+
+    __tablename__ = "sync_state"
+
+    site_id: Mapped[int] = mapped_column(ForeignKey("site.site_id"), primary_key=True)
+    series: Mapped[Series] = mapped_column(primary_key=True)
+    last_attempt: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+    last_success: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True))
+    rows: Mapped[int | None]
+    duration: Mapped[float | None]
+    error: Mapped[str | None]
+    # The sync_all run that last attempted this pair, if any
+    run_id: Mapped[int | None] = mapped_column(ForeignKey("sync_run.run_id"))
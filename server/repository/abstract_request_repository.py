@@ -1,4 +1,7 @@
 import abc
+import datetime
+
+from server.schemas import RequestLogBaseSchema
 
 
 class AbstractRequestRepository(abc.ABC):
@@ -7,3 +10,11 @@ class AbstractRequestRepository(abc.ABC):
     @abc.abstractclassmethod
     def log_request(self, url: str, ip_address: str):
         raise NotImplementedError
+
+    @abc.abstractclassmethod
+    def log_requests(self, items: list[RequestLogBaseSchema]) -> None:
+        raise NotImplementedError
+
+    @abc.abstractclassmethod
+    def get_popular_paths(self, since: datetime.datetime, limit: int) -> list[str]:
+        raise NotImplementedError
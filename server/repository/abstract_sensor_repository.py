@@ -2,18 +2,28 @@ import abc
 import datetime
 
 from server.schemas import (
+    SensorBatch,
     SensorDataCreateSchema,
     SensorDataSchema,
     SiteAverageSchema,
     SiteSchema,
+    SyncRunSchema,
+    SyncStateSchema,
 )
-from server.types import Classification, Frequency, Series, Source
+from server.types import Classification, Frequency, Series, Source, WriteMode
 
 
 class AbstractSensorRepository(abc.ABC):
     @classmethod
     @abc.abstractmethod
-    def write_data(self, data: list[SensorDataCreateSchema]) -> None:
+    def write_data(
+        self, data: list[SensorDataCreateSchema], write_mode: WriteMode = WriteMode.orm
+    ) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def write_batch(self, batch: SensorBatch, write_mode: WriteMode = WriteMode.orm) -> None:
         raise NotImplementedError
 
     @classmethod
@@ -31,7 +41,46 @@ class AbstractSensorRepository(abc.ABC):
 
     @classmethod
     @abc.abstractmethod
-    def delete_data(self, series: Series, site_id: int) -> None:
+    def delete_data(
+        self,
+        series: Series,
+        site_id: int,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def update_day_stats(
+        self,
+        series: Series,
+        site_id: int,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def decompress_data(
+        self, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def invalidate_cached_data(
+        self,
+        series: Series,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def invalidate_cached_sites(self) -> None:
         raise NotImplementedError
 
     @classmethod
@@ -46,6 +95,56 @@ class AbstractSensorRepository(abc.ABC):
     def get_latest_date(self, site_id: int, series: Series) -> datetime.datetime:
         raise NotImplementedError
 
+    @classmethod
+    @abc.abstractmethod
+    def get_latest_dates(self) -> dict[tuple[int, Series], datetime.datetime]:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def record_sync_success(
+        self,
+        site_id: int,
+        series: Series,
+        time: datetime.datetime,
+        rows: int,
+        duration: float,
+        run_id: int | None = None,
+    ) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def record_sync_failure(
+        self,
+        site_id: int,
+        series: Series,
+        time: datetime.datetime,
+        error: str,
+        run_id: int | None = None,
+    ) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def get_sync_states(self) -> list[SyncStateSchema]:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def start_sync_run(self, started: datetime.datetime, resync: bool) -> int:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def finish_sync_run(self, run_id: int, finished: datetime.datetime) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    @abc.abstractmethod
+    def get_latest_sync_run(self) -> SyncRunSchema | None:
+        raise NotImplementedError
+
     @classmethod
     @abc.abstractmethod
     def get_sites(self, source: Source | None) -> list[SiteSchema]:
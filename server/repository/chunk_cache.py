@@ -0,0 +1,206 @@
+import datetime
+import json
+import logging
+import os
+from typing import Any, Callable
+
+import redis
+
+import app_config
+
+Query = Callable[[datetime.datetime, datetime.datetime], list]
+
+
+def to_utc(dt: datetime.datetime) -> datetime.datetime:
+    """Returns an aware UTC datetime. Naive datetimes are taken to be UTC already"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=datetime.timezone.utc)
+
+    return dt.astimezone(datetime.timezone.utc)
+
+
+def get_day(dt: datetime.datetime) -> datetime.datetime:
+    """Returns the start of the (UTC) day containing dt"""
+    return to_utc(dt).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class ChunkCache:
+    """Caches query results in day-sized chunks, so that a query for any range can be built
+    from the chunks it covers, and only the days that aren't cached go to the database. This
+    means overlapping ranges (eg, a window dragged by a few hours) share most of their work.
+
+    Only whole days inside the range are cached. Any partial days at either end are always
+    queried, as are days after `settle` ago, which may still be receiving data.
+
+    The keys cached for each series are recorded in a set, so that invalidating them doesn't
+    have to scan the keyspace."""
+
+    prefix = "sensor-chunk"
+    expire = 60 * 60 * 24 * 7
+    settle = datetime.timedelta(days=2)
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    def get_cutoff(self) -> datetime.datetime:
+        """Returns the time before which data is settled, and so can be cached"""
+        return get_day(datetime.datetime.utcnow() - self.settle)
+
+    def get_days(self, start: datetime.datetime, end: datetime.datetime) -> list[datetime.datetime]:
+        """Returns the start of each whole, cacheable day in [start, end)"""
+        day = get_day(start)
+        if day < to_utc(start):
+            day += datetime.timedelta(days=1)
+
+        end = min(to_utc(end), self.get_cutoff())
+        days = []
+        while day + datetime.timedelta(days=1) <= end:
+            days.append(day)
+            day += datetime.timedelta(days=1)
+
+        return days
+
+    def _get_key(self, series: str, day: datetime.datetime, kind: str) -> str:
+        return f"{self.prefix}:{series}:{day:%Y-%m-%d}:{kind}"
+
+    def _get_index_key(self, series: str) -> str:
+        return f"{self.prefix}-index:{series}"
+
+    def get(
+        self,
+        series: str,
+        kind: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        query: Query,
+        get_time: Callable[[Any], datetime.datetime],
+        encode: Callable[[Any], Any],
+        decode: Callable[[Any], Any],
+    ) -> list:
+        """Returns query(start, end), built from cached days where possible.
+
+        `kind` identifies the query and its parameters (other than series and range).
+        `get_time` returns the time of a result item, which is used to split results into
+        days, and `encode`/`decode` convert an item to and from JSON."""
+        days = self.get_days(start, end)
+        if not days:
+            return query(start, end)
+
+        start, end = to_utc(start), to_utc(end)
+
+        one_day = datetime.timedelta(days=1)
+        keys = [self._get_key(series, day, kind) for day in days]
+
+        try:
+            cached = self.client.mget(keys)
+        except redis.RedisError:
+            logging.warning("Unable to read cached chunks", exc_info=True)
+            return query(start, end)
+
+        chunks = {
+            day: [decode(item) for item in json.loads(value)]
+            for day, value in zip(days, cached)
+            if value is not None
+        }
+
+        # Query each run of consecutive missing days at once, then split the results by day
+        missing = {}
+        run = []
+        for day in days + [None]:
+            if day is not None and day not in chunks:
+                run.append(day)
+                continue
+
+            if run:
+                for run_day in run:
+                    missing[run_day] = []
+                for item in query(run[0], run[-1] + one_day):
+                    missing[get_day(get_time(item))].append(item)
+                run = []
+
+        if missing:
+            self._set_many(
+                series,
+                {
+                    self._get_key(series, day, kind): json.dumps([encode(item) for item in items])
+                    for day, items in missing.items()
+                },
+            )
+            chunks.update(missing)
+
+        results = query(start, days[0]) if start < days[0] else []
+        for day in days:
+            results.extend(chunks[day])
+
+        if days[-1] + one_day < end:
+            results.extend(query(days[-1] + one_day, end))
+
+        return results
+
+    def _set_many(self, series: str, values: dict[str, str]) -> None:
+        index = self._get_index_key(series)
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(key, value, ex=self.expire)
+                pipe.sadd(index, *values)
+                # The index outlives every key it lists
+                pipe.expire(index, self.expire)
+                pipe.execute()
+        except redis.RedisError:
+            logging.warning("Unable to cache chunks", exc_info=True)
+
+    def invalidate(
+        self,
+        series: str,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        """Removes the cached days for the series that overlap [start, end)"""
+        if start is not None and to_utc(start) >= self.get_cutoff():
+            # Recent days are never cached
+            return
+
+        first = None if start is None else f"{get_day(start):%Y-%m-%d}"
+        last = None if end is None else f"{to_utc(end):%Y-%m-%d}"
+
+        index = self._get_index_key(series)
+        try:
+            keys = []
+            for key in self.client.smembers(index):
+                day = key.decode().split(":")[2]
+                if (first is None or day >= first) and (last is None or day <= last):
+                    keys.append(key)
+
+            if keys:
+                with self.client.pipeline(transaction=False) as pipe:
+                    pipe.delete(*keys)
+                    pipe.srem(index, *keys)
+                    pipe.execute()
+        except redis.RedisError:
+            logging.warning("Unable to invalidate cached chunks", exc_info=True)
+
+    def clear(self) -> int:
+        """Removes every cached day, and the indexes, returning the number of keys deleted.
+        This scans the keyspace, so is for manual use rather than after each sync"""
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*", count=1000))
+        if not keys:
+            return 0
+
+        return self.client.delete(*keys)
+
+
+_chunk_cache = None
+
+
+def get_chunk_cache() -> ChunkCache | None:
+    """Returns the process-wide chunk cache, or None if caching is disabled"""
+    global _chunk_cache
+
+    if not bool(int(os.environ.get("ENABLE_CACHE", "1"))):
+        return None
+
+    if _chunk_cache is None:
+        _chunk_cache = ChunkCache(redis.Redis.from_url(app_config.redis_url))
+
+    return _chunk_cache
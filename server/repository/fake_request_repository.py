@@ -1,8 +1,21 @@
+import datetime
+
 from server.repository.abstract_request_repository import AbstractRequestRepository
+from server.schemas import RequestLogBaseSchema
 
 
 class FakeRequestRepository(AbstractRequestRepository):
     """A repository that logs API requests"""
 
+    def __init__(self):
+        self.popular_paths = []
+        self.logged = []
+
     def log_request(self, url: str, ip_address: str):
         pass
+
+    def log_requests(self, items: list[RequestLogBaseSchema]) -> None:
+        self.logged.extend(items)
+
+    def get_popular_paths(self, since: datetime.datetime, limit: int) -> list[str]:
+        return self.popular_paths[:limit]
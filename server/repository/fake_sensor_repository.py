@@ -5,12 +5,15 @@ from server.schemas import (
     BreachSchema,
     HeatmapSchema,
     RankSchema,
+    SensorBatch,
     SensorDataCreateSchema,
     SensorDataSchema,
     SiteAverageSchema,
     SiteSchema,
+    SyncRunSchema,
+    SyncStateSchema,
 )
-from server.types import Classification, Frequency, Series, SiteStatus, Source
+from server.types import Classification, Frequency, Series, SiteStatus, Source, WriteMode
 
 
 class FakeSensorRepository(AbstractSensorRepository):
@@ -19,9 +22,24 @@ class FakeSensorRepository(AbstractSensorRepository):
             SensorDataSchema(time=datetime.datetime(2020, 6, 5, 3, 2, 1), value=1.23),
             SensorDataSchema(time=datetime.datetime(2020, 6, 5, 3, 2, 1), value=1.23),
         ]
+        self.deleted = None
+        self.decompressed = None
+        self.day_stats_updated = None
+        self.batches = []
+        self.invalidated = None
+        self.sites_invalidated = False
+        self.sync_states = {}
+        self.sync_runs = []
 
-    def write_data(self, data: list[SensorDataCreateSchema]) -> None:
+    def write_data(
+        self, data: list[SensorDataCreateSchema], write_mode: WriteMode = WriteMode.orm
+    ) -> None:
         self.data = data
+        self.write_mode = write_mode
+
+    def write_batch(self, batch: SensorBatch, write_mode: WriteMode = WriteMode.orm) -> None:
+        self.batches.append(batch)
+        self.write_data(batch.to_create_schemas(), write_mode)
 
     def get_data(
         self,
@@ -34,8 +52,39 @@ class FakeSensorRepository(AbstractSensorRepository):
     ) -> list[SensorDataSchema]:
         return self.data
 
-    def delete_data(self, series: Series, site_id: int) -> None:
-        raise NotImplementedError
+    def delete_data(
+        self,
+        series: Series,
+        site_id: int,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        self.deleted = (series, site_id, start, end)
+
+    def update_day_stats(
+        self,
+        series: Series,
+        site_id: int,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        self.day_stats_updated = (series, site_id, start, end)
+
+    def decompress_data(
+        self, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> None:
+        self.decompressed = (start, end)
+
+    def invalidate_cached_data(
+        self,
+        series: Series,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        self.invalidated = (series, start, end)
+
+    def invalidate_cached_sites(self) -> None:
+        self.sites_invalidated = True
 
     def get_site_average(
         self, series: Series, start: datetime.datetime, end: datetime.datetime
@@ -48,6 +97,63 @@ class FakeSensorRepository(AbstractSensorRepository):
     def get_latest_date(self, site_id: int, series: Series) -> datetime.datetime:
         return datetime.datetime(2020, 6, 5, 3, 2, 1)
 
+    def get_latest_dates(self) -> dict[tuple[int, Series], datetime.datetime]:
+        return {
+            (site.site_id, series): self.get_latest_date(site.site_id, series)
+            for site in self.get_sites(None)
+            for series in Series
+        }
+
+    def record_sync_success(
+        self,
+        site_id: int,
+        series: Series,
+        time: datetime.datetime,
+        rows: int,
+        duration: float,
+        run_id: int | None = None,
+    ) -> None:
+        self.sync_states[(site_id, series)] = SyncStateSchema(
+            site_id=site_id,
+            series=series,
+            last_attempt=time,
+            last_success=time,
+            rows=rows,
+            duration=duration,
+            run_id=run_id,
+        )
+
+    def record_sync_failure(
+        self,
+        site_id: int,
+        series: Series,
+        time: datetime.datetime,
+        error: str,
+        run_id: int | None = None,
+    ) -> None:
+        state = self.sync_states.get(
+            (site_id, series), SyncStateSchema(site_id=site_id, series=series, last_attempt=time)
+        )
+        self.sync_states[(site_id, series)] = state.model_copy(
+            update={"last_attempt": time, "error": error, "run_id": run_id}
+        )
+
+    def get_sync_states(self) -> list[SyncStateSchema]:
+        return list(self.sync_states.values())
+
+    def start_sync_run(self, started: datetime.datetime, resync: bool) -> int:
+        run_id = len(self.sync_runs) + 1
+        self.sync_runs.append(SyncRunSchema(run_id=run_id, started=started, resync=resync))
+        return run_id
+
+    def finish_sync_run(self, run_id: int, finished: datetime.datetime) -> None:
+        self.sync_runs[run_id - 1] = self.sync_runs[run_id - 1].model_copy(
+            update={"finished": finished}
+        )
+
+    def get_latest_sync_run(self) -> SyncRunSchema | None:
+        return self.sync_runs[-1] if self.sync_runs else None
+
     def get_sites(self, source: Source | None) -> list[SiteSchema]:
         return [
             SiteSchema(
@@ -1,9 +1,11 @@
 import datetime
 
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 
 from server.models.request_log_model import RequestLogModel
 from server.repository.abstract_request_repository import AbstractRequestRepository
+from server.schemas import RequestLogBaseSchema
 
 
 class RequestRepository(AbstractRequestRepository):
@@ -16,3 +18,22 @@ class RequestRepository(AbstractRequestRepository):
         """Write an API request to the repository"""
         item = RequestLogModel(path=url, ip_address=ip_address, time=datetime.datetime.utcnow())
         self.session.add(item)
+
+    def log_requests(self, items: list[RequestLogBaseSchema]) -> None:
+        """Writes a batch of API requests to the repository in a single statement"""
+        if items:
+            self.session.execute(
+                insert(RequestLogModel).values([item.model_dump() for item in items])
+            )
+
+    def get_popular_paths(self, since: datetime.datetime, limit: int) -> list[str]:
+        """Returns the most requested URLs since the given time, most popular first"""
+        statement = (
+            select(RequestLogModel.path)
+            .where(RequestLogModel.time >= since)
+            .group_by(RequestLogModel.path)
+            .order_by(func.count().desc())
+            .limit(limit)
+        )
+
+        return list(self.session.scalars(statement))
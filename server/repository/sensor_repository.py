@@ -1,39 +1,211 @@
 import datetime
+import io
 import logging
 from collections import defaultdict
 from typing import List
 
+import numpy as np
 from pydantic import TypeAdapter
-from sqlalchemy import delete, desc, func, select
+from sqlalchemy import (
+    Float,
+    Subquery,
+    cast,
+    delete,
+    func,
+    select,
+    text,
+    true,
+    union_all,
+    update,
+)
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import array, insert
 from sqlalchemy.orm import Session
 
 from app_config import outlier_threshold
-from server.models import SensorDataModel, SiteModel
+from server.cache.data_version import SITES, DataVersion
+from server.hypertable import compress_after
+from server.models import (
+    SensorDataModel,
+    SiteDayStatsModel,
+    SiteModel,
+    SyncRunModel,
+    SyncStateModel,
+    sensor_data_daily,
+)
 from server.repository.abstract_sensor_repository import AbstractSensorRepository
+from server.repository.chunk_cache import ChunkCache, get_day, to_utc
 from server.schemas import (
     BreachSchema,
     HeatmapSchema,
     RankSchema,
+    SensorBatch,
     SensorDataCreateSchema,
     SensorDataSchema,
     SiteAverageSchema,
     SiteSchema,
+    SyncRunSchema,
+    SyncStateSchema,
 )
-from server.types import Classification, Frequency, Series, Source
+from server.types import Classification, Frequency, Series, Source, WriteMode
 
 
 class SensorRepository(AbstractSensorRepository):
-    def __init__(self, session: Session):
+    # Number of rows sent to the database in each COPY or INSERT statement. Upserts use four
+    # bind parameters per row, so this keeps us well below Postgres's limit of 65535
+    write_batch_size = 10000
+
+    def __init__(
+        self,
+        session: Session,
+        chunk_cache: ChunkCache | None = None,
+        data_version: DataVersion | None = None,
+    ):
         self.session = session
+        # If set, get_data and get_site_average results are cached by day
+        self.chunk_cache = chunk_cache
+        # If set, bumped when data changes so that clients revalidate their copies
+        self.data_version = data_version
 
-    def write_data(self, data: list[SensorDataCreateSchema]) -> None:
+    def write_data(
+        self, data: list[SensorDataCreateSchema], write_mode: WriteMode = WriteMode.orm
+    ) -> None:
         """Writes Breathe London series data to the database"""
+        match write_mode:
+            case WriteMode.orm:
+                self._write_data_orm(data)
+
+            case WriteMode.copy:
+                self._write_data_copy(data)
+
+            case WriteMode.upsert:
+                self._write_data_upsert(data)
+
+            case _:
+                raise ValueError(f"Unknown write mode {write_mode}")
+
+    def _write_data_orm(self, data: list[SensorDataCreateSchema]) -> None:
         objects = []
         for item in data:
             db_item = SensorDataModel(**item.model_dump())
             objects.append(db_item)
         self.session.bulk_save_objects(objects)
 
+    def _write_data_copy(self, data: list[SensorDataCreateSchema]) -> None:
+        """Streams data into the sensor_data table using COPY ... FROM STDIN, in batches of
+        `write_batch_size` rows. The COPY runs on the session's connection, so it is part of
+        the current transaction and is committed along with everything else."""
+        cursor = self.session.connection().connection.cursor()
+        try:
+            for index in range(0, len(data), self.write_batch_size):
+                buffer = io.StringIO()
+                for item in data[index : index + self.write_batch_size]:
+                    buffer.write(
+                        f"{item.site_id}\t{item.series.name}\t"
+                        f"{item.time.isoformat()}\t{item.value!r}\n"
+                    )
+                buffer.seek(0)
+
+                cursor.copy_expert(
+                    "COPY sensor_data (site_id, series, time, value) FROM STDIN", buffer
+                )
+        finally:
+            cursor.close()
+
+    def _write_data_upsert(self, data: list[SensorDataCreateSchema]) -> None:
+        """Writes data using INSERT ... ON CONFLICT DO UPDATE, in batches of
+        `write_batch_size` rows, so that existing rows for the same site_id, series and time
+        are overwritten rather than aborting the write"""
+        # Postgres refuses to update the same row twice in one statement, so remove any
+        # duplicate keys first, keeping the last value seen
+        rows = {
+            (item.site_id, item.series, item.time): item.model_dump() for item in data
+        }
+        rows = list(rows.values())
+
+        for index in range(0, len(rows), self.write_batch_size):
+            statement = insert(SensorDataModel).values(
+                rows[index : index + self.write_batch_size]
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=[
+                    SensorDataModel.site_id,
+                    SensorDataModel.series,
+                    SensorDataModel.time,
+                ],
+                set_={"value": statement.excluded.value},
+            )
+            self.session.execute(statement)
+
+    def write_batch(self, batch: SensorBatch, write_mode: WriteMode = WriteMode.orm) -> None:
+        """Writes a columnar batch of readings for a single site and series to the database.
+        The copy and upsert modes work directly from the batch's arrays rather than creating
+        an object per reading."""
+        match write_mode:
+            case WriteMode.orm:
+                self._write_data_orm(batch.to_create_schemas())
+
+            case WriteMode.copy:
+                self._write_batch_copy(batch)
+
+            case WriteMode.upsert:
+                self._write_batch_upsert(batch)
+
+            case _:
+                raise ValueError(f"Unknown write mode {write_mode}")
+
+    def _write_batch_copy(self, batch: SensorBatch) -> None:
+        """As _write_data_copy, but formats the timestamps for the whole batch in one go"""
+        times = np.datetime_as_string(batch.times)
+        values = batch.values.tolist()
+        prefix = f"{batch.site_id}\t{batch.series.name}\t"
+
+        cursor = self.session.connection().connection.cursor()
+        try:
+            for index in range(0, len(batch), self.write_batch_size):
+                buffer = io.StringIO()
+                buffer.writelines(
+                    f"{prefix}{time}\t{value!r}\n"
+                    for time, value in zip(
+                        times[index : index + self.write_batch_size],
+                        values[index : index + self.write_batch_size],
+                    )
+                )
+                buffer.seek(0)
+
+                cursor.copy_expert(
+                    "COPY sensor_data (site_id, series, time, value) FROM STDIN", buffer
+                )
+        finally:
+            cursor.close()
+
+    def _write_batch_upsert(self, batch: SensorBatch) -> None:
+        """As _write_data_upsert, but sends each chunk of the batch as two arrays which are
+        unnested by the database, so there are only four bind parameters per statement
+        however many rows there are"""
+        batch = batch.deduplicate()
+        times = batch.get_datetimes()
+        values = batch.values.tolist()
+
+        statement = text(
+            "INSERT INTO sensor_data (site_id, series, time, value) "
+            "SELECT :site_id, CAST(:series AS series), reading.time, reading.value "
+            "FROM unnest(CAST(:times AS timestamp[]), CAST(:values AS float8[])) "
+            "AS reading(time, value) "
+            "ON CONFLICT (site_id, series, time) DO UPDATE SET value = EXCLUDED.value"
+        )
+
+        for index in range(0, len(batch), self.write_batch_size):
+            self.session.execute(
+                statement,
+                {
+                    "site_id": batch.site_id,
+                    "series": batch.series.name,
+                    "times": times[index : index + self.write_batch_size],
+                    "values": values[index : index + self.write_batch_size],
+                },
+            )
+
     def get_data(
         self,
         series: Series,
@@ -46,6 +218,58 @@ class SensorRepository(AbstractSensorRepository):
         """Reads data from the datastore, averaging across the specified sites. If no
         sites are specified, it averages across all sites.
         """
+        if self.chunk_cache is None:
+            return self._get_data(series, start, end, frequency, codes, types)
+
+        kind = ":".join(
+            [
+                "data",
+                frequency.value,
+                ",".join(sorted(codes or [])),
+                ",".join(sorted(Classification(site_type).value for site_type in types or [])),
+            ]
+        )
+        return self.chunk_cache.get(
+            series.value,
+            kind,
+            start,
+            end,
+            lambda start, end: self._get_data(series, start, end, frequency, codes, types),
+            get_time=lambda item: item.time,
+            encode=lambda item: [item.time.isoformat(), item.value],
+            decode=lambda item: SensorDataSchema(
+                time=datetime.datetime.fromisoformat(item[0]), value=item[1]
+            ),
+        )
+
+    def _get_data(
+        self,
+        series: Series,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        frequency: Frequency,
+        codes: list[str] | None = None,
+        types: list[Classification] | None = None,
+    ) -> list[SensorDataSchema]:
+        totals = self._get_daily_totals(series, start, end) if frequency == Frequency.day else None
+        if totals is not None:
+            query = select(
+                totals.c.day.label("time"), self._get_weighted_average(totals).label("value")
+            )
+            if codes or types:
+                query = query.join(SiteModel, SiteModel.site_id == totals.c.site_id)
+
+                if codes:
+                    query = query.filter(SiteModel.site_code.in_(codes))
+
+                if types:
+                    query = query.filter(SiteModel.site_type.in_(types))
+
+            query = query.group_by(totals.c.day).order_by(totals.c.day)
+
+            SensorDataList = TypeAdapter(List[SensorDataSchema])
+            return SensorDataList.validate_python(self.session.execute(query))
+
         query = (
             select(
                 func.date_trunc(frequency.value, SensorDataModel.time).label("time"),
@@ -74,14 +298,273 @@ class SensorRepository(AbstractSensorRepository):
         SensorDataList = TypeAdapter(List[SensorDataSchema])
         return SensorDataList.validate_python(self.session.execute(query))
 
-    def delete_data(self, series: Series, site_id: int) -> None:
-        """Deletes data from the sensor repository for the specified site_id and series"""
-        self.session.execute(
+    def delete_data(
+        self,
+        series: Series,
+        site_id: int,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        """Deletes data from the sensor repository for the specified site_id and series,
+        optionally limited to the time range [start, end)"""
+        # Only decompress the span that actually holds data to delete
+        span = (
+            select(func.min(SensorDataModel.time), func.max(SensorDataModel.time))
+            .filter(SensorDataModel.site_id == site_id)
+            .filter(SensorDataModel.series == series)
+        )
+        if start is not None:
+            span = span.filter(SensorDataModel.time >= start)
+        if end is not None:
+            span = span.filter(SensorDataModel.time < end)
+
+        first, last = self.session.execute(span).one()
+        if first is not None:
+            self.decompress_data(first, last + datetime.timedelta(microseconds=1))
+
+        query = (
             delete(SensorDataModel)
             .where(SensorDataModel.site_id == site_id)
             .where(SensorDataModel.series == series)
         )
 
+        if start is not None:
+            query = query.where(SensorDataModel.time >= start)
+
+        if end is not None:
+            query = query.where(SensorDataModel.time < end)
+
+        self.session.execute(query)
+        self.update_day_stats(series, site_id, start, end)
+
+    @staticmethod
+    def _get_day_bounds(
+        start: datetime.datetime | None, end: datetime.datetime | None
+    ) -> tuple[datetime.datetime | None, datetime.datetime | None]:
+        """Returns the start of the first day and the end of the last day that overlap
+        [start, end). None (ie, unbounded) is passed through."""
+        start = None if start is None else get_day(start)
+        end = None if end is None else get_day(end - datetime.timedelta(microseconds=1))
+        if end is not None:
+            end += datetime.timedelta(days=1)
+
+        return start, end
+
+    def update_day_stats(
+        self,
+        series: Series,
+        site_id: int,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        """Recalculates the site_day_stats rows of the site and series for the days that
+        overlap [start, end), from the data in sensor_data. Called after data in the range has
+        been written or deleted, in the same transaction, so the two never disagree."""
+        first, last = self._get_day_bounds(start, end)
+
+        query = (
+            delete(SiteDayStatsModel)
+            .where(SiteDayStatsModel.site_id == site_id)
+            .where(SiteDayStatsModel.series == series)
+        )
+        day = self._get_utc_day(SensorDataModel.time)
+        hour = self._get_utc_part("hour", SensorDataModel.time)
+        stats = (
+            select(
+                SensorDataModel.site_id,
+                SensorDataModel.series,
+                day,
+                func.coalesce(func.sum(SensorDataModel.value), 0),
+                func.count(SensorDataModel.value),
+                func.min(SensorDataModel.value),
+                func.max(SensorDataModel.value),
+                array(
+                    [
+                        func.coalesce(func.sum(SensorDataModel.value).filter(hour == h), 0)
+                        for h in range(24)
+                    ]
+                ),
+                array([func.count(SensorDataModel.value).filter(hour == h) for h in range(24)]),
+            )
+            .filter(SensorDataModel.site_id == site_id)
+            .filter(SensorDataModel.series == series)
+            .group_by(SensorDataModel.site_id, SensorDataModel.series, day)
+        )
+
+        if first is not None:
+            query = query.where(SiteDayStatsModel.day >= first)
+            stats = stats.filter(SensorDataModel.time >= first)
+
+        if last is not None:
+            query = query.where(SiteDayStatsModel.day < last)
+            stats = stats.filter(SensorDataModel.time < last)
+
+        self.session.execute(query)
+        self.session.execute(
+            insert(SiteDayStatsModel).from_select(
+                [
+                    SiteDayStatsModel.site_id,
+                    SiteDayStatsModel.series,
+                    SiteDayStatsModel.day,
+                    SiteDayStatsModel.value_sum,
+                    SiteDayStatsModel.value_count,
+                    SiteDayStatsModel.value_min,
+                    SiteDayStatsModel.value_max,
+                    SiteDayStatsModel.hour_sums,
+                    SiteDayStatsModel.hour_counts,
+                ],
+                stats,
+            )
+        )
+
+    def decompress_data(
+        self, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> None:
+        """Decompresses any compressed chunks overlapping [start, end), so that data in them can
+        be written or deleted. The compression policy compresses them again once they are no
+        longer being changed, so the range should be kept to the data actually being changed.
+
+        Chunks are only compressed once they are older than the compression policy's horizon,
+        so there is nothing to do (and no query is made) if the range starts after it."""
+        if start is not None and to_utc(start) >= (
+            datetime.datetime.now(datetime.timezone.utc) - compress_after
+        ):
+            return
+
+        query = text(
+            """
+            SELECT decompress_chunk(format('%I.%I', chunk_schema, chunk_name)::regclass, true)
+            FROM timescaledb_information.chunks
+            WHERE hypertable_name = 'sensor_data'
+            AND is_compressed
+            AND (CAST(:start AS timestamptz) IS NULL OR range_end > :start)
+            AND (CAST(:end AS timestamptz) IS NULL OR range_start < :end)
+            """
+        )
+
+        for (chunk,) in self.session.execute(query, {"start": start, "end": end}):
+            logging.info(f"Decompressed {chunk} to write to it")
+
+    def invalidate_cached_data(
+        self,
+        series: Series,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> None:
+        """Removes any cached results that include data for the series in [start, end), and
+        bumps the series' data version. Called once changes to the data have been committed.
+        If the daily aggregate can't be refreshed, the caches are still invalidated before the
+        error is raised."""
+        try:
+            self.refresh_daily_aggregate(start, end)
+        finally:
+            if self.chunk_cache is not None:
+                self.chunk_cache.invalidate(series.value, start, end)
+
+            if self.data_version is not None:
+                self.data_version.bump(series.value)
+
+    def refresh_daily_aggregate(
+        self, start: datetime.datetime | None = None, end: datetime.datetime | None = None
+    ) -> None:
+        """Refreshes the days of the sensor_data_daily continuous aggregate that overlap
+        [start, end), so that changes to data that has already been aggregated are included.
+        A refresh can't be run in a transaction, so this uses its own connection.
+
+        The refresh policy only covers the last 7 days, so older days would stay out of date
+        if this failed quietly. Instead, the call needed to retry it is logged and the error
+        raised, which records the sync as failed."""
+        start, end = self._get_day_bounds(start, end)
+
+        engine = self.session.get_bind().engine
+        try:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(
+                    text("CALL refresh_continuous_aggregate('sensor_data_daily', :start, :end)"),
+                    {"start": start, "end": end},
+                )
+        except SQLAlchemyError:
+            bounds = ", ".join("NULL" if bound is None else f"'{bound}'" for bound in (start, end))
+            logging.exception(
+                f"Unable to refresh sensor_data_daily between {start} and {end}. It will be out "
+                f"of date until \"CALL refresh_continuous_aggregate('sensor_data_daily', "
+                f"{bounds})\" is run"
+            )
+            raise
+
+    @staticmethod
+    def _get_utc_day(column):
+        """The start of the UTC day containing a timestamptz column. Unlike date_trunc, this
+        doesn't depend on the session's TimeZone, and matches sensor_data_daily's buckets"""
+        return func.time_bucket(datetime.timedelta(days=1), column)
+
+    @staticmethod
+    def _get_utc_part(field: str, column):
+        """A field (eg, hour or dow) of a timestamptz column, in UTC whatever the session's
+        TimeZone"""
+        return func.date_part(field, func.timezone("UTC", column))
+
+    @staticmethod
+    def _get_weighted_average(totals: Subquery):
+        """The average of the readings summarised by rows of daily totals"""
+        return func.sum(totals.c.value_sum) / cast(func.sum(totals.c.value_count), Float)
+
+    def _get_daily_totals(
+        self, series: Series, start: datetime.datetime, end: datetime.datetime
+    ) -> Subquery | None:
+        """Returns a subquery of the sum and count of each site's readings for each day in
+        [start, end), or None if the range doesn't include a whole day. Whole days are read
+        from the sensor_data_daily continuous aggregate, and any partial days at either end
+        from sensor_data, so the totals are the same as aggregating sensor_data directly."""
+        first = get_day(start)
+        if first < to_utc(start):
+            first += datetime.timedelta(days=1)
+
+        last = get_day(end)
+        if first >= last:
+            return None
+
+        parts = [
+            select(
+                sensor_data_daily.c.day,
+                sensor_data_daily.c.site_id,
+                sensor_data_daily.c.value_sum,
+                sensor_data_daily.c.value_count,
+            )
+            .filter(sensor_data_daily.c.series == series)
+            .filter(sensor_data_daily.c.day >= first)
+            .filter(sensor_data_daily.c.day < last)
+        ]
+
+        day = self._get_utc_day(SensorDataModel.time)
+        for range_start, range_end in [(start, first), (last, end)]:
+            if to_utc(range_start) < to_utc(range_end):
+                parts.append(
+                    select(
+                        day.label("day"),
+                        SensorDataModel.site_id,
+                        func.sum(SensorDataModel.value).label("value_sum"),
+                        func.count(SensorDataModel.value).label("value_count"),
+                    )
+                    .filter(SensorDataModel.series == series)
+                    .filter(SensorDataModel.time >= range_start)
+                    .filter(SensorDataModel.time < range_end)
+                    .group_by(day, SensorDataModel.site_id)
+                )
+
+        return union_all(*parts).subquery()
+
+    def invalidate_cached_sites(self) -> None:
+        """Removes every cached chunk, and bumps the site list's data version. Called once
+        changes to the sites have been committed. Chunks are filtered by site type and code,
+        and site totals include each site in the list, so none of them can be kept."""
+        if self.chunk_cache is not None:
+            for series in Series:
+                self.chunk_cache.invalidate(series.value)
+
+        if self.data_version is not None:
+            self.data_version.bump(SITES)
+
     def get_site_average(
         self, series: Series, start: datetime.datetime, end: datetime.datetime
     ) -> list[SiteAverageSchema]:
@@ -89,37 +572,208 @@ class SensorRepository(AbstractSensorRepository):
         across the specified time period. Data is returned as list of site_code
         and average value.
         """
+        if self.chunk_cache is None:
+            return self._get_site_average(series, start, end)
+
+        # Averages can't be combined, so cache each site's daily sum and count instead
+        totals = defaultdict(lambda: [0.0, 0])
+        for _, site_code, total, count in self.chunk_cache.get(
+            series.value,
+            "site_totals",
+            start,
+            end,
+            lambda start, end: self._get_site_daily_totals(series, start, end),
+            get_time=lambda item: item[0],
+            encode=lambda item: [item[0].isoformat(), *item[1:]],
+            decode=lambda item: (datetime.datetime.fromisoformat(item[0]), *item[1:]),
+        ):
+            totals[site_code][0] += total
+            totals[site_code][1] += count
+
+        return [
+            SiteAverageSchema(site_code=site_code, value=total / count)
+            for site_code, (total, count) in sorted(totals.items())
+        ]
+
+    def _get_site_daily_totals(
+        self, series: Series, start: datetime.datetime, end: datetime.datetime
+    ) -> list[tuple[datetime.datetime, str, float, int]]:
+        """Returns the sum and count of each site's readings for each day in the range"""
+        totals = self._get_daily_totals(series, start, end)
+        if totals is not None:
+            query = (
+                select(
+                    totals.c.day,
+                    SiteModel.site_code,
+                    func.sum(totals.c.value_sum),
+                    func.sum(totals.c.value_count),
+                )
+                .join(SiteModel, SiteModel.site_id == totals.c.site_id)
+                .group_by(totals.c.day, SiteModel.site_code)
+                .order_by(totals.c.day, SiteModel.site_code)
+            )
+            return [
+                (time, site_code, total, int(count))
+                for time, site_code, total, count in self.session.execute(query)
+            ]
+
+        day = self._get_utc_day(SensorDataModel.time)
         query = (
             select(
-                SiteModel.site_code.label("site_code"),
-                func.avg(SensorDataModel.value).label("value"),
+                day.label("time"),
+                SiteModel.site_code,
+                func.sum(SensorDataModel.value),
+                func.count(SensorDataModel.value),
             )
             .join(SiteModel, SiteModel.site_id == SensorDataModel.site_id)
             .filter(SensorDataModel.series == series)
             .filter(SensorDataModel.time >= start)
             .filter(SensorDataModel.time < end)
-            .group_by(SiteModel.site_code)
-            .order_by(SiteModel.site_code)
+            .group_by(day, SiteModel.site_code)
+            .order_by(day, SiteModel.site_code)
         )
 
+        return [tuple(row) for row in self.session.execute(query)]
+
+    def _get_site_average(
+        self, series: Series, start: datetime.datetime, end: datetime.datetime
+    ) -> list[SiteAverageSchema]:
+        totals = self._get_daily_totals(series, start, end)
+        if totals is not None:
+            query = (
+                select(
+                    SiteModel.site_code.label("site_code"),
+                    self._get_weighted_average(totals).label("value"),
+                )
+                .join(SiteModel, SiteModel.site_id == totals.c.site_id)
+                .group_by(SiteModel.site_code)
+                .order_by(SiteModel.site_code)
+            )
+        else:
+            query = (
+                select(
+                    SiteModel.site_code.label("site_code"),
+                    func.avg(SensorDataModel.value).label("value"),
+                )
+                .join(SiteModel, SiteModel.site_id == SensorDataModel.site_id)
+                .filter(SensorDataModel.series == series)
+                .filter(SensorDataModel.time >= start)
+                .filter(SensorDataModel.time < end)
+                .group_by(SiteModel.site_code)
+                .order_by(SiteModel.site_code)
+            )
+
         site_averages = self.session.execute(query)
         SiteAveragesList = TypeAdapter(List[SiteAverageSchema])
         return SiteAveragesList.validate_python(site_averages)
 
     def get_latest_date(self, site_id: int, series: Series) -> datetime.datetime:
-        reading = (
-            self.session.execute(
-                select(SensorDataModel)
-                .filter(SensorDataModel.site_id == site_id)
-                .filter(SensorDataModel.series == series)
-                .order_by(desc(SensorDataModel.time))
-                .limit(1)
+        """Returns the time of the most recent data for the site and series, or None if
+        there isn't any"""
+        return self.session.execute(
+            select(func.max(SensorDataModel.time))
+            .filter(SensorDataModel.site_id == site_id)
+            .filter(SensorDataModel.series == series)
+        ).scalar_one_or_none()
+
+    def get_latest_dates(self) -> dict[tuple[int, Series], datetime.datetime]:
+        """Returns the time of the most recent data for every site and series in a single
+        query, keyed by (site_id, series). Pairs with no data are omitted."""
+        query = select(
+            SensorDataModel.site_id,
+            SensorDataModel.series,
+            func.max(SensorDataModel.time).label("time"),
+        ).group_by(SensorDataModel.site_id, SensorDataModel.series)
+
+        return {(row.site_id, row.series): row.time for row in self.session.execute(query)}
+
+    def record_sync_success(
+        self,
+        site_id: int,
+        series: Series,
+        time: datetime.datetime,
+        rows: int,
+        duration: float,
+        run_id: int | None = None,
+    ) -> None:
+        """Records a successful sync of the site and series, as part of the sync_all run
+        `run_id` if set"""
+        values = {
+            "last_attempt": time,
+            "last_success": time,
+            "rows": rows,
+            "duration": duration,
+            "error": None,
+            "run_id": run_id,
+        }
+        statement = insert(SyncStateModel).values(site_id=site_id, series=series, **values)
+        self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[SyncStateModel.site_id, SyncStateModel.series], set_=values
             )
-            .scalars()
-            .first()
         )
 
-        return None if reading is None else reading.time
+    def record_sync_failure(
+        self,
+        site_id: int,
+        series: Series,
+        time: datetime.datetime,
+        error: str,
+        run_id: int | None = None,
+    ) -> None:
+        """Records a failed sync of the site and series, as part of the sync_all run `run_id`
+        if set. The details of the last successful sync are kept."""
+        values = {"last_attempt": time, "error": error, "run_id": run_id}
+        statement = insert(SyncStateModel).values(site_id=site_id, series=series, **values)
+        self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[SyncStateModel.site_id, SyncStateModel.series], set_=values
+            )
+        )
+
+    def get_sync_states(self) -> list[SyncStateSchema]:
+        """Returns the sync state of every site and series that has been synced, ordered by
+        site code"""
+        query = (
+            select(
+                SyncStateModel.site_id,
+                SiteModel.site_code,
+                SyncStateModel.series,
+                SyncStateModel.last_attempt,
+                SyncStateModel.last_success,
+                SyncStateModel.rows,
+                SyncStateModel.duration,
+                SyncStateModel.error,
+                SyncStateModel.run_id,
+            )
+            .join(SiteModel, SiteModel.site_id == SyncStateModel.site_id)
+            .order_by(SiteModel.site_code, SyncStateModel.series)
+        )
+
+        SyncStateList = TypeAdapter(List[SyncStateSchema])
+        return SyncStateList.validate_python(self.session.execute(query))
+
+    def start_sync_run(self, started: datetime.datetime, resync: bool) -> int:
+        """Records the start of a sync_all run, returning its id"""
+        statement = (
+            insert(SyncRunModel)
+            .values(started=started, resync=resync)
+            .returning(SyncRunModel.run_id)
+        )
+        return self.session.execute(statement).scalar_one()
+
+    def finish_sync_run(self, run_id: int, finished: datetime.datetime) -> None:
+        """Records that every pair in a sync_all run has been synced successfully"""
+        self.session.execute(
+            update(SyncRunModel).where(SyncRunModel.run_id == run_id).values(finished=finished)
+        )
+
+    def get_latest_sync_run(self) -> SyncRunSchema | None:
+        """Returns the most recently started sync_all run, if there has been one"""
+        run = self.session.scalars(
+            select(SyncRunModel).order_by(SyncRunModel.started.desc()).limit(1)
+        ).first()
+        return None if run is None else SyncRunSchema.model_validate(run)
 
     def get_sites(self, source: Source | None) -> list[SiteSchema]:
         """Returns the list of sites ordered by site code and optionally
@@ -170,6 +824,12 @@ class SensorRepository(AbstractSensorRepository):
                 new_obj.site_id = existing_site.site_id
                 self.session.merge(new_obj)
 
+    @staticmethod
+    def _is_whole_days(start: datetime.datetime, end: datetime.datetime) -> bool:
+        """Returns whether [start, end) is made up of whole (UTC) days, and so can be answered
+        from site_day_stats"""
+        return get_day(start) == to_utc(start) and get_day(end) == to_utc(end)
+
     def get_heatmap(
         self,
         series: Series,
@@ -179,23 +839,53 @@ class SensorRepository(AbstractSensorRepository):
         """Gets heatmap data for the specified series by hour of day and day of week, for all
         sites.
         """
-        query = (
-            select(
-                SiteModel.site_code,
-                func.date_part("dow", SensorDataModel.time).label("day"),
-                func.date_part("hour", SensorDataModel.time).label("hour"),
-                func.avg(SensorDataModel.value).label("value"),
+        if self._is_whole_days(start, end):
+            # Each day's hourly buckets, numbered from 1
+            hours = (
+                func.unnest(SiteDayStatsModel.hour_sums, SiteDayStatsModel.hour_counts)
+                .table_valued("value_sum", "value_count", with_ordinality="number")
+                .render_derived()
+            )
+            day = self._get_utc_part("dow", SiteDayStatsModel.day)
+            hour = hours.c.number - 1
+            query = (
+                select(
+                    SiteModel.site_code,
+                    day.label("day"),
+                    hour.label("hour"),
+                    (
+                        func.sum(hours.c.value_sum) / cast(func.sum(hours.c.value_count), Float)
+                    ).label("value"),
+                )
+                .select_from(SiteDayStatsModel)
+                .join(hours, true())
+                .join(SiteModel, SiteModel.site_id == SiteDayStatsModel.site_id)
+                .filter(SiteDayStatsModel.series == series)
+                .filter(SiteDayStatsModel.day >= start)
+                .filter(SiteDayStatsModel.day < end)
+                .filter(SiteModel.is_enabled == True)
+                .group_by(SiteModel.site_code, day, hour)
+                .having(func.sum(hours.c.value_count) > 0)
+                .order_by(SiteModel.site_code)
+            )
+        else:
+            day = self._get_utc_part("dow", SensorDataModel.time)
+            hour = self._get_utc_part("hour", SensorDataModel.time)
+            query = (
+                select(
+                    SiteModel.site_code,
+                    day.label("day"),
+                    hour.label("hour"),
+                    func.avg(SensorDataModel.value).label("value"),
+                )
+                .filter(SensorDataModel.series == series.name)
+                .filter(SensorDataModel.time >= start)
+                .filter(SensorDataModel.time < end)
+                .filter(SiteModel.is_enabled == True)
+                .join(SiteModel, SiteModel.site_id == SensorDataModel.site_id)
+                .group_by(SiteModel.site_code, day, hour)
+                .order_by(SiteModel.site_code)
             )
-            .filter(SensorDataModel.series == series.name)
-            .filter(SensorDataModel.time >= start)
-            .filter(SensorDataModel.time < end)
-            .filter(SiteModel.is_enabled == True)
-            .join(SiteModel, SiteModel.site_id == SensorDataModel.site_id)
-            .group_by(SiteModel.site_code)
-            .group_by(func.date_part("dow", SensorDataModel.time).label("day"))
-            .group_by(func.date_part("hour", SensorDataModel.time).label("hour"))
-            .order_by(SiteModel.site_code)
-        )
 
         # Return a dict of heatmap data, keyed by site_code
         result = self.session.execute(query)
@@ -217,21 +907,39 @@ class SensorRepository(AbstractSensorRepository):
         """Gets the number of days the daily average is above the speficied threshold for each
         site.
         """
-        daily_avg_subquery = (
-            select(
-                SiteModel.site_code,
-                func.date_trunc("day", SensorDataModel.time).label("date"),
-                func.avg(SensorDataModel.value).label("average"),
+        if self._is_whole_days(start, end):
+            daily_avg_subquery = (
+                select(
+                    SiteModel.site_code,
+                    SiteDayStatsModel.day.label("date"),
+                    (
+                        SiteDayStatsModel.value_sum / cast(SiteDayStatsModel.value_count, Float)
+                    ).label("average"),
+                )
+                .join(SiteModel, SiteModel.site_id == SiteDayStatsModel.site_id)
+                .filter(SiteDayStatsModel.series == series)
+                .filter(SiteDayStatsModel.day >= start)
+                .filter(SiteDayStatsModel.day < end)
+                .filter(SiteDayStatsModel.value_count > 0)
+                .filter(SiteModel.is_enabled == True)
+                .subquery()
+            )
+        else:
+            day = self._get_utc_day(SensorDataModel.time)
+            daily_avg_subquery = (
+                select(
+                    SiteModel.site_code,
+                    day.label("date"),
+                    func.avg(SensorDataModel.value).label("average"),
+                )
+                .join(SiteModel, SiteModel.site_id == SensorDataModel.site_id)
+                .filter(SensorDataModel.series == series.name)
+                .filter(SensorDataModel.time >= start)
+                .filter(SensorDataModel.time < end)
+                .filter(SiteModel.is_enabled == True)
+                .group_by(SiteModel.site_code, day)
+                .subquery()
             )
-            .join(SiteModel, SiteModel.site_id == SensorDataModel.site_id)
-            .filter(SensorDataModel.series == series.name)
-            .filter(SensorDataModel.time >= start)
-            .filter(SensorDataModel.time < end)
-            .filter(SiteModel.is_enabled == True)
-            .group_by(SiteModel.site_code)
-            .group_by(func.date_trunc("day", SensorDataModel.time))
-            .subquery()
-        )
 
         breach_query = (
             select(
@@ -309,21 +1017,40 @@ class SensorRepository(AbstractSensorRepository):
         end: datetime.datetime,
     ) -> dict[str, RankSchema]:
         """Gets the average over the period, and the rank of each site (1 = lowest)"""
-        query = (
-            select(
-                SiteModel.site_code,
-                func.avg(SensorDataModel.value).label("average"),
-                func.row_number()
-                .over(order_by=func.avg(SensorDataModel.value))
-                .label("rank"),
+        if self._is_whole_days(start, end):
+            average = func.sum(SiteDayStatsModel.value_sum) / cast(
+                func.sum(SiteDayStatsModel.value_count), Float
+            )
+            query = (
+                select(
+                    SiteModel.site_code,
+                    average.label("average"),
+                    func.row_number().over(order_by=average).label("rank"),
+                )
+                .join(SiteModel, SiteModel.site_id == SiteDayStatsModel.site_id)
+                .filter(SiteDayStatsModel.series == series)
+                .filter(SiteDayStatsModel.day >= start)
+                .filter(SiteDayStatsModel.day < end)
+                .filter(SiteModel.is_enabled == True)
+                .group_by(SiteModel.site_code)
+                .having(func.sum(SiteDayStatsModel.value_count) > 0)
+            )
+        else:
+            query = (
+                select(
+                    SiteModel.site_code,
+                    func.avg(SensorDataModel.value).label("average"),
+                    func.row_number()
+                    .over(order_by=func.avg(SensorDataModel.value))
+                    .label("rank"),
+                )
+                .join(SiteModel)
+                .filter(SensorDataModel.series == series.name)
+                .filter(SensorDataModel.time >= start)
+                .filter(SensorDataModel.time < end)
+                .filter(SiteModel.is_enabled == True)
+                .group_by(SiteModel.site_code)
             )
-            .join(SiteModel)
-            .filter(SensorDataModel.series == series.name)
-            .filter(SensorDataModel.time >= start)
-            .filter(SensorDataModel.time < end)
-            .filter(SiteModel.is_enabled == True)
-            .group_by(SiteModel.site_code)
-        )
 
         # Return a dict of rank data, keyed by site_code
         result = self.session.execute(query)
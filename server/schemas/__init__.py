@@ -3,7 +3,8 @@ from server.schemas.heatmap_schema import HeatmapSchema
 from server.schemas.outlier_block_schema import OutlierBlockSchema
 from server.schemas.range_schema import RangeSchema
 from server.schemas.rank_schema import RankSchema
-from server.schemas.request_log_schema import RequestLogSchema
+from server.schemas.request_log_schema import RequestLogBaseSchema, RequestLogSchema
+from server.schemas.sensor_batch import SensorBatch
 from server.schemas.sensor_data_schema import (
     SensorDataCreateSchema,
     SensorDataRemoteSchema,
@@ -12,6 +13,9 @@ from server.schemas.sensor_data_schema import (
 from server.schemas.site_average_schema import SiteAverageSchema
 from server.schemas.site_schema import SiteCreateSchema, SiteSchema
 from server.schemas.sync_site_schema import SyncSiteSchema
+from server.schemas.sync_run_schema import SyncRunSchema
+from server.schemas.sync_state_schema import SyncStateSchema
+from server.schemas.sync_task_schema import SyncTaskSchema
 from server.schemas.wrapped_schema import WrappedSchema
 
 __all__ = [
@@ -20,7 +24,9 @@ __all__ = [
     "OutlierBlockSchema",
     "RangeSchema",
     "RankSchema",
+    "RequestLogBaseSchema",
     "RequestLogSchema",
+    "SensorBatch",
     "SensorDataCreateSchema",
     "SensorDataRemoteSchema",
     "SensorDataSchema",
@@ -28,5 +34,8 @@ __all__ = [
     "SiteCreateSchema",
     "SiteSchema",
     "SyncSiteSchema",
+    "SyncRunSchema",
+    "SyncStateSchema",
+    "SyncTaskSchema",
     "WrappedSchema",
 ]
@@ -0,0 +1,79 @@
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+
+from server.schemas.sensor_data_schema import SensorDataCreateSchema, SensorDataRemoteSchema
+from server.types import Series
+
+
+@dataclass
+class SensorBatch:
+    """A columnar batch of readings for a single site and series. Times are UTC and held as
+    a datetime64[s] array, with values in a matching float64 array. This avoids creating
+    (and validating) a Python object per reading on the ingest path.
+
+    Remote sources don't know the site_id, so it is filled in before the batch is written."""
+
+    times: np.ndarray
+    values: np.ndarray
+    site_id: int | None = None
+    series: Series | None = None
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def empty(cls) -> "SensorBatch":
+        return cls(
+            times=np.array([], dtype="datetime64[s]"), values=np.array([], dtype=np.float64)
+        )
+
+    @classmethod
+    def concatenate(cls, batches: list["SensorBatch"]) -> "SensorBatch":
+        """Joins batches (for the same site and series) into one"""
+        if not batches:
+            return cls.empty()
+
+        return cls(
+            times=np.concatenate([batch.times for batch in batches]),
+            values=np.concatenate([batch.values for batch in batches]),
+            site_id=batches[0].site_id,
+            series=batches[0].series,
+        )
+
+    def deduplicate(self) -> "SensorBatch":
+        """Returns a batch with at most one reading per time, keeping the last one seen"""
+        # np.unique returns the first index of each time, so search the reversed arrays
+        _, index = np.unique(self.times[::-1], return_index=True)
+        index = len(self.times) - 1 - index
+
+        return SensorBatch(
+            times=self.times[index],
+            values=self.values[index],
+            site_id=self.site_id,
+            series=self.series,
+        )
+
+    def get_span(self) -> tuple[datetime.datetime, datetime.datetime]:
+        """Returns the first and last times in the batch as (naive, UTC) datetime objects"""
+        return (
+            self.times.min().astype("datetime64[us]").item(),
+            self.times.max().astype("datetime64[us]").item(),
+        )
+
+    def get_datetimes(self) -> list[datetime.datetime]:
+        """Returns the times as (naive, UTC) datetime objects"""
+        return self.times.astype("datetime64[us]").tolist()
+
+    def to_remote_schemas(self) -> list[SensorDataRemoteSchema]:
+        return [
+            SensorDataRemoteSchema(time=time, value=value)
+            for time, value in zip(self.get_datetimes(), self.values.tolist())
+        ]
+
+    def to_create_schemas(self) -> list[SensorDataCreateSchema]:
+        return [
+            SensorDataCreateSchema(time=time, value=value, site_id=self.site_id, series=self.series)
+            for time, value in zip(self.get_datetimes(), self.values.tolist())
+        ]
@@ -0,0 +1,12 @@
+import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+
+class SyncRunSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    run_id: int
+    started: datetime.datetime
+    finished: datetime.datetime | None = None
+    resync: bool
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+import datetime
+
+from pydantic import BaseModel, ConfigDict, model_validator
 
 from server.types import Series
 
@@ -7,3 +9,14 @@ class SyncSiteSchema(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     site_code: str
     series: Series
+
+    # Optional window to resync. If neither is set, the site's entire history is resynced
+    start: datetime.datetime | None = None
+    end: datetime.datetime | None = None
+
+    @model_validator(mode="after")
+    def check_window(self) -> "SyncSiteSchema":
+        if self.start is not None and self.end is not None and self.start >= self.end:
+            raise ValueError("start must be before end")
+
+        return self
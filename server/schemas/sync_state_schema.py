@@ -0,0 +1,19 @@
+import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+from server.types import Series
+
+
+class SyncStateSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    site_id: int
+    site_code: str | None = None
+    series: Series
+    last_attempt: datetime.datetime
+    last_success: datetime.datetime | None = None
+    rows: int | None = None
+    duration: float | None = None
+    error: str | None = None
+    run_id: int | None = None
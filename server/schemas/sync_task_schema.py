@@ -0,0 +1,25 @@
+import datetime
+
+from pydantic import BaseModel
+
+from server.types import Series, Source
+
+
+class SyncTaskSchema(BaseModel):
+    """A single site and series to sync, along with the range to read from the remote source"""
+
+    site_code: str
+    site_id: int
+    source: Source
+    series: Series
+
+    # Range to read from the remote source. If end isn't set, data is read up to now
+    start: datetime.datetime
+    end: datetime.datetime | None = None
+
+    # Resyncs replace existing data. A partial resync only replaces data in [start, end)
+    resync: bool = False
+    partial: bool = False
+
+    # True if we are loading the site's entire history
+    backfill: bool = False
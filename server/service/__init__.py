@@ -1,6 +1,15 @@
+from server.service.cache_service import CacheService
 from server.service.geometry_service import GeometryService
 from server.service.processing_result import ProcessingResult
+from server.service.request_logger import RequestLogger
 from server.service.request_service import RequestService
 from server.service.sensor_service import SensorService
 
-__all__ = ["GeometryService", "RequestService", "SensorService", "ProcessingResult"]
+__all__ = [
+    "CacheService",
+    "GeometryService",
+    "RequestLogger",
+    "RequestService",
+    "SensorService",
+    "ProcessingResult",
+]
@@ -0,0 +1,181 @@
+import datetime
+import logging
+from urllib.parse import parse_qsl, urlsplit
+
+from fastapi_cache.backends import Backend
+
+from server.cache import (
+    CacheEntry,
+    ResponseCoder,
+    get_request_key,
+    get_request_tags,
+    open_cache_backend,
+)
+from server.service.processing_result import ProcessingResult
+from server.service.sensor_service import SensorService
+from server.types import Classification, Frequency, Series
+from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
+from server.utils import batched, round_datetime_to_day
+
+
+class CacheService:
+    # Cache namespace and expiry of the API routes, used by their @cached decorators
+    namespace = "api"
+    expire = 60 * 60 * 24
+    sites_expire = 60 * 60 * 6
+    # Expired entries are served for this long while they are refreshed
+    stale = 60 * 60
+
+    # Ranges (in days, up to the end of today) warmed for every series and frequency
+    warm_days = [1, 7, 30, 365]
+
+    # The most requested URLs over this many days are also warmed
+    popular_days = 7
+    popular_limit = 50
+
+    # Number of entries written to Redis in each pipeline
+    write_batch_size = 50
+
+    @staticmethod
+    def get_standard_paths(now: datetime.datetime) -> list[str]:
+        """Returns the URLs for the fixed set of common queries"""
+        end = round_datetime_to_day(now, False)
+
+        paths = ["/sites"]
+        for days in CacheService.warm_days:
+            start = end - datetime.timedelta(days=days)
+            for series in Series:
+                for frequency in Frequency:
+                    paths.append(
+                        f"/sensor/{series.value}/{start.isoformat()}/{end.isoformat()}"
+                        f"/{frequency.value}"
+                    )
+
+                paths.append(f"/site_average/{series.value}/{start.isoformat()}/{end.isoformat()}")
+
+        return paths
+
+    @staticmethod
+    def get_warm_paths(
+        uow: AbstractUnitOfWork, now: datetime.datetime, popular_limit: int | None = None
+    ) -> list[str]:
+        """Returns the URLs to warm: the standard set, then the most popular recent requests"""
+        popular_limit = CacheService.popular_limit if popular_limit is None else popular_limit
+
+        with uow:
+            since = now - datetime.timedelta(days=CacheService.popular_days)
+            popular = uow.requests.get_popular_paths(since, popular_limit) if popular_limit else []
+
+        paths = CacheService.get_standard_paths(now)
+        for url in popular:
+            parts = urlsplit(url)
+            path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+            if path not in paths:
+                paths.append(path)
+
+        return paths
+
+    @staticmethod
+    def _get_response(uow: AbstractUnitOfWork, path: str, query_params: list[tuple[str, str]]):
+        """Returns what the route for `path` would return and its expiry, or None if the path
+        isn't a cached route. Raises ValueError if the parameters are invalid."""
+        values = {}
+        for name, value in query_params:
+            values.setdefault(name, []).append(value)
+
+        match path.strip("/").split("/"):
+            case ["sensor", series, start, end, frequency]:
+                result = SensorService.get_data(
+                    uow,
+                    Series(series),
+                    datetime.datetime.fromisoformat(start),
+                    datetime.datetime.fromisoformat(end),
+                    Frequency(frequency),
+                    values.get("codes"),
+                    [Classification(value) for value in values["types"]]
+                    if "types" in values
+                    else None,
+                )
+                expire = CacheService.expire
+
+            case ["site_average", series, start, end]:
+                enrich = values.get("enrich", ["false"])[-1].lower() in ("true", "1", "yes", "on")
+                result = SensorService.get_site_average(
+                    uow,
+                    Series(series),
+                    datetime.datetime.fromisoformat(start),
+                    datetime.datetime.fromisoformat(end),
+                    enrich,
+                )
+                expire = CacheService.expire
+
+            case ["sites"]:
+                result = SensorService.get_sites(uow, None)
+                expire = CacheService.sites_expire
+
+            case _:
+                return None
+
+        match result:
+            case ProcessingResult.SUCCESS_RETRIEVED, items:
+                return items, expire
+
+    @staticmethod
+    def get_cache_entries(uow: AbstractUnitOfWork, paths: list[str]) -> list[CacheEntry]:
+        """Computes the responses for each path, under the key and tags the @cache decorator
+        would use. Paths that aren't cached routes, or can't be computed, are skipped."""
+        entries = []
+        for path in paths:
+            parts = urlsplit(path)
+            query_params = parse_qsl(parts.query, keep_blank_values=True)
+
+            try:
+                response = CacheService._get_response(uow, parts.path, query_params)
+            except ValueError as e:
+                logging.warning(f"Skipping {path}: {e}")
+                continue
+
+            if response is None:
+                continue
+
+            items, expire = response
+            segments = parts.path.strip("/").split("/")
+            path_params = dict(zip(["series", "start", "end"], segments[1:4]))
+            entries.append(
+                CacheEntry(
+                    key=get_request_key(CacheService.namespace, "GET", parts.path, query_params),
+                    value=ResponseCoder.encode(items),
+                    expire=expire + CacheService.stale,
+                    tags=get_request_tags(parts.path, path_params, query_params),
+                )
+            )
+
+        return entries
+
+    @staticmethod
+    async def warm_cache(
+        uow: AbstractUnitOfWork,
+        backend: Backend | None = None,
+        now: datetime.datetime | None = None,
+        popular_limit: int | None = None,
+    ) -> int:
+        """Pre-computes the common queries and writes them to the cache, so the first visitors
+        after a sync or a cache clear don't wait for the database. Returns the number of
+        entries written. Without a `backend`, one is opened for the duration of the call."""
+        if backend is None:
+            async with open_cache_backend() as backend:
+                return await CacheService.warm_cache(uow, backend, now, popular_limit)
+
+        now = now or datetime.datetime.utcnow()
+
+        paths = CacheService.get_warm_paths(uow, now, popular_limit)
+        logging.info(f"Warming cache with {len(paths)} queries")
+
+        written = 0
+        for batch in batched(paths, CacheService.write_batch_size):
+            entries = CacheService.get_cache_entries(uow, batch)
+            await backend.set_many(entries)
+            written += len(entries)
+
+        logging.info(f"Cache warmed with {written} entries")
+        return written
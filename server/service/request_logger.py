@@ -0,0 +1,107 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+from server.schemas import RequestLogBaseSchema
+from server.service.request_service import RequestService
+from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
+
+
+class RequestLogger:
+    """Logs API requests to the repository in the background, so that requests don't wait for
+    a database write. Requests are queued in memory and written in batches of up to
+    `batch_size`, at least every `flush_interval` seconds.
+
+    If the queue is full (eg, the database is slow or down), requests are dropped rather than
+    held up. A batch that fails to write is dropped too, so the queue can't back up."""
+
+    batch_size = 500
+    flush_interval = 5.0
+    max_queued = 10000
+
+    def __init__(self, get_unit_of_work: Callable[[], AbstractUnitOfWork]):
+        self.get_unit_of_work = get_unit_of_work
+        self.queue: asyncio.Queue[RequestLogBaseSchema] | None = None
+        self.writer = None
+        self.dropped = 0
+
+    def log(self, url: str, ip_address: str) -> None:
+        """Queues a request to be logged. Must be called on the event loop"""
+        if self.queue is None:
+            return
+
+        item = RequestLogBaseSchema(
+            time=datetime.datetime.now(datetime.timezone.utc), ip_address=ip_address, path=url
+        )
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            if self.dropped == 0:
+                logging.warning("Request log queue is full, dropping requests")
+            self.dropped += 1
+
+    async def _get_batch(self) -> list[RequestLogBaseSchema]:
+        """Waits for a request, then collects more until the batch is full or the flush
+        interval has passed"""
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    def _get_queued(self) -> list[RequestLogBaseSchema]:
+        batch = []
+        while not self.queue.empty() and len(batch) < self.batch_size:
+            batch.append(self.queue.get_nowait())
+
+        return batch
+
+    async def _write(self, batch: list[RequestLogBaseSchema]) -> None:
+        uow = self.get_unit_of_work()
+        try:
+            await run_in_threadpool(RequestService.log_requests, uow, batch)
+        except Exception:
+            logging.exception(f"Unable to log {len(batch)} requests")
+        finally:
+            uow.close()
+
+        if self.dropped:
+            logging.warning(f"Dropped {self.dropped} requests while the log queue was full")
+            self.dropped = 0
+
+    async def run(self) -> None:
+        """Writes queued requests until cancelled"""
+        while True:
+            await self._write(await self._get_batch())
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.max_queued)
+        self.writer = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stops the writer, then writes any requests still queued"""
+        if self.writer is not None:
+            self.writer.cancel()
+            try:
+                await self.writer
+            except asyncio.CancelledError:
+                pass
+            self.writer = None
+
+        if self.queue is not None:
+            while batch := self._get_queued():
+                await self._write(batch)
+            self.queue = None
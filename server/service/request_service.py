@@ -1,3 +1,4 @@
+from server.schemas import RequestLogBaseSchema
 from server.service.processing_result import ProcessingResult
 from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
 
@@ -10,3 +11,14 @@ class RequestService:
             uow.commit()
 
             return ProcessingResult.SUCCESS_CREATED, item
+
+    @staticmethod
+    def log_requests(
+        uow: AbstractUnitOfWork, items: list[RequestLogBaseSchema]
+    ) -> ProcessingResult:
+        """Writes a batch of requests in one transaction"""
+        with uow:
+            uow.requests.log_requests(items)
+            uow.commit()
+
+            return ProcessingResult.SUCCESS_CREATED, None
@@ -1,22 +1,26 @@
+import asyncio
 import datetime
 import logging
 import time
 from collections import defaultdict
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator
 
 from app_config import daily_limits
 from server.schemas import (
     OutlierBlockSchema,
     RangeSchema,
-    SensorDataCreateSchema,
+    SensorBatch,
     SensorDataSchema,
     SiteAverageSchema,
     SiteSchema,
     SyncSiteSchema,
+    SyncStateSchema,
+    SyncTaskSchema,
     WrappedSchema,
 )
 from server.service.processing_result import ProcessingResult
-from server.source.remote_sources import RemoteSources
-from server.types import Classification, Frequency, Series, Source
+from server.source.remote_sources import RemoteSources, get_remote_sources
+from server.types import Classification, Frequency, Series, Source, WriteMode
 from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
 from server.utils import round_datetime_to_day
 
@@ -73,12 +77,13 @@ class SensorService:
         """Reads site information from all sources and inserts/updates records in the repository.
         Note that the site_code field is used as the unique identifier for updates."""
         for source in Source:
-            remote_source = RemoteSources().get_source(source)
+            remote_source = get_remote_sources().get_source(source)
 
             with uow:
                 sites = remote_source.get_sites()
                 uow.sensors.update_sites(sites)
                 uow.commit()
+                uow.sensors.invalidate_cached_sites()
 
             return ProcessingResult.SUCCESS_RETRIEVED, None
 
@@ -86,8 +91,8 @@ class SensorService:
     def resync_data(
         uow: AbstractUnitOfWork, data: SyncSiteSchema
     ) -> tuple[ProcessingResult, str | None]:
-        """Reads site information from all sources and inserts/updates records in the repository.
-        Note that the site_code field is used as the unique identifier for updates."""
+        """Resyncs data for a single site and series. If a start and/or end date is given,
+        only data in that window is refetched and replaced."""
         try:
             with uow:
                 site = uow.sensors.get_site(data.site_code)
@@ -100,124 +105,555 @@ class SensorService:
                 )
 
             SensorService.sync_single_site_data(
-                uow, data.site_code, None, site.source, data.series, True
+                uow,
+                data.site_code,
+                None,
+                site.source,
+                data.series,
+                True,
+                WriteMode.upsert,
+                start=data.start,
+                end=data.end,
             )
             return ProcessingResult.SUCCESS_UPDATED, None
         except Exception as e:
             logging.exception(f"Caught exception while resyncing data: {e}")
             return ProcessingResult.ERROR_INTERNAL_SERVER_ERROR, e
 
+    # Data is loaded from this date when a site has no data yet, or is being fully resynced
+    history_start = datetime.datetime(2000, 1, 1)
+
+    # sync_all resumes the last run if it stopped part way and was started within this period,
+    # so that a failed run can be restarted without redoing the pairs it has already completed
+    resume_window = datetime.timedelta(hours=12)
+
+    # sync_all_async writes this many pairs at once. Each write holds a database connection
+    # (the engine's pool allows 15), and writing is CPU and IO bound in the database, so this
+    # is kept well below the number of requests in flight
+    write_concurrency = 4
+
     @staticmethod
-    def sync_single_site_data(
-        uow: AbstractUnitOfWork,
+    def _get_sync_task(
         site_code: str,
-        site_id: int | None,
+        site_id: int,
         source: Source,
         series: Series,
         resync: bool,
-    ):
-        with uow:
-            """Synchronises data from a source to the datastore by:
-            1. looking for the latest data in the datastore
-            2. Reading data from the source after this date
-            3. Writing this data to the datastore
-            """
-            logging.info(
-                f"[{site_code}:{series}] {'Resync' if resync else 'Sync'} started"
+        latest_date: datetime.datetime | None,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> SyncTaskSchema:
+        """Works out what needs to be read from the remote source for a site and series, given
+        the date of the most recent data in the repository. When resyncing, `start` and `end`
+        can be used to limit the resync to a window."""
+        prefix = f"[{site_code}:{series}]"
+        task = {
+            "site_code": site_code,
+            "site_id": site_id,
+            "source": source,
+            "series": series,
+            "resync": resync,
+        }
+
+        if resync and (start is not None or end is not None):
+            return SyncTaskSchema(
+                **task,
+                start=start or SensorService.history_start,
+                end=end,
+                partial=True,
             )
 
-            if site_id is None:
-                site = uow.sensors.get_site(site_code)
-                if site is None:
-                    raise Exception(
-                        f"Unable to find site {site_code} in the repository. Has it been synced yet?"
-                    )
+        if resync:
+            latest_date = SensorService.history_start
+        elif latest_date is not None:
+            logging.info(f"{prefix} Date of most recent data in repository is {latest_date}")
+        else:
+            logging.info(f"{prefix} No data present in repository - loading from 1 Jan 2000")
 
-                site_id = site.site_id
+        # We want to start from the next point after the latest date
+        backfill = resync or latest_date is None
+        latest_date = latest_date or SensorService.history_start
+        return SyncTaskSchema(
+            **task, start=latest_date + datetime.timedelta(hours=1), backfill=backfill
+        )
+
+    @staticmethod
+    def start_sync_run(
+        uow: AbstractUnitOfWork,
+        resync: bool,
+        resume_window: datetime.timedelta | None = None,
+    ) -> int:
+        """Returns the id of the sync_all run to carry out. The latest run is resumed if it
+        stopped part way, is of the same kind (sync or resync) and was started within
+        `resume_window`. Otherwise a new run is started."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with uow:
+            run = uow.sensors.get_latest_sync_run()
+            if (
+                resume_window is not None
+                and run is not None
+                and run.finished is None
+                and run.resync == resync
+                and run.started >= now - resume_window
+            ):
+                logging.info(f"Resuming sync run {run.run_id} started at {run.started}")
+                return run.run_id
+
+            run_id = uow.sensors.start_sync_run(now, resync)
+            uow.commit()
 
-            # Get the source of data based on the source enum
-            remote_source = RemoteSources().get_source(source)
+        return run_id
 
-            # If we're doing a resync, delete existing data for this site
-            if resync:
-                logging.info(
-                    f"[{site_code}:{series}] Deleting existing data due to resync"
-                )
-                uow.sensors.delete_data(series, site_id)
-                latest_date = datetime.datetime(2000, 1, 1)
-            else:
-                # Work out when the last data in our database is
-                latest_date = uow.sensors.get_latest_date(site_id, series)
+    @staticmethod
+    def _finish_sync_run(uow: AbstractUnitOfWork, run_id: int) -> None:
+        """Records that every pair in a run has been synced, so it won't be resumed"""
+        with uow:
+            uow.sensors.finish_sync_run(run_id, datetime.datetime.now(datetime.timezone.utc))
+            uow.commit()
 
-                if latest_date is not None:
+    @staticmethod
+    def plan_sync(
+        uow: AbstractUnitOfWork,
+        resync: bool,
+        start_code: str | None,
+        run_id: int | None = None,
+    ) -> list[SyncTaskSchema]:
+        """Builds the full list of site/series pairs to sync. The date of the most recent data
+        for every pair is read in a single query rather than one query per pair.
+
+        Pairs that have already been synced successfully in the run `run_id` are skipped, so
+        that a resumed run carries on from where it stopped (see start_sync_run). Syncs outside
+        the run, such as a manual sync of a single site, don't cause a pair to be skipped."""
+        with uow:
+            sites = uow.sensors.get_sites(None)
+            latest_dates = {} if resync else uow.sensors.get_latest_dates()
+            sync_states = {
+                (state.site_id, state.series): state for state in uow.sensors.get_sync_states()
+            }
+
+        tasks = []
+        for site in sites:
+            # Skip over sites before `start_code` - makes it easy to resume a failed
+            # sync when testing
+            if start_code is not None and site.site_code < start_code:
+                logging.info(f"Skipping site {site.site_code}")
+                continue
+
+            for series in Series:
+                state = sync_states.get((site.site_id, series))
+                if (
+                    run_id is not None
+                    and state is not None
+                    and state.run_id == run_id
+                    and state.error is None
+                    and state.last_success is not None
+                ):
                     logging.info(
-                        f"[{site_code}:{series}] Date of most recent data in repository is {latest_date}"
+                        f"[{site.site_code}:{series}] Skipping as already synced at "
+                        f"{state.last_success}"
                     )
-                else:
-                    logging.info(
-                        f"[{site_code}:{series}] No data present in repository - "
-                        "loading from 1 Jan 2000"
+                    continue
+
+                latest_date = latest_dates.get((site.site_id, series))
+                tasks.append(
+                    SensorService._get_sync_task(
+                        site.site_code, site.site_id, site.source, series, resync, latest_date
                     )
-                    latest_date = datetime.datetime(2000, 1, 1)
+                )
 
-            # We want to start from the next point after the latest date
-            start = latest_date + datetime.timedelta(hours=1)
-            end = datetime.datetime.utcnow()
+        return tasks
 
-            logging.info(
-                f"[{site_code}:{series}] Loading data from {source} between {start} and {end}"
-            )
+    @staticmethod
+    def _write_site_data(
+        uow: AbstractUnitOfWork,
+        task: SyncTaskSchema,
+        end: datetime.datetime,
+        data: Iterable[SensorBatch],
+        write_mode: WriteMode,
+    ) -> int:
+        """Writes data read from a remote source to the repository in a single transaction,
+        returning the number of rows written.
+        If we are resyncing, the existing data is deleted first, unless we are upserting in
+        which case the existing rows are overwritten in place. A partial resync always
+        deletes just its window so that points which have been removed upstream don't survive
+        the resync.
+
+        `data` can be a generator, in which case each batch is written as it arrives so that
+        only one batch is held in memory at a time."""
+        prefix = f"[{task.site_code}:{task.series}]"
+        with uow:
+            if task.resync and task.partial:
+                logging.info(
+                    f"{prefix} Deleting existing data between {task.start} and {end} due to resync"
+                )
+                uow.sensors.delete_data(task.series, task.site_id, task.start, end)
+            # If we're doing a resync, delete existing data for this site. Upserts overwrite
+            # existing rows, so there's no need to delete (and no window with missing data)
+            elif task.resync and write_mode != WriteMode.upsert:
+                logging.info(f"{prefix} Deleting existing data due to resync")
+                uow.sensors.delete_data(task.series, task.site_id)
 
             start_time = time.time()
-            data = remote_source.get_sensor_data(site_code, start, end, series)
+            rows = 0
+            for batch in data:
+                # We need to add in the site id and series for the batch
+                batch.site_id = task.site_id
+                batch.series = task.series
+                if not len(batch):
+                    continue
+
+                # Late or resynced data may fall in chunks that have already been compressed.
+                # Only the span of the batch is decompressed, so a backfill doesn't decompress
+                # chunks it doesn't write to
+                first, last = batch.get_span()
+                uow.sensors.decompress_data(first, last + datetime.timedelta(microseconds=1))
+                uow.sensors.write_batch(batch, write_mode)
+                rows += len(batch)
+
+            # Keep the daily rollup in step with the data, in the same transaction
+            if rows or task.resync:
+                uow.sensors.update_day_stats(task.series, task.site_id, task.start, end)
+
+            uow.commit()
             elapsed = time.time() - start_time
 
-            logging.info(
-                f"[{site_code}:{series}] Found {len(data)} rows in {elapsed:.3f}s"
+            logging.info(f"{prefix} {rows} rows written to repository in {elapsed:.3f}s")
+
+            # Cached results covering the window are now out of date
+            if rows or task.resync:
+                uow.sensors.invalidate_cached_data(task.series, task.start, end)
+
+        return rows
+
+    @staticmethod
+    async def _write_site_data_async(
+        uow: AbstractUnitOfWork,
+        task: SyncTaskSchema,
+        end: datetime.datetime,
+        data: AsyncIterator[SensorBatch],
+        write_mode: WriteMode,
+        write_semaphore: asyncio.Semaphore,
+    ) -> int:
+        """As _write_site_data, but takes batches from an async iterator. The write runs in a
+        worker thread so that it doesn't block the event loop, and takes each batch as it
+        arrives through a small queue, so only a few batches are held in memory at a time.
+        A slot in `write_semaphore` is only taken once the first batch has arrived.
+
+        If reading `data` fails, the write is rolled back and the error is raised."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=2)
+
+        def receive() -> Iterator[SensorBatch]:
+            while True:
+                item = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+
+                yield item
+
+        async def send(item: SensorBatch | BaseException | None) -> None:
+            # Stop waiting if the writer fails, as it will never take the item
+            put = asyncio.ensure_future(queue.put(item))
+            await asyncio.wait([put, writer], return_when=asyncio.FIRST_COMPLETED)
+            if not put.done():
+                put.cancel()
+                await writer
+
+        data = aiter(data)
+        first = await anext(data, None)
+
+        async with write_semaphore:
+            writer = asyncio.ensure_future(
+                asyncio.to_thread(
+                    SensorService._write_site_data, uow, task, end, receive(), write_mode
+                )
             )
 
-            # We need to add in the site code and series on each record
-            enriched = [
-                SensorDataCreateSchema(
-                    **item.model_dump(), site_id=site_id, series=series
+            try:
+                if first is not None:
+                    await send(first)
+                async for batch in data:
+                    await send(batch)
+            except BaseException as e:
+                if not writer.done():
+                    await send(e)
+                # Wait for the write to be rolled back before the unit of work is released
+                await asyncio.gather(writer, return_exceptions=True)
+                raise
+
+            await send(None)
+            return await writer
+
+    @staticmethod
+    def _record_sync_result(
+        uow: AbstractUnitOfWork,
+        task: SyncTaskSchema,
+        started: float,
+        rows: int | None = None,
+        error: Exception | None = None,
+        run_id: int | None = None,
+    ) -> None:
+        """Records the outcome of a sync task (as part of the sync_all run `run_id`, if set) in
+        the sync state table. This is its own transaction so that failures are recorded even
+        though the sync was rolled back."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with uow:
+            if error is None:
+                uow.sensors.record_sync_success(
+                    task.site_id, task.series, now, rows, time.time() - started, run_id
                 )
-                for item in data
-            ]
-            start_time = time.time()
-            uow.sensors.write_data(enriched)
+            else:
+                uow.sensors.record_sync_failure(task.site_id, task.series, now, str(error), run_id)
+
             uow.commit()
-            elapsed = time.time() - start_time
 
-            logging.info(
-                f"[{site_code}:{series}] Data written to repository in {elapsed:.3f}s"
+    @staticmethod
+    def sync_task(
+        uow: AbstractUnitOfWork,
+        task: SyncTaskSchema,
+        write_mode: WriteMode = WriteMode.upsert,
+        remote_sources: RemoteSources | None = None,
+        run_id: int | None = None,
+    ) -> None:
+        """Reads the data described by `task` from its remote source and writes it to the
+        repository, as part of the sync_all run `run_id` if set"""
+        prefix = f"[{task.site_code}:{task.series}]"
+        end = task.end or datetime.datetime.utcnow()
+
+        # Get the source of data based on the source enum
+        remote_source = (remote_sources or get_remote_sources()).get_source(task.source)
+
+        logging.info(f"{prefix} Loading data from {task.source} between {task.start} and {end}")
+
+        started = time.time()
+        try:
+            # Stream the data straight into the repository, so the response is never held in
+            # memory in full. A backfill covers many years, so split it into windows that are
+            # fetched in parallel rather than asking for everything in one slow request
+            if task.backfill:
+                data = remote_source.iter_sensor_batches_windowed(
+                    task.site_code, task.start, end, task.series
+                )
+            else:
+                data = remote_source.iter_sensor_batches(
+                    task.site_code, task.start, end, task.series
+                )
+
+            rows = SensorService._write_site_data(uow, task, end, data, write_mode)
+        except Exception as e:
+            SensorService._record_sync_result(uow, task, started, error=e, run_id=run_id)
+            raise
+
+        SensorService._record_sync_result(uow, task, started, rows, run_id=run_id)
+
+        logging.info(f"{prefix} Sync complete")
+
+    @staticmethod
+    async def sync_task_async(
+        uow: AbstractUnitOfWork,
+        remote_sources: RemoteSources,
+        semaphore: asyncio.Semaphore,
+        write_semaphore: asyncio.Semaphore,
+        task: SyncTaskSchema,
+        write_mode: WriteMode = WriteMode.upsert,
+        run_id: int | None = None,
+    ) -> None:
+        """As sync_task, but awaits the remote source so that many tasks can be fetched
+        concurrently. The number of requests in flight is bounded by `semaphore`.
+
+        Repository access is synchronous, so writes run in a worker thread rather than
+        blocking the event loop, and the number running at once is bounded by
+        `write_semaphore`. Each task uses its own copy of `uow`, as a session can't be shared
+        between threads."""
+        prefix = f"[{task.site_code}:{task.series}]"
+        end = task.end or datetime.datetime.utcnow()
+
+        remote_source = remote_sources.get_source(task.source)
+        uow = uow.copy()
+
+        started = time.time()
+        try:
+            try:
+                async with semaphore:
+                    logging.info(
+                        f"{prefix} Loading data from {task.source} between {task.start} and {end}"
+                    )
+
+                    # Each batch is written as it is parsed, so the response is never held
+                    # in memory in full. A backfill is split into windows, as in sync_task
+                    if task.backfill:
+                        data = remote_source.iter_sensor_batches_windowed_async(
+                            task.site_code, task.start, end, task.series
+                        )
+                    else:
+                        data = remote_source.iter_sensor_batches_async(
+                            task.site_code, task.start, end, task.series
+                        )
+                    rows = await SensorService._write_site_data_async(
+                        uow, task, end, data, write_mode, write_semaphore
+                    )
+            except Exception as e:
+                await asyncio.to_thread(
+                    SensorService._record_sync_result, uow, task, started, error=e, run_id=run_id
+                )
+                raise
+
+            await asyncio.to_thread(
+                SensorService._record_sync_result, uow, task, started, rows, run_id=run_id
             )
+        finally:
+            uow.close()
 
-            logging.info(f"[{site_code}:{series}] Sync complete")
+        logging.info(f"{prefix} Sync complete")
 
     @staticmethod
-    def sync_all(uow: AbstractUnitOfWork, resync: bool, start_code: str):
-        """Syncs all sites and series from all sources to the datastore. Note that it takes the list
-        of sites from the database, so assumes that this has been synced first"""
+    def sync_single_site_data(
+        uow: AbstractUnitOfWork,
+        site_code: str,
+        site_id: int | None,
+        source: Source,
+        series: Series,
+        resync: bool,
+        write_mode: WriteMode = WriteMode.upsert,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ):
+        """Synchronises data from a source to the datastore by:
+        1. looking for the latest data in the datastore
+        2. Reading data from the source after this date
+        3. Writing this data to the datastore
+
+        When resyncing, `start` and `end` can be used to limit the resync to a window
+        rather than the site's entire history.
+        """
+        logging.info(
+            f"[{site_code}:{series}] {'Resync' if resync else 'Sync'} started"
+        )
+
         with uow:
-            sites = uow.sensors.get_sites(None)
+            if site_id is None:
+                site = uow.sensors.get_site(site_code)
+                if site is None:
+                    raise Exception(
+                        f"Unable to find site {site_code} in the repository. Has it been synced yet?"
+                    )
+
+                site_id = site.site_id
+
+            # Work out when the last data in our database is
+            latest_date = None if resync else uow.sensors.get_latest_date(site_id, series)
+
+        task = SensorService._get_sync_task(
+            site_code, site_id, source, series, resync, latest_date, start, end
+        )
 
-        # This block is outside the context handler as sync_single_site_data will enter uow context
+        SensorService.sync_task(uow, task, write_mode)
+
+    @staticmethod
+    def sync_all(
+        uow: AbstractUnitOfWork,
+        resync: bool,
+        start_code: str,
+        write_mode: WriteMode = WriteMode.upsert,
+        resume_window: datetime.timedelta | None = resume_window,
+        after_sync: Callable[[], Awaitable] | None = None,
+    ):
+        """Syncs all sites and series from all sources to the datastore. Note that it takes the list
+        of sites from the database, so assumes that this has been synced first. A run that
+        stopped part way within `resume_window` is resumed (see start_sync_run). `after_sync` is
+        run once everything has been synced (eg, to warm the cache)."""
+        run_id = SensorService.start_sync_run(uow, resync, resume_window)
+        tasks = SensorService.plan_sync(uow, resync, start_code, run_id)
+        logging.info(f"*** Starting sync of {len(tasks)} site/series pairs ***")
+
+        remote_sources = get_remote_sources()
+
+        # This block is outside the context handler as sync_task will enter uow context
         # handler itself
-        for site in sites:
-            # Skip over sites before `start_code` - makes it easy to resume a failed
-            # sync when testing
-            if start_code is not None and site.site_code < start_code:
-                logging.info(f"Skipping site {site.site_code}")
-                continue
+        for task in tasks:
+            SensorService.sync_task(uow, task, write_mode, remote_sources, run_id)
 
-            logging.info(f"*** Starting {site.site_code} sync ***")
+        SensorService._finish_sync_run(uow, run_id)
+        logging.info("*** Sync complete ***")
 
-            for series in Series:
-                SensorService.sync_single_site_data(
-                    uow, site.site_code, site.site_id, site.source, series, resync
-                )
+        if after_sync is not None:
+            asyncio.run(SensorService._run_after_sync(after_sync))
+
+    @staticmethod
+    async def _run_after_sync(after_sync: Callable[[], Awaitable]) -> None:
+        """Runs the after_sync hook. The data is already synced, so a failure is only logged"""
+        try:
+            await after_sync()
+        except Exception as e:
+            logging.exception(f"Caught exception after sync: {e}")
+
+    @staticmethod
+    async def sync_all_async(
+        uow: AbstractUnitOfWork,
+        resync: bool,
+        start_code: str,
+        concurrency: int,
+        write_mode: WriteMode = WriteMode.upsert,
+        resume_window: datetime.timedelta | None = resume_window,
+        after_sync: Callable[[], Awaitable] | None = None,
+        write_concurrency: int = write_concurrency,
+    ):
+        """Syncs all sites and series from all sources to the datastore, with up to
+        `concurrency` requests to remote sources in flight at once and up to
+        `write_concurrency` pairs being written at once. Each site/series pair is still
+        written and committed in its own transaction. A failure of one pair is logged (and
+        recorded in the sync state) and does not stop the others, and the run is left to be
+        resumed as in sync_all."""
+        run_id = SensorService.start_sync_run(uow, resync, resume_window)
+        tasks = SensorService.plan_sync(uow, resync, start_code, run_id)
+
+        remote_sources = get_remote_sources()
+        semaphore = asyncio.Semaphore(concurrency)
+        write_semaphore = asyncio.Semaphore(write_concurrency)
+
+        logging.info(
+            f"*** Starting sync of {len(tasks)} site/series pairs with concurrency {concurrency} "
+            f"and write concurrency {write_concurrency} ***"
+        )
 
-            logging.info(f"*** {site.site_code} sync complete ***")
+        try:
+            results = await asyncio.gather(
+                *[
+                    SensorService.sync_task_async(
+                        uow, remote_sources, semaphore, write_semaphore, task, write_mode, run_id
+                    )
+                    for task in tasks
+                ],
+                return_exceptions=True,
+            )
+        finally:
+            # The async clients belong to this event loop, so can't be reused after it
+            await remote_sources.aclose()
+
+        failed = 0
+        for task, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logging.error(f"[{task.site_code}:{task.series}] Sync failed: {result}")
+
+        if not failed:
+            SensorService._finish_sync_run(uow, run_id)
+
+        logging.info(
+            f"*** Sync complete: {len(tasks) - failed} succeeded, {failed} failed ***"
+        )
+
+        if after_sync is not None:
+            await SensorService._run_after_sync(after_sync)
+
+    @staticmethod
+    def get_sync_states(uow: AbstractUnitOfWork) -> list[SyncStateSchema]:
+        """Returns the outcome of the most recent sync of each site and series"""
+        with uow:
+            states = uow.sensors.get_sync_states()
+            return ProcessingResult.SUCCESS_RETRIEVED, states
 
     @staticmethod
     def generate_wrapped(uow: AbstractUnitOfWork, year: int) -> list[WrappedSchema]:
@@ -1,12 +1,21 @@
+import asyncio
 import datetime
+import itertools
 import logging
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator
 
 import httpx
+import numpy as np
 
 from borough_mapper import BoroughMapper
-from server.schemas import SensorDataRemoteSchema, SiteCreateSchema
+from server.schemas import SensorBatch, SensorDataRemoteSchema, SiteCreateSchema
+from server.source.json_stream import JsonArrayParser
 from server.types import Classification, Series, SiteStatus, Source
+from server.utils import batched, split_time_range
 
 
 class BreatheLondon:
@@ -16,15 +25,51 @@ class BreatheLondon:
         # Check if a directory called /data exists. If so, use it as the file root
         self.max_retries = 3
         self.retry_pause = 1
-        self.client = httpx.Client(timeout=30)
+        # Long ranges are split into windows of this many months, fetched concurrently
+        self.window_months = 12
+        self.window_concurrency = 4
+        # Number of readings in each batch yielded while streaming sensor data
+        self.batch_size = 5000
+        # Clients keep connections to the API alive between requests. Enough are pooled for
+        # every window fetched concurrently, plus a concurrent sync_all at its usual setting
+        self.limits = httpx.Limits(max_connections=32, max_keepalive_connections=16)
         self.api_key = api_key
         self.base_url = "https://erg-api-fskubf2mtq-ew.a.run.app/api"
-        self.borough_mapper = BoroughMapper()
+        # Clients and the borough mapper are created on first use, so that an instance is
+        # cheap to construct when it is only needed for some operations
+        self._client = None
+        self._async_client = None
+        self._borough_mapper = None
+        self._lock = threading.Lock()
 
     @property
     def name(self):
         return Source.breathe_london
 
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(timeout=30, limits=self.limits)
+
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # An async client is tied to the event loop that first used it, so this is recreated
+        # after aclose() for the next loop
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=30, limits=self.limits)
+
+        return self._async_client
+
+    @property
+    def borough_mapper(self) -> BoroughMapper:
+        if self._borough_mapper is None:
+            self._borough_mapper = BoroughMapper()
+
+        return self._borough_mapper
+
     def _get(self, endpoint):
         """Makes a GET request from the endpoint"""
         params = {"key": self.api_key}
@@ -46,6 +91,19 @@ class BreatheLondon:
                 logging.warning(f"{str(e)}. Pausing {self.retry_pause}s before retry")
                 time.sleep(self.retry_pause)
 
+    def close(self):
+        """Closes the sync client, if it has been created"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """Closes the async client. Must be called from the event loop that used it"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
     def _get_status_enum(self, status):
         # Remove any spaces and convert to lower case before matching.
         # This cleans up some variations
@@ -104,8 +162,12 @@ class BreatheLondon:
         logging.info("Loading site list from API")
         site_list = self._get("ListSensors")[0]
 
+        boroughs = self.borough_mapper.get_boroughs(
+            [site["Latitude"] for site in site_list], [site["Longitude"] for site in site_list]
+        )
+
         all_sites = []
-        for site in site_list:
+        for site, borough in zip(site_list, boroughs):
             obj = SiteCreateSchema(
                 site_code=site["SiteCode"],
                 name=site["SiteName"],
@@ -118,7 +180,7 @@ class BreatheLondon:
                 description=site["SiteDescription"],
                 start_date=self._from_isoformat_utc(site["StartDate"]),
                 end_date=self._from_isoformat_utc(site["EndDate"]),
-                borough=self.borough_mapper.get_borough(site["Latitude"], site["Longitude"]),
+                borough=borough,
                 is_enabled=self._get_enabled_flag(site["Enabled"])
             )
 
@@ -139,14 +201,14 @@ class BreatheLondon:
 
         return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
 
-    def get_sensor_data(
-        self,
+    @staticmethod
+    def _get_sensor_data_endpoint(
         site_code: str,
         start: datetime.datetime,
         end: datetime.datetime,
         series: Series,
-    ) -> list[SensorDataRemoteSchema]:
-        data = self._get(
+    ) -> str:
+        return (
             f"getClarityData/{site_code}/"
             f"I{series.name.upper()}/"
             f"{BreatheLondon._to_isoformat_utc(start)}/"
@@ -154,34 +216,361 @@ class BreatheLondon:
             "Hourly"
         )
 
-        if isinstance(data, dict):
-            # Looks like we get the following returned if there's no data:
-            # {
-            #     "recordsets": [],
-            #     "output": {},
-            #     "rowsAffected": [
-            #         1,
-            #         1,
-            #         1,
-            #         1
-            #     ],
-            #     "returnValue": 0
-            # }
-            return []
-
-        data_schema = []
-        for item in data:
-            if item["ScaledValue"] is None:
+    @staticmethod
+    def _parse_sensor_batch(site_code: str, series: Series, items: list[dict]) -> SensorBatch:
+        """Converts readings from the API into a SensorBatch. Timestamps are parsed in one
+        vectorised step: they are always of the form 2022-01-01T00:00:00.000Z, so truncating
+        to 19 characters leaves a string that numpy can parse as a naive UTC datetime."""
+        times = np.array([item["DateTime"] for item in items], dtype="U19").astype(
+            "datetime64[s]"
+        )
+        # Nulls become NaN
+        values = np.array([item["ScaledValue"] for item in items], dtype=np.float64)
+
+        present = ~np.isnan(values)
+        if not present.all():
+            logging.warning(
+                f"[{site_code}:{series}] Found {np.count_nonzero(~present)} null values between "
+                f"{times[~present].min()} and {times[~present].max()} - skipping"
+            )
+
+        return SensorBatch(times=times[present], values=values[present])
+
+    @staticmethod
+    def _check_array_response(parser: JsonArrayParser) -> None:
+        """Checks that a sensor data response was an array. Looks like we get the following
+        returned if there's no data:
+        {
+            "recordsets": [],
+            "output": {},
+            "rowsAffected": [
+                1,
+                1,
+                1,
+                1
+            ],
+            "returnValue": 0
+        }
+        which is treated as an empty array. Any other body is an error, rather than no data"""
+        if parser.is_array:
+            return
+
+        if isinstance(parser.value, dict) and parser.value.get("recordsets") == []:
+            return
+
+        raise ValueError(f"Unexpected response from API: {str(parser.value)[:200]}")
+
+    def _stream_sensor_batches(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> Iterator[SensorBatch]:
+        """Makes a single streamed request for sensor data, parsing the response body
+        incrementally and yielding a batch of readings every `batch_size` readings"""
+        params = {"key": self.api_key}
+        url = f"{self.base_url}/{self._get_sensor_data_endpoint(site_code, start, end, series)}"
+
+        with self.client.stream("GET", url, params=params) as response:
+            response.raise_for_status()
+
+            parser = JsonArrayParser()
+            items = (
+                item for chunk in response.iter_text() for item in parser.feed(chunk)
+            )
+            for batch in batched(items, self.batch_size):
+                yield self._parse_sensor_batch(site_code, series, batch)
+
+            parser.close()
+            self._check_array_response(parser)
+
+    def iter_sensor_batches(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> Iterator[SensorBatch]:
+        """Streams sensor data from the API, yielding batches of readings as they arrive.
+        Requests are retried as in `_get`, but only until the first batch has been yielded."""
+        retry_count = 0
+        while True:
+            yielded = False
+            try:
+                for batch in self._stream_sensor_batches(site_code, start, end, series):
+                    yielded = True
+                    yield batch
+
+                return
+            except httpx.HTTPError as e:
+                if yielded or retry_count >= self.max_retries:
+                    logging.error(
+                        f"Caught exception while requesting data from API: {str(e)}. Retry limit reached"
+                    )
+                    raise
+
+                retry_count += 1
+                logging.warning(f"{str(e)}. Pausing {self.retry_pause}s before retry")
+                time.sleep(self.retry_pause)
+
+    def _get_sensor_batch_window(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> SensorBatch:
+        """Reads all sensor data for a single window, retrying the whole window on failure"""
+        retry_count = 0
+        while True:
+            try:
+                return SensorBatch.concatenate(
+                    list(self._stream_sensor_batches(site_code, start, end, series))
+                )
+            except httpx.HTTPError as e:
+                if retry_count >= self.max_retries:
+                    logging.error(
+                        f"[{site_code}:{series}] Caught exception while requesting window "
+                        f"{start}-{end} from API: {str(e)}. Retry limit reached"
+                    )
+                    raise
+
+                retry_count += 1
                 logging.warning(
-                    f"[{site_code}:{series}] Found null data for timestamp {item['DateTime']}"
-                    "- skipping"
+                    f"[{site_code}:{series}] Window {start}-{end}: {str(e)}. "
+                    f"Pausing {self.retry_pause}s before retry"
                 )
-                continue
+                time.sleep(self.retry_pause)
+
+    def _get_windows(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> list[tuple[datetime.datetime, datetime.datetime]]:
+        """Splits a range into the windows read by the windowed iterators"""
+        windows = split_time_range(start, end, self.window_months)
+        if len(windows) <= 1:
+            return windows
+
+        logging.info(
+            f"[{site_code}:{series}] Fetching {len(windows)} windows with concurrency "
+            f"{self.window_concurrency}"
+        )
+
+        # The API appears to include the end time in the results, so stop just short of
+        # each window boundary to avoid reading the boundary hour twice
+        return [
+            (window_start, window_end - datetime.timedelta(seconds=1))
+            for window_start, window_end in windows[:-1]
+        ] + windows[-1:]
 
-            obj = SensorDataRemoteSchema(
-                time=datetime.datetime.strptime(item["DateTime"], "%Y-%m-%dT%H:%M:%S.000Z"),
-                value=item["ScaledValue"],
+    def iter_sensor_batches_windowed(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> Iterator[SensorBatch]:
+        """Reads sensor data by splitting the range into calendar-aligned windows of
+        `window_months` months. Up to `window_concurrency` windows are fetched at once in
+        separate threads, each retried independently, and a batch per window is yielded in
+        time order. Use this for long ranges (eg, a backfill), which are slow and can time
+        out when requested in one go."""
+        windows = self._get_windows(site_code, start, end, series)
+        if len(windows) <= 1:
+            yield from self.iter_sensor_batches(site_code, start, end, series)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.window_concurrency) as executor:
+            # Only keep `window_concurrency` windows in flight, so that a slow consumer
+            # doesn't cause every window to be held in memory
+            remaining = iter(windows)
+            pending = deque(
+                executor.submit(self._get_sensor_batch_window, site_code, *window, series)
+                for window in itertools.islice(remaining, self.window_concurrency)
             )
-            data_schema.append(obj)
 
-        return data_schema
+            while pending:
+                batch = pending.popleft().result()
+
+                window = next(remaining, None)
+                if window is not None:
+                    pending.append(
+                        executor.submit(self._get_sensor_batch_window, site_code, *window, series)
+                    )
+
+                yield batch
+
+    async def _stream_sensor_batches_async(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> AsyncIterator[SensorBatch]:
+        """As _stream_sensor_batches, but uses the async client"""
+        params = {"key": self.api_key}
+        url = f"{self.base_url}/{self._get_sensor_data_endpoint(site_code, start, end, series)}"
+
+        async with self.async_client.stream("GET", url, params=params) as response:
+            response.raise_for_status()
+
+            parser = JsonArrayParser()
+            items = []
+            async for chunk in response.aiter_text():
+                items += parser.feed(chunk)
+                while len(items) >= self.batch_size:
+                    yield self._parse_sensor_batch(site_code, series, items[: self.batch_size])
+                    items = items[self.batch_size :]
+
+            parser.close()
+            self._check_array_response(parser)
+            if items:
+                yield self._parse_sensor_batch(site_code, series, items)
+
+    async def iter_sensor_batches_async(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> AsyncIterator[SensorBatch]:
+        """As iter_sensor_batches, but uses the async client so that many requests can be in
+        flight at once"""
+        retry_count = 0
+        while True:
+            yielded = False
+            try:
+                async for batch in self._stream_sensor_batches_async(site_code, start, end, series):
+                    yielded = True
+                    yield batch
+
+                return
+            except httpx.HTTPError as e:
+                if yielded or retry_count >= self.max_retries:
+                    logging.error(
+                        f"Caught exception while requesting data from API: {str(e)}. Retry limit reached"
+                    )
+                    raise
+
+                retry_count += 1
+                logging.warning(f"{str(e)}. Pausing {self.retry_pause}s before retry")
+                await asyncio.sleep(self.retry_pause)
+
+    async def _get_sensor_batch_window_async(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> SensorBatch:
+        """As _get_sensor_batch_window, but uses the async client"""
+        retry_count = 0
+        while True:
+            try:
+                return SensorBatch.concatenate(
+                    [
+                        batch
+                        async for batch in self._stream_sensor_batches_async(
+                            site_code, start, end, series
+                        )
+                    ]
+                )
+            except httpx.HTTPError as e:
+                if retry_count >= self.max_retries:
+                    logging.error(
+                        f"[{site_code}:{series}] Caught exception while requesting window "
+                        f"{start}-{end} from API: {str(e)}. Retry limit reached"
+                    )
+                    raise
+
+                retry_count += 1
+                logging.warning(
+                    f"[{site_code}:{series}] Window {start}-{end}: {str(e)}. "
+                    f"Pausing {self.retry_pause}s before retry"
+                )
+                await asyncio.sleep(self.retry_pause)
+
+    async def iter_sensor_batches_windowed_async(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> AsyncIterator[SensorBatch]:
+        """As iter_sensor_batches_windowed, but uses the async client. Up to
+        `window_concurrency` windows are fetched at once as tasks on the event loop, and a
+        batch per window is yielded in time order as soon as it (and those before it) have
+        arrived."""
+        windows = self._get_windows(site_code, start, end, series)
+        if len(windows) <= 1:
+            async for batch in self.iter_sensor_batches_async(site_code, start, end, series):
+                yield batch
+            return
+
+        # Only keep `window_concurrency` windows in flight, so that a slow consumer doesn't
+        # cause every window to be held in memory
+        remaining = iter(windows)
+        pending = deque(
+            asyncio.ensure_future(self._get_sensor_batch_window_async(site_code, *window, series))
+            for window in itertools.islice(remaining, self.window_concurrency)
+        )
+
+        try:
+            while pending:
+                batch = await pending.popleft()
+
+                window = next(remaining, None)
+                if window is not None:
+                    pending.append(
+                        asyncio.ensure_future(
+                            self._get_sensor_batch_window_async(site_code, *window, series)
+                        )
+                    )
+
+                yield batch
+        finally:
+            # Stop fetching if the consumer gives up, or a window fails
+            for future in pending:
+                future.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def get_sensor_batch_async(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> SensorBatch:
+        """Reads sensor data using the async client, returned as a single batch"""
+        return SensorBatch.concatenate(
+            [batch async for batch in self.iter_sensor_batches_async(site_code, start, end, series)]
+        )
+
+    def get_sensor_data(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> list[SensorDataRemoteSchema]:
+        return [
+            item
+            for batch in self.iter_sensor_batches(site_code, start, end, series)
+            for item in batch.to_remote_schemas()
+        ]
+
+    async def get_sensor_data_async(
+        self,
+        site_code: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        series: Series,
+    ) -> list[SensorDataRemoteSchema]:
+        """As get_sensor_data, but uses the async client so that many requests can be in
+        flight at once"""
+        batch = await self.get_sensor_batch_async(site_code, start, end, series)
+        return batch.to_remote_schemas()
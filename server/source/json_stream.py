@@ -0,0 +1,86 @@
+import json
+import re
+
+WHITESPACE = re.compile(r"\s*")
+
+
+class JsonArrayParser:
+    """Incrementally parses a top level JSON array that arrives in chunks (eg, from a
+    streamed HTTP response), returning each element as soon as it is complete. This means
+    the whole body never has to be held in memory at once.
+
+    If the top level value turns out not to be an array, `is_array` is set to False and the
+    rest of the input is kept, so that close() can parse it into `value` for the caller to
+    check."""
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.is_array = None
+        self.finished = False
+        self.value = None
+
+    def feed(self, chunk: str) -> list:
+        """Adds a chunk of text and returns the elements completed by it"""
+        if self.is_array is False:
+            self.buffer += chunk
+            return []
+
+        if self.finished:
+            return []
+
+        buffer = self.buffer + chunk
+        position = 0
+        items = []
+
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position >= len(buffer):
+                break
+
+            if self.is_array is None:
+                if buffer[position] != "[":
+                    self.is_array = False
+                    self.buffer = buffer[position:]
+                    return items
+
+                self.is_array = True
+                position += 1
+                continue
+
+            if buffer[position] == ",":
+                position += 1
+                continue
+
+            if buffer[position] == "]":
+                self.finished = True
+                break
+
+            try:
+                item, end = self.decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element isn't complete yet - wait for the next chunk
+                break
+
+            # A number is only complete once we've seen the character after it, otherwise
+            # eg, "345." might be the start of "345.5"
+            if not isinstance(item, (dict, list, str)) and (
+                end == len(buffer) or buffer[end] not in ", \t\n\r]"
+            ):
+                break
+
+            items.append(item)
+            position = end
+
+        self.buffer = buffer[position:]
+        return items
+
+    def close(self) -> None:
+        """Checks that the whole array was received or, if the input wasn't an array, parses it
+        into `value`. Raises ValueError if the input isn't valid JSON"""
+        if self.is_array and not self.finished:
+            raise ValueError("JSON array ended unexpectedly")
+
+        if self.is_array is False:
+            self.value = json.loads(self.buffer)
+            self.buffer = ""
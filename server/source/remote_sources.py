@@ -1,3 +1,5 @@
+import threading
+
 import app_config
 
 from server.source.breathe_london import BreatheLondon
@@ -5,15 +7,45 @@ from server.types import Source
 
 
 class RemoteSources:
-    """Manages a set of remote sources, keyed by Source"""
+    """Manages a set of remote sources, keyed by Source. Each source is only created when it
+    is first asked for, and is then kept (along with its pooled HTTP clients) until close()"""
 
     def __init__(self):
-        self.sources = {Source.breathe_london: BreatheLondon(app_config.breathe_london_api_key)}
+        self.factories = {
+            Source.breathe_london: lambda: BreatheLondon(app_config.breathe_london_api_key)
+        }
+        self.sources = {}
+        self.lock = threading.Lock()
 
     def get_source(self, source: Source):
         """Returns the specified source or raises an exception if it doesn't exist"""
-        if self.sources.get(source) is None:
+        if self.factories.get(source) is None:
             # TODO: best exception to raise?
             raise Exception("Not found")
 
-        return self.sources[source]
+        with self.lock:
+            if source not in self.sources:
+                self.sources[source] = self.factories[source]()
+
+            return self.sources[source]
+
+    def close(self):
+        """Closes the sync clients held by each source"""
+        with self.lock:
+            for source in self.sources.values():
+                source.close()
+
+    async def aclose(self):
+        """Closes the async clients held by each source. Sources stay usable and will open new
+        clients if needed (eg, on a later event loop)"""
+        for source in list(self.sources.values()):
+            await source.aclose()
+
+
+# Shared by the whole process, so connections and parsed geometry are reused between calls
+_remote_sources = RemoteSources()
+
+
+def get_remote_sources() -> RemoteSources:
+    """Returns the process-wide set of remote sources"""
+    return _remote_sources
@@ -3,6 +3,7 @@ from server.types.frequency import Frequency
 from server.types.series import Series
 from server.types.site_status import SiteStatus
 from server.types.source import Source
+from server.types.write_mode import WriteMode
 
 __all__ = [
     "Classification",
@@ -10,4 +11,5 @@ __all__ = [
     "Series",
     "SiteStatus",
     "Source",
+    "WriteMode",
 ]
@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class WriteMode(str, Enum):
+    orm = "orm"
+    copy = "copy"
+    upsert = "upsert"
@@ -19,6 +19,16 @@ class AbstractUnitOfWork(abc.ABC):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.rollback()
 
+    @abc.abstractmethod
+    def close(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def copy(self) -> "AbstractUnitOfWork":
+        """Returns a new, independent unit of work of the same kind, for work that may outlive
+        the owner of this one (and so can't share its session)"""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def commit(self):
         raise NotImplementedError
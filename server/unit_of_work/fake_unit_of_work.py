@@ -6,6 +6,7 @@ from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
 class FakeUnitOfWork(AbstractUnitOfWork):
     def __init__(self, requests, geometries, sensors):
         self.committed = False
+        self.closed = False
         self.requests = requests
         self.geometries = geometries
         self.sensors = sensors
@@ -16,6 +17,13 @@ class FakeUnitOfWork(AbstractUnitOfWork):
     def __exit__(self, exc_type, exc_val, exc_tb):
         super().__exit__(exc_type, exc_val, exc_tb)
 
+    def close(self):
+        self.closed = True
+
+    def copy(self):
+        # Copies share the fake repositories, so tests can see what they did
+        return FakeUnitOfWork(self.requests, self.geometries, self.sensors)
+
     def commit(self):
         self.committed = True
 
@@ -1,6 +1,8 @@
 from typing import Any
 
+from server.cache.data_version import get_data_version
 from server.database import SessionLocal
+from server.repository.chunk_cache import get_chunk_cache
 from server.repository.geometry_repository import GeometryRepository
 from server.repository.request_repository import RequestRepository
 from server.repository.sensor_repository import SensorRepository
@@ -8,20 +10,44 @@ from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
 
 
 class UnitOfWork(AbstractUnitOfWork):
+    """A unit of work backed by a single session, which is created on first use and reused by
+    each `with` block until close() is called. The session only checks out a connection from
+    the pool when SQL is issued, and returns it when the outermost `with` block exits, so a
+    unit of work that is never used (eg, by a request served from the cache) never touches
+    the pool.
+
+    `with` blocks can be nested (eg, a service calling another service), in which case they
+    share the outer block's transaction."""
+
     session = None
 
+    def __init__(self):
+        self.depth = 0
+
     def __enter__(self):
-        self.session = SessionLocal()
+        if self.session is None:
+            self.session = SessionLocal()
 
-        self.requests = RequestRepository(self.session)
-        self.geometries = GeometryRepository()
-        self.sensors = SensorRepository(self.session)
+            self.requests = RequestRepository(self.session)
+            self.geometries = GeometryRepository()
+            self.sensors = SensorRepository(self.session, get_chunk_cache(), get_data_version())
 
+        self.depth += 1
         return super().__enter__()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.session.close()
-        super().__exit__(exc_type, exc_val, exc_tb)
+        self.depth -= 1
+        if self.depth == 0:
+            # Ends any transaction that wasn't committed, releasing its connection
+            super().__exit__(exc_type, exc_val, exc_tb)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def copy(self):
+        return UnitOfWork()
 
     def commit(self):
         self.session.commit()
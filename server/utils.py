@@ -1,4 +1,8 @@
 import datetime
+import itertools
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
 
 
 def round_datetime_to_day(dt: datetime.date, down: bool):
@@ -8,3 +12,35 @@ def round_datetime_to_day(dt: datetime.date, down: bool):
         return truncated
     else:
         return truncated + datetime.timedelta(days=1)
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Splits an iterable into lists of at most `size` items (itertools.batched is only
+    available from Python 3.12)"""
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def add_months(dt: datetime.datetime, months: int) -> datetime.datetime:
+    """Returns midnight on the first day of the month `months` months after `dt`"""
+    years, month = divmod(dt.month - 1 + months, 12)
+    return dt.replace(
+        year=dt.year + years, month=month + 1, day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def split_time_range(
+    start: datetime.datetime, end: datetime.datetime, months: int
+) -> list[tuple[datetime.datetime, datetime.datetime]]:
+    """Splits [start, end) into contiguous windows that break on calendar boundaries every
+    `months` months (eg, 1 for monthly windows, 12 for yearly windows)"""
+    windows = []
+    window_start = start
+    while window_start < end:
+        boundary = add_months(window_start, months - (window_start.month - 1) % months)
+        window_end = min(boundary, end)
+        windows.append((window_start, window_end))
+        window_start = window_end
+
+    return windows
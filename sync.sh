@@ -1,2 +1,2 @@
 python cli.py sync-sites
-python cli.py sync-all
\ No newline at end of file
+python cli.py sync-all --concurrency 16
\ No newline at end of file
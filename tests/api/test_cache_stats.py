@@ -0,0 +1,18 @@
+from http import HTTPStatus
+
+import pytest
+
+import app_config
+
+
+@pytest.mark.usefixtures("use_fake_uow")
+def test_get_cache_stats(client):
+    response = client.get("/cache_stats", headers={"X-API-Key": app_config.api_keys[0]})
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["local_max_bytes"] == app_config.local_cache_bytes
+
+
+@pytest.mark.usefixtures("use_fake_uow")
+def test_get_cache_stats_requires_key(client):
+    response = client.get("/cache_stats")
+    assert response.status_code == HTTPStatus.FORBIDDEN
@@ -2,16 +2,18 @@ from http import HTTPStatus
 
 import pytest
 
+from main import request_logger
+
 
 @pytest.mark.usefixtures("use_fake_uow")
-def test_request_logged(client, request_repository, mocker):
+def test_request_logged(client, mocker):
     """Asserts that the request logger works"""
 
-    request_repository.log_request = mocker.MagicMock()
+    log = mocker.patch.object(request_logger, "log")
 
     response = client.get("/sensor/pm25/2022-01-01T10:00:00/2022-02-01T10:00:00/hour")
     assert response.status_code == HTTPStatus.OK
-    request_repository.log_request.assert_called_with(
+    log.assert_called_with(
         "http://testserver/sensor/pm25/2022-01-01T10:00:00/2022-02-01T10:00:00/hour",
         "testclient",
     )
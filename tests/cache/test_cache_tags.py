@@ -0,0 +1,68 @@
+import datetime
+
+from server.cache import get_invalidation_tags, get_request_key, get_request_tags
+from server.types import Series
+
+
+def test_request_key():
+    key = get_request_key("api", "GET", "/sites", [("b", "2"), ("a", "1"), ("a", "0")])
+    assert key == "api:get:/sites:[('a', '0'), ('a', '1'), ('b', '2')]"
+
+
+def test_request_tags_sensor():
+    tags = get_request_tags(
+        "/sensor/pm25/2022-01-15T00:00:00/2022-03-01T00:00:00/hour",
+        {"series": "pm25", "start": "2022-01-15T00:00:00", "end": "2022-03-01T00:00:00"},
+        [("codes", "CLDP0001"), ("codes", "CLDP0002")],
+    )
+
+    assert tags == [
+        "pm25:CLDP0001",
+        "pm25:CLDP0001:2022-01",
+        "pm25:CLDP0001:2022-02",
+        "pm25:CLDP0002",
+        "pm25:CLDP0002:2022-01",
+        "pm25:CLDP0002:2022-02",
+    ]
+
+
+def test_request_tags_long_range():
+    tags = get_request_tags(
+        "/site_average/no2/2010-01-01T00:00:00/2022-01-01T00:00:00",
+        {"series": "no2", "start": "2010-01-01T00:00:00", "end": "2022-01-01T00:00:00"},
+        [],
+    )
+    assert tags == ["no2:*", "no2:*:long"]
+
+    assert get_request_tags("/outlier/no2", {"series": "no2"}, []) == ["no2:*", "no2:*:long"]
+    assert get_request_tags("/sites", {}, []) == ["sites"]
+
+
+def test_invalidation_tags():
+    tags = get_invalidation_tags(
+        Series.pm25, "CLDP0001", datetime.datetime(2022, 2, 1), datetime.datetime(2022, 2, 8)
+    )
+    assert tags == [
+        "pm25:CLDP0001:long",
+        "pm25:CLDP0001:2022-02",
+        "pm25:*:long",
+        "pm25:*:2022-02",
+    ]
+
+    # A full resync invalidates everything for the site
+    assert get_invalidation_tags(Series.no2, "CLDP0001") == ["no2:CLDP0001", "no2:*"]
+
+    # Every request tag that overlaps the window is invalidated
+    request_tags = get_request_tags(
+        "/sensor/pm25/2022-01-15T00:00:00/2022-03-01T00:00:00/hour",
+        {"series": "pm25", "start": "2022-01-15T00:00:00", "end": "2022-03-01T00:00:00"},
+        [],
+    )
+    assert set(request_tags) & set(tags)
+
+    request_tags = get_request_tags(
+        "/sensor/pm25/2022-03-01T00:00:00/2022-04-01T00:00:00/hour",
+        {"series": "pm25", "start": "2022-03-01T00:00:00", "end": "2022-04-01T00:00:00"},
+        [("codes", "CLDP0001")],
+    )
+    assert not set(request_tags) & set(tags)
@@ -0,0 +1,20 @@
+import asyncio
+
+import redis.asyncio as redis
+
+from server.cache import CompressedBackend, open_cache_backend
+
+
+def test_open_cache_backend_closes_pool(mocker):
+    client = mocker.AsyncMock()
+    mocker.patch.object(redis.Redis, "from_url", return_value=client)
+
+    async def use_backend():
+        async with open_cache_backend() as backend:
+            assert isinstance(backend, CompressedBackend)
+            client.close.assert_not_awaited()
+
+    asyncio.run(use_backend())
+
+    # The pool is opened for each call (eg, each resync), so it mustn't outlive it
+    client.close.assert_awaited_once_with(close_connection_pool=True)
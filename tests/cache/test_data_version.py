@@ -0,0 +1,86 @@
+import time
+from email.utils import formatdate
+
+from server.cache.data_version import (
+    SITES,
+    DataVersion,
+    get_request_scopes,
+    get_validators,
+    is_not_modified,
+)
+
+
+class HashRedis:
+    """The hash commands used by DataVersion, backed by a dict"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.reads = 0
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(
+            {field.encode(): value.encode() for field, value in mapping.items()}
+        )
+
+    def hgetall(self, key):
+        self.reads += 1
+        return self.hashes.get(key, {})
+
+
+def test_data_version():
+    client = HashRedis()
+    writer = DataVersion(client)
+    reader = DataVersion(client)
+
+    assert reader.get() == {}
+
+    writer.bump("pm25", SITES)
+
+    # The reader sees the bump once its local copy expires
+    assert reader.get() == {}
+    reader.fetched = 0
+    assert reader.get() == {"pm25": writer.versions["pm25"], SITES: writer.versions[SITES]}
+    assert client.reads == 2
+
+
+def test_get_request_scopes():
+    assert get_request_scopes({}) == [SITES]
+    assert get_request_scopes({"series": "pm25", "start": "2022-01-01"}) == [SITES, "pm25"]
+
+
+def test_get_validators():
+    versions = {SITES: 100.0, "pm25": 200.5, "no2": 300.0}
+
+    validators = get_validators(versions, [SITES, "pm25"])
+    assert validators["ETag"].startswith('W/"')
+    assert validators["Last-Modified"] == formatdate(200.5, usegmt=True)
+
+    # Validators only change when a scope the response depends on is bumped
+    assert get_validators({**versions, "no2": 400.0}, [SITES, "pm25"]) == validators
+    assert get_validators({**versions, SITES: 101.0}, [SITES, "pm25"]) != validators
+
+    assert get_validators(versions, [SITES, "pm10"]) is None
+
+
+def test_is_not_modified():
+    now = time.time()
+    validators = get_validators({SITES: now - 60}, [SITES])
+    etag = validators["ETag"]
+
+    assert is_not_modified({"If-None-Match": etag}, validators)
+    assert is_not_modified({"If-None-Match": etag.removeprefix("W/")}, validators)
+    assert is_not_modified({"If-None-Match": f'"other", {etag}'}, validators)
+    assert is_not_modified({"If-None-Match": "*"}, validators)
+    assert not is_not_modified({"If-None-Match": '"other"'}, validators)
+
+    assert is_not_modified({"If-Modified-Since": formatdate(now, usegmt=True)}, validators)
+    assert not is_not_modified(
+        {"If-Modified-Since": formatdate(now - 120, usegmt=True)}, validators
+    )
+    assert not is_not_modified({"If-Modified-Since": "yesterday"}, validators)
+
+    # If-None-Match takes precedence
+    headers = {"If-None-Match": '"other"', "If-Modified-Since": formatdate(now, usegmt=True)}
+    assert not is_not_modified(headers, validators)
+
+    assert not is_not_modified({}, validators)
@@ -0,0 +1,231 @@
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+
+from server.cache import CompressedBackend, DataVersion, ResponseCoder, cached
+from server.cache.data_version import SITES
+from server.cache.decorator import refresh_tasks
+from server.unit_of_work.abstract_unit_of_work import AbstractUnitOfWork
+from server.unit_of_work.fake_unit_of_work import FakeUnitOfWork
+
+
+class InMemoryBackend:
+    """A cache backend holding entries in a dict, with the lock methods of TaggedRedisBackend"""
+
+    def __init__(self):
+        self.entries = {}
+        self.locks = {}
+
+    async def get_with_ttl(self, key):
+        if key not in self.entries:
+            return -2, None
+
+        value, expires = self.entries[key]
+        return int(expires - time.time()), value
+
+    async def set(self, key, value, expire=None):
+        self.entries[key] = (value, time.time() + expire)
+
+    async def acquire_lock(self, key, timeout):
+        if key in self.locks:
+            return None
+
+        self.locks[key] = "token"
+        return "token"
+
+    async def release_lock(self, key, token):
+        self.locks.pop(key, None)
+
+
+@pytest.fixture
+def backend(mocker):
+    backend = InMemoryBackend()
+    mocker.patch.object(FastAPICache, "_backend", backend)
+    mocker.patch.object(FastAPICache, "_coder", ResponseCoder)
+    mocker.patch.object(FastAPICache, "_enable", True)
+    return backend
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def cached_client(calls):
+    app = FastAPI()
+
+    @app.get("/value/{name}")
+    @cached(namespace="test", expire=60, stale=30)
+    def get_value(name: str):
+        calls.append(name)
+        return {"name": name, "calls": len(calls)}
+
+    @app.get("/large")
+    @cached(namespace="test", expire=60)
+    def get_large():
+        calls.append("large")
+        return {"values": list(range(1000))}
+
+    @app.get("/series/{series}")
+    @cached(namespace="test", expire=60, conditional=True)
+    def get_series(series: str):
+        calls.append(series)
+        return {"series": series, "calls": len(calls)}
+
+    # Keep one event loop for the whole test, so background refreshes aren't cancelled
+    with TestClient(app) as client:
+        yield client
+
+
+def test_cached(backend, calls, cached_client):
+    response = cached_client.get("/value/a")
+    assert response.json() == {"name": "a", "calls": 1}
+    assert response.headers["Cache-Control"] == "max-age=60"
+
+    response = cached_client.get("/value/a")
+    assert response.json() == {"name": "a", "calls": 1}
+    assert calls == ["a"]
+
+    # Entries are kept for the stale period on top of their expiry
+    assert backend.entries["test:get:/value/a:[]"][1] - time.time() > 60
+
+
+def test_stale_while_revalidate(backend, calls, cached_client):
+    cached_client.get("/value/a")
+
+    # Age the entry into its stale period
+    value, _ = backend.entries["test:get:/value/a:[]"]
+    backend.entries["test:get:/value/a:[]"] = (value, time.time() + 10)
+
+    # The stale response is returned, and refreshed in the background
+    response = cached_client.get("/value/a")
+    assert response.json() == {"name": "a", "calls": 1}
+    assert response.headers["Cache-Control"] == "max-age=0"
+
+    deadline = time.time() + 5
+    while refresh_tasks and time.time() < deadline:
+        time.sleep(0.01)
+
+    response = cached_client.get("/value/a")
+    assert response.json() == {"name": "a", "calls": 2}
+    assert calls == ["a", "a"]
+
+
+def test_waits_for_other_worker(backend, calls, cached_client, mocker):
+    # Another worker holds the lock, and finishes while this one is waiting
+    backend.locks["test:get:/value/a:[]"] = "other"
+
+    async def sleep(seconds):
+        await backend.set("test:get:/value/a:[]", b'{"name": "a", "calls": 0}', 90)
+
+    mocker.patch("server.cache.decorator.asyncio.sleep", sleep)
+
+    response = cached_client.get("/value/a")
+    assert response.json() == {"name": "a", "calls": 0}
+    assert calls == []
+
+
+def test_compressed(backend, calls, cached_client, mocker):
+    mocker.patch.object(FastAPICache, "_backend", CompressedBackend(backend))
+
+    response = cached_client.get("/large")
+    assert response.json() == {"values": list(range(1000))}
+
+    # The entry is stored compressed, and sent as it is to clients that accept gzip
+    value, _ = backend.entries["test:get:/large:[]"]
+    assert value[:2] == b"\x1f\x8b"
+
+    response = cached_client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json() == {"values": list(range(1000))}
+
+    response = cached_client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.json() == {"values": list(range(1000))}
+    assert calls == ["large"]
+
+
+@pytest.fixture
+def data_version(mocker):
+    data_version = DataVersion(mocker.Mock())
+    data_version.fetched = float("inf")
+    mocker.patch("server.cache.decorator.get_data_version", return_value=data_version)
+    return data_version
+
+
+def test_conditional(backend, calls, cached_client, data_version):
+    # There are no validators until the data has a version
+    response = cached_client.get("/series/pm25")
+    assert "ETag" not in response.headers
+
+    # A cached response computed before the data's version has no validators either
+    data_version.versions = {SITES: time.time() - 10, "pm25": time.time() - 10}
+    value, _ = backend.entries["test:get:/series/pm25:[]"]
+    backend.entries["test:get:/series/pm25:[]"] = (value, time.time() + 30)
+    response = cached_client.get("/series/pm25")
+    assert response.json() == {"series": "pm25", "calls": 1}
+    assert "ETag" not in response.headers
+
+    backend.entries.clear()
+    response = cached_client.get("/series/pm25")
+    assert response.json() == {"series": "pm25", "calls": 2}
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    # Cache hits computed since the last change have validators too
+    assert cached_client.get("/series/pm25").headers["ETag"] == etag
+
+    # Unchanged data isn't read from the cache at all
+    backend.entries.clear()
+    response = cached_client.get("/series/pm25", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    response = cached_client.get("/series/pm25", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    assert calls == ["pm25", "pm25"]
+
+    # Other series have their own versions
+    data_version.bump("no2")
+    response = cached_client.get("/series/pm25", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    data_version.bump("pm25")
+    response = cached_client.get("/series/pm25", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert calls == ["pm25", "pm25", "pm25"]
+
+
+def test_own_unit_of_work(backend):
+    """Asserts that the route is run with its own unit of work, rather than the request's,
+    which is closed once the response is sent even if a refresh is still running"""
+    app = FastAPI()
+    request_uows = []
+    route_uows = []
+
+    def get_unit_of_work():
+        uow = FakeUnitOfWork(None, None, None)
+        request_uows.append(uow)
+        try:
+            yield uow
+        finally:
+            uow.close()
+
+    @app.get("/uow")
+    @cached(namespace="test", expire=60)
+    def get_with_uow(uow: AbstractUnitOfWork = Depends(get_unit_of_work)):
+        route_uows.append(uow)
+        return {}
+
+    with TestClient(app) as client:
+        assert client.get("/uow").status_code == 200
+
+    assert len(route_uows) == 1
+    assert route_uows[0] is not request_uows[0]
+    assert route_uows[0].closed
@@ -0,0 +1,44 @@
+import time
+
+from server.cache import LocalCache
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = LocalCache(max_bytes=30)
+    expires = time.time() + 60
+
+    cache.set("a", b"x" * 9, expires)
+    cache.set("b", b"x" * 9, expires)
+    cache.set("c", b"x" * 9, expires)
+    assert cache.size == 30
+
+    # Using "a" makes "b" the least recently used
+    assert cache.get("a") == (b"x" * 9, expires)
+    cache.set("d", b"x" * 4, expires)
+
+    assert cache.get("b") is None
+    assert len(cache) == 3
+    assert cache.size == 25
+
+    # Entries bigger than the whole cache aren't stored, and remove any older value
+    cache.set("a", b"x" * 50, expires)
+    assert cache.get("a") is None
+    assert cache.size == 15
+
+
+def test_expiry():
+    cache = LocalCache(max_bytes=100)
+    now = time.time()
+
+    cache.set("expired", b"1", now - 1)
+    cache.set("evicted", b"2", now + 60, evict_at=now - 1)
+    cache.set("fresh", b"3", now + 60, evict_at=now + 30)
+
+    assert cache.get("expired") is None
+    assert cache.get("evicted") is None
+    # The expiry time is returned, not the time it will be evicted
+    assert cache.get("fresh") == (b"3", now + 60)
+
+    cache.delete(["fresh"])
+    assert cache.get("fresh") is None
+    assert cache.size == 0
@@ -0,0 +1,23 @@
+import asyncio
+
+from server.cache import SingleFlight
+
+
+def test_concurrent_calls_coalesced():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        return await asyncio.gather(*[single_flight.run("key", compute) for _ in range(5)])
+
+    assert asyncio.run(run()) == [1, 1, 1, 1, 1]
+    assert calls == [1]
+    assert not single_flight.is_running("key")
+
+    # Once finished, the next call runs again
+    assert asyncio.run(single_flight.run("key", compute)) == 2
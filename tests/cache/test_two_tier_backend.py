@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from server.cache import TwoTierBackend
+
+
+class FakeRedisBackend:
+    """Stands in for TaggedRedisBackend, counting the requests made to it"""
+
+    origin = "this-process"
+
+    def __init__(self):
+        self.entries = {}
+        self.requests = 0
+
+    async def get_with_ttl(self, key):
+        self.requests += 1
+        return (100, self.entries[key]) if key in self.entries else (-2, None)
+
+    async def set(self, key, value, expire=None):
+        self.entries[key] = value
+
+
+def test_hits_local_tier():
+    redis_backend = FakeRedisBackend()
+    redis_backend.entries["key"] = b"value"
+    backend = TwoTierBackend(redis_backend, max_bytes=1000)
+
+    async def get_twice():
+        return [await backend.get_with_ttl("key"), await backend.get_with_ttl("key")]
+
+    (ttl, value), (local_ttl, local_value) = asyncio.run(get_twice())
+
+    assert value == local_value == b"value"
+    assert 98 <= local_ttl <= 100
+    assert redis_backend.requests == 1
+    assert backend.get_stats() | {"local_bytes": None} == {
+        "local_hits": 1,
+        "local_misses": 1,
+        "redis_hits": 1,
+        "redis_misses": 0,
+        "local_entries": 1,
+        "local_bytes": None,
+        "local_max_bytes": 1000,
+    }
+
+
+def test_invalidation_messages():
+    backend = TwoTierBackend(FakeRedisBackend(), max_bytes=1000)
+    asyncio.run(backend.set("a", "1", 60))
+    asyncio.run(backend.set("b", "2", 60))
+
+    # Messages from this process are ignored, as the local tier is already up to date
+    backend.handle_message(json.dumps({"origin": "this-process", "keys": ["a"]}))
+    assert backend.local.get("a") is not None
+
+    backend.handle_message(json.dumps({"origin": "other", "keys": ["a"]}))
+    assert backend.local.get("a") is None
+    assert backend.local.get("b") is not None
+
+    backend.handle_message(json.dumps({"origin": "other", "keys": None}))
+    assert len(backend.local) == 0
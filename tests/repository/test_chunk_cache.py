@@ -0,0 +1,162 @@
+import datetime
+import fnmatch
+
+import pytest
+
+from server.repository.chunk_cache import ChunkCache
+
+UTC = datetime.timezone.utc
+
+
+class DictRedis:
+    """The subset of the Redis client used by ChunkCache, backed by a dict"""
+
+    def __init__(self):
+        self.values = {}
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode()
+
+    def execute(self):
+        pass
+
+    def sadd(self, key, *members):
+        self.values.setdefault(key, set()).update(member.encode() for member in members)
+
+    def smembers(self, key):
+        return set(self.values.get(key, set()))
+
+    def srem(self, key, *members):
+        self.values.get(key, set()).difference_update(members)
+
+    def expire(self, key, time):
+        pass
+
+    def scan_iter(self, match, count=None):
+        return [key.encode() for key in list(self.values) if fnmatch.fnmatch(key, match)]
+
+    def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self.values.pop(key.decode() if isinstance(key, bytes) else key, None) is not None:
+                deleted += 1
+
+        return deleted
+
+    def get_chunks(self):
+        return sorted(key for key in self.values if not key.startswith("sensor-chunk-index:"))
+
+
+class HourlyQuery:
+    """Returns a reading for each hour, valued by its hour of the day, and records the ranges
+    queried"""
+
+    def __init__(self):
+        self.ranges = []
+
+    def __call__(self, start, end):
+        self.ranges.append((start, end))
+        time = start.replace(minute=0, second=0, microsecond=0)
+        items = []
+        while time < end:
+            if time >= start:
+                items.append((time, time.hour))
+            time += datetime.timedelta(hours=1)
+
+        return items
+
+
+@pytest.fixture
+def chunk_cache():
+    return ChunkCache(DictRedis())
+
+
+def get(chunk_cache, query, start, end):
+    return chunk_cache.get(
+        "pm25",
+        "data:hour",
+        start,
+        end,
+        query,
+        get_time=lambda item: item[0],
+        encode=lambda item: [item[0].isoformat(), item[1]],
+        decode=lambda item: (datetime.datetime.fromisoformat(item[0]), item[1]),
+    )
+
+
+def test_get_days(chunk_cache):
+    days = chunk_cache.get_days(datetime.datetime(2022, 1, 1, 12), datetime.datetime(2022, 1, 5, 6))
+    assert days == [datetime.datetime(2022, 1, day, tzinfo=UTC) for day in (2, 3, 4)]
+
+    # Recent days aren't cached
+    now = datetime.datetime.utcnow()
+    assert chunk_cache.get_days(now - datetime.timedelta(days=1), now) == []
+
+
+def test_composes_ranges(chunk_cache):
+    query = HourlyQuery()
+    start = datetime.datetime(2022, 1, 1, 12, tzinfo=UTC)
+    end = datetime.datetime(2022, 1, 5, 6, tzinfo=UTC)
+
+    first = get(chunk_cache, query, start, end)
+    assert first == HourlyQuery()(start, end)
+    assert len(first) == 3 * 24 + 12 + 6
+
+    # An overlapping range only queries the days not yet cached, and its partial first day
+    query.ranges = []
+    start = datetime.datetime(2022, 1, 2, 3, tzinfo=UTC)
+    end = datetime.datetime(2022, 1, 7, tzinfo=UTC)
+
+    second = get(chunk_cache, query, start, end)
+    assert second == HourlyQuery()(start, end)
+    assert query.ranges == [
+        (datetime.datetime(2022, 1, 5, tzinfo=UTC), end),
+        (start, datetime.datetime(2022, 1, 3, tzinfo=UTC)),
+    ]
+
+
+def test_invalidate(chunk_cache, mocker):
+    query = HourlyQuery()
+    get(chunk_cache, query, datetime.datetime(2022, 1, 1), datetime.datetime(2022, 1, 5))
+    assert len(chunk_cache.client.get_chunks()) == 4
+
+    # Keys are found from the index, without scanning
+    scan_iter = mocker.spy(chunk_cache.client, "scan_iter")
+
+    chunk_cache.invalidate("no2")
+    assert len(chunk_cache.client.get_chunks()) == 4
+
+    chunk_cache.invalidate("pm25", datetime.datetime(2022, 1, 2, 6), datetime.datetime(2022, 1, 3))
+    assert chunk_cache.client.get_chunks() == [
+        "sensor-chunk:pm25:2022-01-01:data:hour",
+        "sensor-chunk:pm25:2022-01-04:data:hour",
+    ]
+    assert len(chunk_cache.client.smembers("sensor-chunk-index:pm25")) == 2
+
+    chunk_cache.invalidate("pm25")
+    assert chunk_cache.client.get_chunks() == []
+    assert chunk_cache.client.smembers("sensor-chunk-index:pm25") == set()
+
+    scan_iter.assert_not_called()
+
+
+def test_clear(chunk_cache):
+    query = HourlyQuery()
+    get(chunk_cache, query, datetime.datetime(2022, 1, 1), datetime.datetime(2022, 1, 5))
+    chunk_cache.client.values["api:other"] = b"{}"
+
+    # The four days and the index
+    assert chunk_cache.clear() == 5
+    assert list(chunk_cache.client.values) == ["api:other"]
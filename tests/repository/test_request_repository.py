@@ -0,0 +1,22 @@
+import datetime
+
+from server.repository.request_repository import RequestRepository
+
+
+def test_get_popular_paths(session):
+    repository = RequestRepository(session)
+
+    for _ in range(3):
+        repository.log_request("http://localhost/sites", "127.0.0.1")
+    repository.log_request("http://localhost/outlier/pm25", "127.0.0.1")
+    session.commit()
+
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    assert repository.get_popular_paths(since, 10) == [
+        "http://localhost/sites",
+        "http://localhost/outlier/pm25",
+    ]
+    assert repository.get_popular_paths(since, 1) == ["http://localhost/sites"]
+
+    future = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    assert repository.get_popular_paths(future, 10) == []
@@ -1,11 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
+import numpy as np
 import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
 
-from server.models import SensorDataModel, SiteModel
+from server.models import SensorDataModel, SiteDayStatsModel, SiteModel
 from server.repository.sensor_repository import SensorRepository
-from server.schemas import SensorDataCreateSchema
-from server.types import Classification, Series, SiteStatus, Source
+from server.schemas import SensorBatch, SensorDataCreateSchema
+from server.types import Classification, Frequency, Series, SiteStatus, Source, WriteMode
 
 
 def _test_add_data(session):
@@ -210,3 +213,320 @@ def test_get_outliers(session, dummy_sites):
     assert len(outliers[sites[1].site_code]) == 2
     assert outliers[sites[1].site_code][0].value == pytest.approx(300)
     assert outliers[sites[1].site_code][1].value == pytest.approx(301)
+
+
+def test_write_data_copy(session, dummy_sites, create_dummy_sparse_data):
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    data = create_dummy_sparse_data(sites)
+
+    repository.write_data(data, WriteMode.copy)
+    session.commit()
+
+    result = repository.get_data(
+        Series.pm25,
+        datetime(2022, 1, 1),
+        datetime(2022, 1, 3),
+        Frequency.hour,
+        [sites[1].site_code],
+    )
+
+    assert len(result) == 10
+    assert result[0].time.replace(tzinfo=None) == datetime(2022, 1, 1, 0, 0)
+    assert result[9].value == pytest.approx(2 * 4 * 2)
+
+
+def test_daily_aggregate(session, dummy_sites, create_dummy_sparse_data):
+    """Asserts that daily queries, which read whole days from the sensor_data_daily aggregate
+    and partial days from sensor_data, give the same results as averaging sensor_data"""
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    repository.write_data(create_dummy_sparse_data(sites), WriteMode.copy)
+    session.commit()
+
+    # 1 Jan is partial, and 2 Jan is whole
+    start, end = datetime(2022, 1, 1, 2), datetime(2022, 1, 3)
+
+    result = repository.get_data(Series.pm25, start, end, Frequency.day)
+    assert [item.value for item in result] == pytest.approx([27 / 6, 60 / 10])
+
+    result = repository.get_data(
+        Series.pm25, start, end, Frequency.day, codes=[sites[1].site_code]
+    )
+    assert [item.value for item in result] == pytest.approx([18 / 3, 40 / 5])
+
+    result = repository.get_site_average(Series.pm25, start, end)
+    assert [item.value for item in result] == pytest.approx([29 / 8, 58 / 8])
+
+
+def test_site_day_stats(session, dummy_sites, create_dummy_sparse_data):
+    """Asserts that the Wrapped queries, which read whole days from site_day_stats, give the
+    same results as reading sensor_data, and that deletes keep the rollup up to date"""
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    repository.write_data(create_dummy_sparse_data(sites), WriteMode.copy)
+    for site in sites:
+        repository.update_day_stats(Series.pm25, site.site_id)
+    session.commit()
+
+    # A range that isn't whole days is read from sensor_data
+    start, end = datetime(2022, 1, 1), datetime(2022, 1, 3)
+    raw_end = datetime(2022, 1, 2, 23, 59)
+
+    def get_results(end):
+        return (
+            repository.get_heatmap(Series.pm25, start, end),
+            repository.get_breach(Series.pm25, start, end, 5),
+            repository.get_rank(Series.pm25, start, end),
+        )
+
+    heatmap, breach, rank = get_results(end)
+    raw_heatmap, raw_breach, raw_rank = get_results(raw_end)
+
+    for site in sites:
+        code = site.site_code
+        assert sorted(heatmap[code], key=lambda item: (item.day, item.hour)) == sorted(
+            raw_heatmap[code], key=lambda item: (item.day, item.hour)
+        )
+        # no_data differs, as the raw range is a day shorter
+        assert breach[code]["breach"] == raw_breach[code]["breach"]
+        assert breach[code]["ok"] == raw_breach[code]["ok"]
+        assert rank[code] == raw_rank[code]
+
+    assert len(heatmap[sites[0].site_code]) == 10
+    assert breach[sites[1].site_code]["breach"] == 1
+
+    # Deleting the second day for the first site removes its row
+    repository.delete_data(
+        Series.pm25, sites[0].site_id, datetime(2022, 1, 2), datetime(2022, 1, 3)
+    )
+    session.commit()
+
+    heatmap, breach, rank = get_results(end)
+    assert len(heatmap[sites[0].site_code]) == 5
+    assert breach[sites[0].site_code]["ok"] == 1
+    assert rank[sites[0].site_code].value == pytest.approx(2)
+
+
+def test_site_day_stats_timezone(session, dummy_sites, create_dummy_sparse_data):
+    """Asserts that the rollup is bucketed by UTC day and hour, whatever the session's
+    TimeZone"""
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    repository.write_data(create_dummy_sparse_data(sites[:1]), WriteMode.copy)
+    session.commit()
+
+    # Midnight to 4am UTC is the evening before in New York
+    session.execute(text("SET LOCAL TimeZone = 'America/New_York'"))
+    repository.update_day_stats(Series.pm25, sites[0].site_id)
+
+    rows = (
+        session.execute(select(SiteDayStatsModel).order_by(SiteDayStatsModel.day))
+        .scalars()
+        .all()
+    )
+    assert [row.day for row in rows] == [
+        datetime(2022, 1, 1, tzinfo=timezone.utc),
+        datetime(2022, 1, 2, tzinfo=timezone.utc),
+    ]
+    assert rows[0].hour_counts == [1] * 5 + [0] * 19
+
+
+def test_write_data_upsert(session, dummy_sites, create_dummy_sparse_data):
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    data = create_dummy_sparse_data(sites)
+    repository.write_data(data, WriteMode.upsert)
+    session.commit()
+
+    # Write an overlapping batch, including a duplicate key, which would violate the
+    # primary key with a plain insert
+    overlap = [
+        SensorDataCreateSchema(
+            site_id=sites[0].site_id,
+            series=Series.pm25,
+            value=value,
+            time=datetime(2022, 1, 1, 0, 0, 0, 0),
+        )
+        for value in (100, 101)
+    ]
+    repository.write_data(overlap, WriteMode.upsert)
+    session.commit()
+
+    result = repository.get_data(
+        Series.pm25,
+        datetime(2022, 1, 1),
+        datetime(2022, 1, 3),
+        Frequency.hour,
+        [sites[0].site_code],
+    )
+
+    assert len(result) == 10
+    assert result[0].value == pytest.approx(101)
+
+
+def test_delete_data_window(session, dummy_sites, create_dummy_sparse_data):
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    repository.write_data(create_dummy_sparse_data(sites))
+    session.commit()
+
+    # Delete the second day for the first site only
+    repository.delete_data(
+        Series.pm25, sites[0].site_id, datetime(2022, 1, 2), datetime(2022, 1, 3)
+    )
+    session.commit()
+
+    for site, expected in ((sites[0], 5), (sites[1], 10)):
+        result = repository.get_data(
+            Series.pm25,
+            datetime(2022, 1, 1),
+            datetime(2022, 1, 3),
+            Frequency.hour,
+            [site.site_code],
+        )
+        assert len(result) == expected
+
+
+def test_write_compressed(session, dummy_sites, create_dummy_sparse_data):
+    """Asserts that data in compressed chunks can still be deleted and overwritten"""
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    repository.write_data(create_dummy_sparse_data(sites), WriteMode.upsert)
+    session.execute(
+        text("SELECT compress_chunk(chunk) FROM show_chunks('sensor_data') AS chunk")
+    )
+    session.commit()
+
+    repository.delete_data(
+        Series.pm25, sites[0].site_id, datetime(2022, 1, 2), datetime(2022, 1, 3)
+    )
+    repository.decompress_data(datetime(2022, 1, 1), datetime(2022, 1, 2))
+    repository.write_data(
+        [
+            SensorDataCreateSchema(
+                site_id=sites[1].site_id,
+                series=Series.pm25,
+                value=100,
+                time=datetime(2022, 1, 1, 0, 0, 0, 0),
+            )
+        ],
+        WriteMode.upsert,
+    )
+    session.commit()
+
+    result = repository.get_data(
+        Series.pm25, datetime(2022, 1, 1), datetime(2022, 1, 3), Frequency.hour
+    )
+    assert len(result) == 10
+    assert result[0].value == pytest.approx(100 / 2)
+    assert result[5].value == pytest.approx(0)
+
+
+def test_decompress_recent(session, mocker):
+    """Asserts that nothing is queried for ranges newer than the compression horizon"""
+    repository = SensorRepository(session)
+    execute = mocker.spy(session, "execute")
+
+    repository.decompress_data(datetime.utcnow() - timedelta(days=1), datetime.utcnow())
+
+    execute.assert_not_called()
+
+
+def test_invalidate_refresh_failure(mocker):
+    """Asserts that a failed refresh of the daily aggregate is raised, after the caches have
+    been invalidated"""
+    session = mocker.MagicMock()
+    session.get_bind().engine.connect.side_effect = OperationalError("CALL", {}, Exception())
+    chunk_cache = mocker.MagicMock()
+    data_version = mocker.MagicMock()
+    repository = SensorRepository(session, chunk_cache, data_version)
+
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    with pytest.raises(OperationalError):
+        repository.invalidate_cached_data(Series.pm25, start, start + timedelta(days=1))
+
+    chunk_cache.invalidate.assert_called_once_with("pm25", start, start + timedelta(days=1))
+    data_version.bump.assert_called_once_with("pm25")
+
+
+def test_invalidate_cached_sites(mocker):
+    """Asserts that site changes remove the cached chunks of every series"""
+    chunk_cache = mocker.MagicMock()
+    data_version = mocker.MagicMock()
+    repository = SensorRepository(mocker.MagicMock(), chunk_cache, data_version)
+
+    repository.invalidate_cached_sites()
+
+    assert chunk_cache.invalidate.call_args_list == [mocker.call(series.value) for series in Series]
+    data_version.bump.assert_called_once_with("sites")
+
+
+def test_get_latest_dates(session, dummy_sites, create_dummy_sparse_data):
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    repository.write_data(create_dummy_sparse_data(sites[:1]))
+    session.commit()
+
+    latest_dates = repository.get_latest_dates()
+
+    assert list(latest_dates.keys()) == [(sites[0].site_id, Series.pm25)]
+    assert latest_dates[(sites[0].site_id, Series.pm25)] == repository.get_latest_date(
+        sites[0].site_id, Series.pm25
+    )
+    assert repository.get_latest_date(sites[1].site_id, Series.pm25) is None
+
+
+@pytest.mark.parametrize("write_mode", [WriteMode.orm, WriteMode.copy, WriteMode.upsert])
+def test_write_batch(session, dummy_sites, write_mode):
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    batch = SensorBatch(
+        times=np.arange(
+            np.datetime64("2022-01-01T00:00:00"), np.datetime64("2022-01-02T00:00:00"), 3600
+        ),
+        values=np.arange(24, dtype=np.float64),
+        site_id=sites[0].site_id,
+        series=Series.pm25,
+    )
+
+    repository.write_batch(batch, write_mode)
+    session.commit()
+
+    result = repository.get_data(
+        Series.pm25,
+        datetime(2022, 1, 1),
+        datetime(2022, 1, 2),
+        Frequency.hour,
+        [sites[0].site_code],
+    )
+
+    assert len(result) == 24
+    assert result[23].value == pytest.approx(23)
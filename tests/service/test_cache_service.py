@@ -0,0 +1,74 @@
+import asyncio
+import datetime
+import json
+
+from server.service import CacheService
+
+
+class RecordingBackend:
+    """Records the entries written by the cache warmer"""
+
+    def __init__(self):
+        self.writes = []
+
+    async def set_many(self, entries):
+        self.writes.append(entries)
+
+
+def test_get_standard_paths():
+    paths = CacheService.get_standard_paths(datetime.datetime(2023, 11, 20, 10, 30))
+
+    assert paths[0] == "/sites"
+    assert "/sensor/pm25/2023-11-20T00:00:00/2023-11-21T00:00:00/hour" in paths
+    assert "/site_average/no2/2022-11-21T00:00:00/2023-11-21T00:00:00" in paths
+    # Sites, then each series and frequency for every range, plus each series' site average
+    assert len(paths) == 1 + len(CacheService.warm_days) * (2 * 2 + 2)
+
+
+def test_get_cache_entries(fake_uow):
+    entries = CacheService.get_cache_entries(
+        fake_uow,
+        [
+            "/sensor/pm25/2022-01-01T10:00:00/2022-02-01T10:00:00/hour?codes=CLDP0002",
+            "/site_average/pm25/2022-01-01T10:00:00/2022-02-01T10:00:00?enrich=true",
+            "/sites",
+            "/geometry/boroughs",
+            "/sensor/pm25/not-a-date/2022-02-01T10:00:00/hour",
+        ],
+    )
+
+    assert len(entries) == 3
+
+    # The same key as request_key_builder produces
+    assert entries[0].key == (
+        "api:get:/sensor/pm25/2022-01-01T10:00:00/2022-02-01T10:00:00/hour:"
+        "[('codes', 'CLDP0002')]"
+    )
+    assert entries[0].expire == CacheService.expire + CacheService.stale
+    assert "pm25:CLDP0002:2022-01" in entries[0].tags
+    assert len(json.loads(entries[0].value)) == 2
+
+    site_averages = json.loads(entries[1].value)
+    assert site_averages[0]["site_details"]["site_code"] == "CLDP0001"
+
+    assert entries[2].key == "api:get:/sites:[]"
+    assert entries[2].expire == CacheService.sites_expire + CacheService.stale
+    assert entries[2].tags == ["sites"]
+
+
+def test_warm_cache(fake_uow, request_repository):
+    request_repository.popular_paths = [
+        "http://localhost/sensor/no2/2022-01-01T00:00:00/2022-01-02T00:00:00/day?codes=CLDP0001",
+        "http://localhost/sites",
+    ]
+    backend = RecordingBackend()
+
+    written = asyncio.run(
+        CacheService.warm_cache(fake_uow, backend, datetime.datetime(2023, 11, 20, 10, 30))
+    )
+
+    standard = len(CacheService.get_standard_paths(datetime.datetime(2023, 11, 20)))
+    # /sites is already in the standard set
+    assert written == standard + 1
+    assert sum(len(entries) for entries in backend.writes) == written
+    assert backend.writes[-1][-1].key.startswith("api:get:/sensor/no2/2022-01-01T00:00:00")
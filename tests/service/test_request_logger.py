@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from server.service import RequestLogger
+
+
+@pytest.fixture
+def request_logger(fake_uow):
+    request_logger = RequestLogger(lambda: fake_uow)
+    request_logger.batch_size = 3
+    request_logger.flush_interval = 0.05
+    request_logger.max_queued = 5
+    return request_logger
+
+
+def test_batches(request_logger, request_repository, mocker):
+    log_requests = mocker.spy(request_repository, "log_requests")
+
+    async def run():
+        await request_logger.start()
+        for index in range(4):
+            request_logger.log(f"/path/{index}", "127.0.0.1")
+
+        # The first three are written as soon as the batch is full, and the last once the
+        # flush interval has passed
+        await asyncio.sleep(0.01)
+        assert len(request_repository.logged) == 3
+
+        await asyncio.sleep(0.1)
+        assert len(request_repository.logged) == 4
+
+        await request_logger.stop()
+
+    asyncio.run(run())
+
+    assert [len(call.args[0]) for call in log_requests.call_args_list] == [3, 1]
+    assert [item.path for item in request_repository.logged] == [
+        "/path/0",
+        "/path/1",
+        "/path/2",
+        "/path/3",
+    ]
+
+
+def test_drops_and_flushes(request_logger, request_repository):
+    async def run():
+        await request_logger.start()
+
+        # The writer doesn't get to run until this yields, so the queue fills up
+        for index in range(8):
+            request_logger.log(f"/path/{index}", "127.0.0.1")
+        assert request_logger.dropped == 3
+
+        await request_logger.stop()
+
+    asyncio.run(run())
+
+    # Queued requests are written on stop
+    assert [item.path for item in request_repository.logged] == [
+        f"/path/{index}" for index in range(5)
+    ]
+    assert request_logger.dropped == 0
+
+
+def test_write_failure(request_logger, request_repository, mocker):
+    mocker.patch.object(request_repository, "log_requests", side_effect=Exception("down"))
+
+    async def run():
+        await request_logger.start()
+        request_logger.log("/path", "127.0.0.1")
+        await asyncio.sleep(0.1)
+
+        # The batch is dropped, and the writer carries on
+        assert request_logger.queue.empty()
+        assert not request_logger.writer.done()
+
+        await request_logger.stop()
+
+    asyncio.run(run())
+
+
+def test_not_started(request_logger, request_repository):
+    request_logger.log("/path", "127.0.0.1")
+    assert request_repository.logged == []
@@ -1,10 +1,21 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta, timezone
 
+import httpx
+import numpy as np
 import pytest
-
-from server.schemas import RangeSchema, SensorDataCreateSchema, SensorDataSchema
+from pydantic import ValidationError
+
+from server.schemas import (
+    RangeSchema,
+    SensorBatch,
+    SensorDataCreateSchema,
+    SensorDataSchema,
+    SyncSiteSchema,
+)
 from server.service import ProcessingResult, SensorService
-from server.types import Series, Source
+from server.source.breathe_london import BreatheLondon
+from server.types import Series, Source, WriteMode
 
 
 def test_sync_single_site_data(
@@ -22,6 +33,241 @@ def test_sync_single_site_data(
     assert sensor_repository.data[0].value == pytest.approx(28.38500068664551)
 
 
+def test_sync_single_site_data_copy(
+    httpx_mock, fake_uow, sensor_data_response, sensor_repository
+):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    SensorService.sync_single_site_data(
+        fake_uow, "CLDP0001", 1, Source.breathe_london, Series.pm25, False, WriteMode.copy
+    )
+
+    assert len(sensor_repository.data) == 2
+    assert sensor_repository.write_mode == WriteMode.copy
+
+
+def test_sync_single_site_data_resync_upsert(
+    httpx_mock, fake_uow, sensor_data_response, sensor_repository
+):
+    """Upserting overwrites existing rows, so a resync must not delete any data"""
+    httpx_mock.add_response(json=sensor_data_response)
+
+    SensorService.sync_single_site_data(
+        fake_uow, "CLDP0001", 1, Source.breathe_london, Series.pm25, True, WriteMode.upsert
+    )
+
+    # A full resync is fetched in yearly windows, each of which returns the mocked response
+    requests = httpx_mock.get_requests()
+    assert len(requests) > 1
+    assert sum(len(batch) for batch in sensor_repository.batches) == 2 * len(requests)
+    assert sensor_repository.write_mode == WriteMode.upsert
+    assert sensor_repository.deleted is None
+
+
+def test_sync_single_site_data_resync_window(
+    httpx_mock, fake_uow, sensor_data_response, sensor_repository
+):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    start = datetime(2022, 1, 1, 0, 0)
+    end = datetime(2022, 1, 8, 0, 0)
+    SensorService.sync_single_site_data(
+        fake_uow,
+        "CLDP0001",
+        1,
+        Source.breathe_london,
+        Series.pm25,
+        True,
+        WriteMode.upsert,
+        start=start,
+        end=end,
+    )
+
+    # Only the window is requested from the remote source and deleted from the repository
+    url = str(httpx_mock.get_request().url)
+    assert "2022-01-01T00:00:00Z/2022-01-08T00:00:00Z" in url
+    assert sensor_repository.deleted == (Series.pm25, 1, start, end)
+    # Only the span of the data written is decompressed, not the whole window
+    assert sensor_repository.decompressed == (
+        datetime(2022, 1, 1, 0, 0),
+        datetime(2022, 1, 1, 1, 0, 0, 1),
+    )
+    assert sensor_repository.day_stats_updated == (Series.pm25, 1, start, end)
+    assert len(sensor_repository.data) == 2
+
+
+def test_sync_site_schema_window():
+    SyncSiteSchema(site_code="CLDP0001", series=Series.pm25)
+    SyncSiteSchema(
+        site_code="CLDP0001",
+        series=Series.pm25,
+        start=datetime(2022, 1, 1),
+        end=datetime(2022, 1, 8),
+    )
+
+    with pytest.raises(ValidationError):
+        SyncSiteSchema(
+            site_code="CLDP0001",
+            series=Series.pm25,
+            start=datetime(2022, 1, 8),
+            end=datetime(2022, 1, 1),
+        )
+
+
+def test_plan_sync(fake_uow):
+    tasks = SensorService.plan_sync(fake_uow, False, "CLDP0002")
+
+    # CLDP0001 is skipped as it's before the start code
+    assert [(task.site_code, task.series) for task in tasks] == [
+        ("CLDP0002", Series.pm25),
+        ("CLDP0002", Series.no2),
+        ("CLDP0003", Series.pm25),
+        ("CLDP0003", Series.no2),
+    ]
+    assert tasks[0].site_id == 2
+    assert tasks[0].start == datetime(2020, 6, 5, 4, 2, 1)
+    assert not tasks[0].backfill
+
+    tasks = SensorService.plan_sync(fake_uow, True, None)
+    assert len(tasks) == 6
+    assert tasks[0].start == datetime(2000, 1, 1, 1, 0)
+    assert tasks[0].resync and tasks[0].backfill
+
+
+def test_sync_state_resume(httpx_mock, fake_uow, sensor_data_response, sensor_repository):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    # Pretend the last run failed on CLDP0002 pm25, after succeeding for CLDP0001
+    now = datetime.now(timezone.utc)
+    run_id = SensorService.start_sync_run(fake_uow, False)
+    for series in Series:
+        sensor_repository.record_sync_success(1, series, now, 2, 1.0, run_id)
+    sensor_repository.record_sync_failure(2, Series.pm25, now, "Timed out", run_id)
+    # A sync outside the run (eg, of a single site) doesn't count towards it
+    sensor_repository.record_sync_success(3, Series.pm25, now, 2, 1.0)
+
+    assert SensorService.start_sync_run(fake_uow, False, timedelta(hours=12)) == run_id
+    tasks = SensorService.plan_sync(fake_uow, False, None, run_id)
+    assert [(task.site_code, task.series) for task in tasks] == [
+        ("CLDP0002", Series.pm25),
+        ("CLDP0002", Series.no2),
+        ("CLDP0003", Series.pm25),
+        ("CLDP0003", Series.no2),
+    ]
+
+    # Syncing records the outcome and clears the error
+    SensorService.sync_task(fake_uow, tasks[0], run_id=run_id)
+
+    state = sensor_repository.sync_states[(2, Series.pm25)]
+    assert state.error is None
+    assert state.rows == 2
+    assert state.last_success >= now
+    assert state.run_id == run_id
+
+
+def test_start_sync_run(fake_uow, sensor_repository):
+    run_id = SensorService.start_sync_run(fake_uow, False)
+
+    # Runs are only resumed within the window, and by a run of the same kind
+    assert SensorService.start_sync_run(fake_uow, False, timedelta(hours=12)) == run_id
+    assert SensorService.start_sync_run(fake_uow, False) != run_id
+    assert SensorService.start_sync_run(fake_uow, True, timedelta(hours=12)) != run_id
+
+    sensor_repository.sync_runs[-1].started -= timedelta(hours=13)
+    assert SensorService.start_sync_run(fake_uow, True, timedelta(hours=12)) == 4
+
+
+def test_sync_all_finishes_run(httpx_mock, fake_uow, sensor_data_response, sensor_repository):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    SensorService.sync_all(fake_uow, False, None)
+    assert sensor_repository.sync_runs[0].finished is not None
+
+    # The run completed, so the next one syncs everything again, however soon it starts
+    SensorService.sync_all(fake_uow, False, None)
+    assert len(sensor_repository.sync_runs) == 2
+    assert len(httpx_mock.get_requests()) == 12
+    assert all(state.run_id == 2 for state in sensor_repository.sync_states.values())
+
+
+def test_sync_state_failure(
+    httpx_mock, fake_uow, sensor_data_response, sensor_repository, mocker
+):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    task = SensorService.plan_sync(fake_uow, False, None)[0]
+    sensor_repository.write_data = mocker.MagicMock(side_effect=Exception("Write failed"))
+    with pytest.raises(Exception):
+        SensorService.sync_task(fake_uow, task)
+
+    result, states = SensorService.get_sync_states(fake_uow)
+    assert result == ProcessingResult.SUCCESS_RETRIEVED
+    assert len(states) == 1
+    assert states[0].error == "Write failed"
+    assert states[0].last_success is None
+
+
+def test_sync_all_async(httpx_mock, fake_uow, sensor_data_response, sensor_repository, mocker):
+    httpx_mock.add_response(json=sensor_data_response)
+    copies = []
+    original_copy = fake_uow.copy
+    mocker.patch.object(
+        fake_uow, "copy", side_effect=lambda: copies.append(original_copy()) or copies[-1]
+    )
+
+    asyncio.run(SensorService.sync_all_async(fake_uow, False, None, 4, write_concurrency=2))
+
+    # Three sites and two series in the fake repository
+    assert len(httpx_mock.get_requests()) == 6
+    assert len(sensor_repository.data) == 2
+    assert type(sensor_repository.data[0]) is SensorDataCreateSchema
+    # Each pair is written in a worker thread with its own unit of work
+    assert len(copies) == 6
+    assert all(copy.committed and copy.closed for copy in copies)
+
+
+def test_sync_all_async_backfill(httpx_mock, fake_uow, sensor_data_response, mocker):
+    httpx_mock.add_response(json=sensor_data_response)
+    mocker.patch.object(SensorService, "history_start", datetime(2022, 1, 1))
+    windowed = mocker.spy(BreatheLondon, "iter_sensor_batches_windowed_async")
+
+    # A resync backfills each pair from the start of its history, a window at a time
+    asyncio.run(SensorService.sync_all_async(fake_uow, True, None, 4))
+
+    assert windowed.call_count == 6
+    assert len(httpx_mock.get_requests()) > 6
+
+
+def test_sync_all_async_read_error(fake_uow, sensor_repository, mocker):
+    async def iter_sensor_batches_async(self, site_code, start, end, series):
+        yield SensorBatch(times=np.array([start], dtype="datetime64[s]"), values=np.array([1.0]))
+        raise httpx.ReadError("Connection lost")
+
+    mocker.patch.object(BreatheLondon, "iter_sensor_batches_async", iter_sensor_batches_async)
+    original_copy = fake_uow.copy
+    copies = []
+    mocker.patch.object(
+        fake_uow, "copy", side_effect=lambda: copies.append(original_copy()) or copies[-1]
+    )
+    update_day_stats = mocker.spy(sensor_repository, "update_day_stats")
+
+    # Failures are recorded rather than raised
+    asyncio.run(SensorService.sync_all_async(fake_uow, False, None, 4))
+
+    # The first batch of each pair was passed to the writer, which then gave up before
+    # completing the transaction
+    assert len(sensor_repository.batches) == 6
+    update_day_stats.assert_not_called()
+    assert len(copies) == 6
+    assert all(copy.closed for copy in copies)
+
+    _, states = SensorService.get_sync_states(fake_uow)
+    assert len(states) == 6
+    assert all(state.error == "Connection lost" for state in states)
+    # The run is left to be resumed
+    assert sensor_repository.sync_runs[0].finished is None
+
+
 def test_get_site_average(fake_uow):
     # Get unenriched data
     result, data = SensorService.get_site_average(
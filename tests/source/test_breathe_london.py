@@ -1,5 +1,7 @@
+import asyncio
 import datetime
 
+import httpx
 import pytest
 
 from server.schemas import SensorDataRemoteSchema, SiteCreateSchema
@@ -57,6 +59,167 @@ def test_get_data(httpx_mock, sensor_data_response):
     assert data[0].value == pytest.approx(28.38500068664551)
 
 
+def test_iter_batches_no_data(httpx_mock):
+    httpx_mock.add_response(json={"recordsets": [], "output": {}, "returnValue": 0})
+
+    breathe_london = BreatheLondon("dummy_key")
+
+    data = breathe_london.iter_sensor_batches(
+        "CLDP0001",
+        datetime.datetime(2000, 1, 1, 0, 0),
+        datetime.datetime(2000, 1, 2, 0, 0),
+        Series.pm25,
+    )
+
+    assert list(data) == []
+
+
+def test_iter_batches_error(httpx_mock):
+    httpx_mock.add_response(status_code=503, text="<html>Service Unavailable</html>")
+    httpx_mock.add_response(status_code=503, text="<html>Service Unavailable</html>")
+
+    breathe_london = BreatheLondon("dummy_key")
+    breathe_london.max_retries = 1
+    breathe_london.retry_pause = 0
+
+    # An outage is an error, not an empty response
+    with pytest.raises(httpx.HTTPStatusError):
+        list(
+            breathe_london.iter_sensor_batches(
+                "CLDP0001",
+                datetime.datetime(2000, 1, 1, 0, 0),
+                datetime.datetime(2000, 1, 2, 0, 0),
+                Series.pm25,
+            )
+        )
+
+
+def test_iter_batches_unexpected_body(httpx_mock):
+    httpx_mock.add_response(json={"error": "Invalid key"})
+
+    breathe_london = BreatheLondon("dummy_key")
+
+    with pytest.raises(ValueError):
+        list(
+            breathe_london.iter_sensor_batches(
+                "CLDP0001",
+                datetime.datetime(2000, 1, 1, 0, 0),
+                datetime.datetime(2000, 1, 2, 0, 0),
+                Series.pm25,
+            )
+        )
+
+
+def test_iter_batches_windowed(httpx_mock, sensor_data_response):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    breathe_london = BreatheLondon("dummy_key")
+    breathe_london.window_months = 1
+
+    batches = list(
+        breathe_london.iter_sensor_batches_windowed(
+            "CLDP0001",
+            datetime.datetime(2022, 1, 1, 0, 0),
+            datetime.datetime(2022, 4, 1, 0, 0),
+            Series.pm25,
+        )
+    )
+
+    urls = sorted(str(request.url) for request in httpx_mock.get_requests())
+    assert len(urls) == 3
+    assert "2022-01-01T00:00:00Z/2022-01-31T23:59:59Z" in urls[0]
+    assert "2022-03-01T00:00:00Z/2022-04-01T00:00:00Z" in urls[2]
+    assert [len(batch) for batch in batches] == [2, 2, 2]
+
+
+def test_iter_batches_windowed_async(httpx_mock, sensor_data_response):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    breathe_london = BreatheLondon("dummy_key")
+    breathe_london.window_months = 1
+
+    async def read():
+        return [
+            batch
+            async for batch in breathe_london.iter_sensor_batches_windowed_async(
+                "CLDP0001",
+                datetime.datetime(2022, 1, 1, 0, 0),
+                datetime.datetime(2022, 4, 1, 0, 0),
+                Series.pm25,
+            )
+        ]
+
+    batches = asyncio.run(read())
+
+    urls = sorted(str(request.url) for request in httpx_mock.get_requests())
+    assert len(urls) == 3
+    assert "2022-01-01T00:00:00Z/2022-01-31T23:59:59Z" in urls[0]
+    assert "2022-03-01T00:00:00Z/2022-04-01T00:00:00Z" in urls[2]
+    assert [len(batch) for batch in batches] == [2, 2, 2]
+
+
+def test_iter_batches_nulls(httpx_mock, sensor_data_response):
+    sensor_data_response[0]["ScaledValue"] = None
+    httpx_mock.add_response(json=sensor_data_response)
+
+    breathe_london = BreatheLondon("dummy_key")
+
+    batches = list(
+        breathe_london.iter_sensor_batches(
+            "CLDP0001",
+            datetime.datetime(2022, 1, 1, 0, 0),
+            datetime.datetime(2022, 1, 1, 2, 0),
+            Series.pm25,
+        )
+    )
+
+    assert len(batches) == 1
+    assert batches[0].get_datetimes() == [datetime.datetime(2022, 1, 1, 1, 0)]
+    assert batches[0].values.tolist() == [pytest.approx(33.7489998626709)]
+
+
+def test_get_data_async(httpx_mock, sensor_data_response):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    breathe_london = BreatheLondon("dummy_key")
+
+    data = asyncio.run(
+        breathe_london.get_sensor_data_async(
+            "CLDP0001",
+            datetime.datetime(2022, 1, 1, 0, 0),
+            datetime.datetime(2022, 1, 1, 2, 0),
+            Series.pm25,
+        )
+    )
+
+    assert len(data) == 2
+    assert isinstance(data[0], SensorDataRemoteSchema)
+    assert data[0].time == datetime.datetime(2022, 1, 1, 0, 0)
+
+
+def test_iter_batches_async(httpx_mock, sensor_data_response):
+    httpx_mock.add_response(json=sensor_data_response)
+
+    breathe_london = BreatheLondon("dummy_key")
+    breathe_london.batch_size = 1
+
+    async def read():
+        return [
+            batch
+            async for batch in breathe_london.iter_sensor_batches_async(
+                "CLDP0001",
+                datetime.datetime(2022, 1, 1, 0, 0),
+                datetime.datetime(2022, 1, 1, 2, 0),
+                Series.pm25,
+            )
+        ]
+
+    batches = asyncio.run(read())
+
+    assert [len(batch) for batch in batches] == [1, 1]
+    assert batches[1].get_datetimes() == [datetime.datetime(2022, 1, 1, 1, 0)]
+
+
 def test_get_data_no_data(httpx_mock):
     sample_response = []
 
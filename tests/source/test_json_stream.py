@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from server.source.json_stream import JsonArrayParser
+
+
+def feed_in_chunks(text: str, size: int) -> list:
+    parser = JsonArrayParser()
+    items = []
+    for index in range(0, len(text), size):
+        items += parser.feed(text[index : index + size])
+    parser.close()
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_parse_chunks(size, sensor_data_response):
+    text = json.dumps(sensor_data_response, indent=2)
+    assert feed_in_chunks(text, size) == sensor_data_response
+
+
+def test_parse_numbers():
+    assert feed_in_chunks("[12, 345.5, -6]", 1) == [12, 345.5, -6]
+
+
+def test_parse_empty():
+    assert feed_in_chunks("[ ]", 1) == []
+
+
+def test_parse_object():
+    parser = JsonArrayParser()
+    assert parser.feed('{"recordsets": [], "output": {}}') == []
+    assert parser.is_array is False
+    parser.close()
+    assert parser.value == {"recordsets": [], "output": {}}
+
+
+def test_parse_invalid():
+    parser = JsonArrayParser()
+    parser.feed("<html>Bad")
+    parser.feed(" Gateway</html>")
+
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_parse_incomplete():
+    parser = JsonArrayParser()
+    parser.feed('[{"a": 1}, {"a"')
+
+    with pytest.raises(ValueError):
+        parser.close()
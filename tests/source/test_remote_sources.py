@@ -0,0 +1,47 @@
+import asyncio
+
+from server.source.breathe_london import BreatheLondon
+from server.source.remote_sources import RemoteSources, get_remote_sources
+from server.types import Source
+
+
+def test_sources_are_shared():
+    assert get_remote_sources() is get_remote_sources()
+
+    remote_sources = RemoteSources()
+    assert remote_sources.sources == {}
+
+    source = remote_sources.get_source(Source.breathe_london)
+    assert isinstance(source, BreatheLondon)
+    assert remote_sources.get_source(Source.breathe_london) is source
+
+
+def test_clients_are_reused(httpx_mock, site_response):
+    httpx_mock.add_response(json=site_response)
+    httpx_mock.add_response(json=site_response)
+
+    breathe_london = BreatheLondon("dummy_key")
+    breathe_london.get_sites()
+    client = breathe_london.client
+    breathe_london.get_sites()
+
+    assert breathe_london.client is client
+
+    breathe_london.close()
+    assert breathe_london.client is not client
+
+
+def test_async_client_recreated_after_aclose():
+    breathe_london = BreatheLondon("dummy_key")
+
+    async def use_client():
+        client = breathe_london.async_client
+        await breathe_london.aclose()
+        return client
+
+    # Each event loop gets its own client
+    first = asyncio.run(use_client())
+    second = asyncio.run(use_client())
+
+    assert first is not second
+    assert first.is_closed and second.is_closed
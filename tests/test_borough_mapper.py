@@ -1,6 +1,6 @@
 import pytest
 
-from borough_mapper import BoroughMapper, NotFoundError
+from borough_mapper import BoroughMapper, GeometryIndex, NotFoundError
 
 
 def test_map_point_ok():
@@ -22,3 +22,28 @@ def test_map_point_no_raise():
 
     borough = mapper.get_borough(1, 1)
     assert borough == "Outside London"
+
+
+def test_map_points_batch():
+    mapper = BoroughMapper()
+
+    boroughs = mapper.get_boroughs([51.4624171, 1, 51.5154], [-0.1054934, 1, -0.0922])
+    assert boroughs == ["Lambeth", "Outside London", "City of London"]
+
+
+def test_map_points_batch_raise():
+    mapper = BoroughMapper(True)
+
+    with pytest.raises(NotFoundError):
+        mapper.get_boroughs([51.4624171, 1], [-0.1054934, 1])
+
+
+def test_geometry_index_other_layers():
+    ltns = GeometryIndex.from_file("geometry/ltns.json", "Name")
+    assert GeometryIndex.from_file("geometry/ltns.json", "Name") is ltns
+
+    # The centre given for a single polygon LTN should be inside it
+    assert ltns.lookup([51.52841], [-0.06694]) == ["Bethnal Green"]
+
+    cc = GeometryIndex.from_file("geometry/cc.json", "BOUNDARY")
+    assert cc.lookup([51.508, 1], [-0.128, 1]) == ["CLoCCS", None]
@@ -0,0 +1,244 @@
+import datetime
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+
+import pytest
+import sqlalchemy as sa
+
+from server import hypertable
+from server.models import SensorDataModel
+from server.repository.sensor_repository import SensorRepository
+from server.schemas import SensorDataCreateSchema
+from server.types import Frequency, Series, WriteMode
+
+# These load years of data and time queries against it, so are slow. Set RUN_BENCHMARKS=1 to
+# run them
+pytestmark = pytest.mark.skipif(
+    not bool(int(os.environ.get("RUN_BENCHMARKS", "0"))), reason="RUN_BENCHMARKS is not set"
+)
+
+
+def generate_hourly_data(sites, hours: int) -> list[SensorDataCreateSchema]:
+    """Generates `hours` of hourly data for each site, starting at 1 Jan 2020"""
+    start = datetime.datetime(2020, 1, 1)
+    return [
+        SensorDataCreateSchema(
+            site_id=site.site_id,
+            series=Series.pm25,
+            value=(hour % 50) * 1.5,
+            time=start + datetime.timedelta(hours=hour),
+        )
+        for site in sites
+        for hour in range(hours)
+    ]
+
+
+@pytest.mark.parametrize("write_mode", [WriteMode.orm, WriteMode.copy])
+def test_write_data_performance(session, dummy_sites, write_mode):
+    """Compares write_data performance for each write mode. Two years of hourly data for
+    each dummy site."""
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    data = generate_hourly_data(sites, 2 * 365 * 24)
+
+    start_time = time.time()
+    repository.write_data(data, write_mode)
+    session.commit()
+    elapsed = time.time() - start_time
+
+    logging.info(f"write_data ({write_mode.value}): {len(data)} rows in {elapsed:.3f}s")
+
+    rows = session.execute(sa.select(sa.func.count()).select_from(SensorDataModel)).scalar_one()
+    assert rows == len(data)
+    assert repository.get_latest_date(sites[0].site_id, Series.pm25) == datetime.datetime(
+        2020, 1, 1, tzinfo=datetime.timezone.utc
+    ) + datetime.timedelta(hours=2 * 365 * 24 - 1)
+
+
+# The sensor_data indexes before the composite index migration (8d3f4a6b1c27), and after it
+index_layouts = {
+    "single_column": [
+        "DROP INDEX ix_sensor_data_series_time",
+        "CREATE INDEX ix_sensor_data_series ON sensor_data (series)",
+        "CREATE INDEX ix_sensor_data_site_id ON sensor_data (site_id)",
+        "CREATE INDEX ix_sensor_data_time ON sensor_data (time)",
+    ],
+    "composite": [],
+}
+
+
+@contextmanager
+def capture_statements(session):
+    """Records the SQL statements (and parameters) executed by the session"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    connection = session.connection()
+    sa.event.listen(connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(connection, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(session, statement, parameters) -> tuple[float, str]:
+    """Returns the execution time (in ms) and plan of a statement"""
+    rows = session.connection().exec_driver_sql(f"EXPLAIN ANALYZE {statement}", parameters)
+    plan = "\n".join(row[0] for row in rows)
+    return float(re.search(r"Execution Time: ([\d.]+) ms", plan).group(1)), plan
+
+
+@pytest.mark.parametrize("layout", index_layouts.keys())
+def test_query_plans(session, dummy_sites, layout):
+    """Runs EXPLAIN ANALYZE on the statements issued by each repository query, against two
+    years of hourly data for each dummy site, with the sensor_data indexes from before and
+    after the composite index migration. Compare the logged timings and plans.
+
+    Also asserts that, where an index is used, reads across all sites use the composite
+    index."""
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+
+    sites = repository.get_sites(None)
+    repository.write_data(generate_hourly_data(sites, 2 * 365 * 24), WriteMode.copy)
+    session.commit()
+
+    for statement in index_layouts[layout]:
+        session.execute(sa.text(statement))
+    session.execute(sa.text("ANALYZE sensor_data"))
+
+    start = datetime.datetime(2021, 3, 1)
+    end = datetime.datetime(2021, 6, 1)
+    queries = {
+        "get_data": lambda: repository.get_data(Series.pm25, start, end, Frequency.day),
+        "get_data (codes)": lambda: repository.get_data(
+            Series.pm25, start, end, Frequency.hour, codes=[sites[0].site_code]
+        ),
+        "get_site_average": lambda: repository.get_site_average(Series.pm25, start, end),
+        "get_latest_date": lambda: repository.get_latest_date(sites[0].site_id, Series.pm25),
+        "get_heatmap": lambda: repository.get_heatmap(Series.pm25, start, end),
+        "get_breach": lambda: repository.get_breach(Series.pm25, start, end, 15),
+        "get_rank": lambda: repository.get_rank(Series.pm25, start, end),
+    }
+
+    for name, query in queries.items():
+        with capture_statements(session) as statements:
+            query()
+
+        for statement, parameters in statements:
+            elapsed, plan = explain(session, statement, parameters)
+            logging.info(f"{name} ({layout}): {elapsed:.3f}ms\n{plan}")
+
+    # A few months of a small dataset may be cheapest to read with a sequential scan, so rule
+    # that out to see which index is chosen. Chunk index names start with the chunk's name
+    session.execute(sa.text("SET LOCAL enable_seqscan = off"))
+    with capture_statements(session) as statements:
+        repository.get_data(Series.pm25, start, end, Frequency.hour)
+
+    plans = [explain(session, statement, parameters)[1] for statement, parameters in statements]
+    assert any("ix_sensor_data_series_time" in plan for plan in plans) == (layout == "composite")
+
+
+# Chunk interval, and number of site_id partitions
+chunk_layouts = {
+    "7 days": (datetime.timedelta(days=7), None),
+    "30 days": (datetime.timedelta(days=30), None),
+    "30 days, 4 site partitions": (datetime.timedelta(days=30), 4),
+}
+
+
+@pytest.mark.parametrize("days", [90, 365, 3 * 365])
+@pytest.mark.parametrize("layout", chunk_layouts.keys())
+def test_chunk_layouts(session, dummy_sites, layout, days):
+    """Times get_data, get_site_average and get_latest_date against `days` of hourly data for
+    each dummy site, with sensor_data chunked in each layout. Compare the logged timings. The
+    layout, and the size of each result, are asserted so a broken layout can't look fast.
+
+    Each layout gets its own sensor_data (and, as a plain view, sensor_data_daily) in a bench
+    schema, which is put ahead of public on the search path so the repository queries it."""
+    repository = SensorRepository(session)
+    repository.update_sites(dummy_sites)
+    session.commit()
+    sites = repository.get_sites(None)
+
+    interval, partitions = chunk_layouts[layout]
+    session.execute(sa.text("CREATE SCHEMA bench"))
+    session.execute(
+        sa.text("CREATE TABLE bench.sensor_data (LIKE public.sensor_data INCLUDING ALL)")
+    )
+    hypertable.create_hypertable(session.connection(), "bench.sensor_data", interval, partitions)
+    session.execute(
+        sa.text(
+            "CREATE VIEW bench.sensor_data_daily AS "
+            "SELECT time_bucket(INTERVAL '1 day', time) AS day, site_id, series, "
+            "sum(value) AS value_sum, count(value) AS value_count, "
+            "min(value) AS value_min, max(value) AS value_max "
+            "FROM bench.sensor_data GROUP BY day, site_id, series"
+        )
+    )
+    session.execute(sa.text("SET LOCAL search_path TO bench, public"))
+
+    repository.write_data(generate_hourly_data(sites, days * 24), WriteMode.copy)
+    session.commit()
+    session.execute(sa.text("ANALYZE bench.sensor_data"))
+
+    site_partitions = (
+        session.execute(
+            sa.text(
+                "SELECT num_partitions FROM timescaledb_information.dimensions "
+                "WHERE hypertable_schema = 'bench' AND hypertable_name = 'sensor_data' "
+                "AND column_name = 'site_id'"
+            )
+        )
+        .scalars()
+        .all()
+    )
+    assert site_partitions == ([partitions] if partitions else [])
+
+    end = datetime.datetime(2020, 1, 1) + datetime.timedelta(days=days)
+    ranges = {"last month": (end - datetime.timedelta(days=30), end)}
+    ranges["all"] = (datetime.datetime(2020, 1, 1), end)
+
+    for range_name, (start, range_end) in ranges.items():
+        queries = {
+            "get_data (hour)": lambda: repository.get_data(
+                Series.pm25, start, range_end, Frequency.hour
+            ),
+            "get_data (day)": lambda: repository.get_data(
+                Series.pm25, start, range_end, Frequency.day
+            ),
+            "get_site_average": lambda: repository.get_site_average(Series.pm25, start, range_end),
+            "get_latest_date": lambda: repository.get_latest_date(sites[0].site_id, Series.pm25),
+        }
+
+        hours = int((range_end - start).total_seconds()) // 3600
+        expected = {
+            "get_data (hour)": hours,
+            "get_data (day)": hours // 24,
+            "get_site_average": len(sites),
+        }
+
+        for name, query in queries.items():
+            timings = []
+            for _ in range(3):
+                start_time = time.perf_counter()
+                result = query()
+                timings.append(time.perf_counter() - start_time)
+
+            logging.info(
+                f"{name}, {range_name} ({layout}, {days} days): best of 3 {min(timings):.4f}s"
+            )
+
+            if name in expected:
+                assert len(result) == expected[name]
+            else:
+                assert result.replace(tzinfo=None) == end - datetime.timedelta(hours=1)
@@ -0,0 +1,13 @@
+import datetime
+
+from server.hypertable import chunk_target_rows, get_recommended_interval
+
+
+def test_get_recommended_interval():
+    assert get_recommended_interval(chunk_target_rows / 30) == datetime.timedelta(days=30)
+    assert get_recommended_interval(chunk_target_rows / 30.4) == datetime.timedelta(days=30)
+
+    # Intervals are at least a day, and at most a year
+    assert get_recommended_interval(chunk_target_rows * 10) == datetime.timedelta(days=1)
+    assert get_recommended_interval(1) == datetime.timedelta(days=365)
+    assert get_recommended_interval(0) == datetime.timedelta(days=365)
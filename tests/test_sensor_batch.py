@@ -0,0 +1,64 @@
+import datetime
+
+import numpy as np
+
+from server.schemas import SensorBatch, SensorDataCreateSchema
+from server.types import Series
+
+
+def make_batch(times: list[str], values: list[float]) -> SensorBatch:
+    return SensorBatch(
+        times=np.array(times, dtype="datetime64[s]"),
+        values=np.array(values, dtype=np.float64),
+        site_id=1,
+        series=Series.pm25,
+    )
+
+
+def test_concatenate():
+    batch = SensorBatch.concatenate(
+        [
+            make_batch(["2022-01-01T00:00:00"], [1.0]),
+            make_batch(["2022-01-01T01:00:00", "2022-01-01T02:00:00"], [2.0, 3.0]),
+        ]
+    )
+
+    assert len(batch) == 3
+    assert batch.site_id == 1
+    assert batch.values.tolist() == [1.0, 2.0, 3.0]
+
+    assert len(SensorBatch.concatenate([])) == 0
+
+
+def test_get_span():
+    batch = make_batch(
+        ["2022-01-01T01:00:00", "2022-01-01T00:00:00", "2022-01-02T00:00:00"], [1.0, 2.0, 3.0]
+    )
+
+    assert batch.get_span() == (
+        datetime.datetime(2022, 1, 1, 0, 0),
+        datetime.datetime(2022, 1, 2, 0, 0),
+    )
+
+
+def test_deduplicate():
+    batch = make_batch(
+        ["2022-01-01T01:00:00", "2022-01-01T00:00:00", "2022-01-01T01:00:00"], [1.0, 2.0, 3.0]
+    ).deduplicate()
+
+    assert batch.get_datetimes() == [
+        datetime.datetime(2022, 1, 1, 0, 0),
+        datetime.datetime(2022, 1, 1, 1, 0),
+    ]
+    # The last value for a time wins
+    assert batch.values.tolist() == [2.0, 3.0]
+
+
+def test_to_create_schemas():
+    schemas = make_batch(["2022-01-01T00:00:00"], [1.5]).to_create_schemas()
+
+    assert schemas == [
+        SensorDataCreateSchema(
+            time=datetime.datetime(2022, 1, 1), value=1.5, site_id=1, series=Series.pm25
+        )
+    ]
@@ -1,6 +1,6 @@
 import datetime
 
-from server.utils import round_datetime_to_day
+from server.utils import batched, round_datetime_to_day, split_time_range
 
 
 def test_round_datetime_to_day():
@@ -9,3 +9,25 @@ def test_round_datetime_to_day():
 
     assert round_datetime_to_day(dt, True) == datetime.datetime(2020, 1, 2, 0, 0, 0, 0)
     assert round_datetime_to_day(dt, False) == datetime.datetime(2020, 1, 3, 0, 0, 0, 0)
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched(iter([]), 2)) == []
+
+
+def test_split_time_range():
+    start = datetime.datetime(2021, 11, 15, 1)
+    end = datetime.datetime(2023, 2, 1)
+
+    assert split_time_range(start, end, 12) == [
+        (start, datetime.datetime(2022, 1, 1)),
+        (datetime.datetime(2022, 1, 1), datetime.datetime(2023, 1, 1)),
+        (datetime.datetime(2023, 1, 1), end),
+    ]
+
+    monthly = split_time_range(start, end, 1)
+    assert len(monthly) == 15
+    assert monthly[1] == (datetime.datetime(2021, 12, 1), datetime.datetime(2022, 1, 1))
+
+    assert split_time_range(end, end, 1) == []
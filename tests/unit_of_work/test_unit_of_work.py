@@ -0,0 +1,41 @@
+import pytest
+
+from server.unit_of_work.unit_of_work import UnitOfWork
+
+
+@pytest.fixture
+def session_local(mocker):
+    return mocker.patch("server.unit_of_work.unit_of_work.SessionLocal")
+
+
+def test_lazy_session(session_local):
+    uow = UnitOfWork()
+    uow.close()
+
+    # Nothing is created until the unit of work is used
+    session_local.assert_not_called()
+
+
+def test_shared_session(session_local):
+    uow = UnitOfWork()
+
+    with uow:
+        session = uow.session
+        with uow:
+            uow.commit()
+
+        # Leaving a nested block doesn't end the outer block's transaction
+        session.rollback.assert_not_called()
+
+    session.commit.assert_called_once()
+    session.rollback.assert_called_once()
+
+    # Later blocks reuse the session until it is closed
+    with uow:
+        assert uow.session is session
+
+    session_local.assert_called_once()
+
+    uow.close()
+    session.close.assert_called_once()
+    assert uow.session is None